@@ -151,6 +151,42 @@ def get_documents() -> Dict[str, Any]:
             "total_sections": 0
         }
 
+def get_related_documents(doc_id: str, limit: int = 5) -> Dict[str, Any]:
+    """Documents most similar to ``doc_id``, with the same summary fields as get_documents"""
+    try:
+        index = get_index()
+        doc_meta = [m for m in index.meta if m.doc_id == doc_id]
+        if not doc_meta:
+            return {
+                "status": "error",
+                "error": "Document not found"
+            }
+        
+        docs = {d["filename"]: d for d in get_documents()["documents"]}
+        related = []
+        for item in index.related_documents(doc_meta[0].doc_name, top_n=limit):
+            doc = docs.get(item["doc_name"], {})
+            related.append({
+                "id": doc.get("id"),
+                "filename": item["doc_name"],
+                "sections": doc.get("sections", 0),
+                "score": item["score"]
+            })
+        
+        return {
+            "status": "success",
+            "id": doc_id,
+            "filename": doc_meta[0].doc_name,
+            "related": related
+        }
+        
+    except Exception as e:
+        logger.error(f"Error finding documents related to {doc_id}: {e}")
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
 def delete_document(doc_id: str) -> Dict[str, Any]:
     """Delete a document and its index entries"""
     try:
@@ -1,7 +1,10 @@
 # backend/app/llm_adapter.py
 import os
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +13,80 @@ USE_LLM = os.environ.get("LLM_PROVIDER", "").strip() != ""
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini").lower()
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash-exp")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))  # in-flight requests per provider
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))  # seconds
+
+class ProviderPool:
+    """Concurrency limit and timeout shared by every caller of one LLM provider"""
+    
+    def __init__(self, name: str, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.queued = 0
+        self.timeouts = 0
+    
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.queued += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"{self.name}: no free slot within {self.timeout:.0f}s")
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+        }
+
+_pools: Dict[str, ProviderPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(provider: str) -> ProviderPool:
+    """Process-wide pool for ``provider``, created on first use"""
+    pool = _pools.get(provider)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(provider, ProviderPool(provider))
+    return pool
+
+@lru_cache(maxsize=1)
+def _gemini_model():
+    """Configured once per process; the model's transport keeps its connections open"""
+    import google.generativeai as genai
+    
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+@lru_cache(maxsize=1)
+def _openai_client():
+    """One client per process, so HTTP keep-alive and TLS sessions are reused across requests"""
+    import httpx
+    from openai import OpenAI
+    
+    limits = httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY)
+    return OpenAI(api_key=os.environ["OPENAI_API_KEY"], timeout=LLM_TIMEOUT,
+                  http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT))
 
 def _fallback_insights(selected_text: str, related: List[Dict[str, Any]]) -> str:
     """Generate fallback insights when LLM is not available"""
@@ -131,27 +208,77 @@ def generate_insights(selected_text: str, related: List[Dict[str, Any]]) -> str:
         logger.error(f"Error generating insights: {e}")
         return _fallback_insights(selected_text, related)
 
+def stream_insights(selected_text: str, related: List[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Like generate_insights, but yields the text in chunks as the provider streams it.
+    A provider failure before the first chunk falls back to the canned insights; after
+    it the error is raised, since the text already sent can't be replaced.
+    """
+    if not USE_LLM or LLM_PROVIDER not in ("gemini", "openai"):
+        yield generate_insights(selected_text, related)
+        return
+    
+    logger.info(f"Streaming insights using {LLM_PROVIDER}")
+    produced = False
+    try:
+        chunks = _stream_gemini(selected_text, related) if LLM_PROVIDER == "gemini" \
+            else _stream_openai(selected_text, related)
+        for chunk in chunks:
+            produced = True
+            yield chunk
+    except Exception as e:
+        logger.error(f"Error streaming {LLM_PROVIDER} insights: {e}")
+        if produced:
+            raise
+    if not produced:
+        yield _fallback_insights(selected_text, related)
+
+def _stream_gemini(selected_text: str, related: List[Dict[str, Any]]) -> Iterator[str]:
+    if not os.environ.get("GEMINI_API_KEY"):
+        logger.warning("GEMINI_API_KEY not set, using fallback")
+        return
+    pool = get_pool("gemini")
+    with pool.slot():  # held until the stream is drained
+        stream = _gemini_model().generate_content(build_prompt(selected_text, related), stream=True,
+                                                  request_options={"timeout": pool.timeout})
+        for chunk in stream:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # a blocked or empty candidate has no text parts
+            if text:
+                yield text
+
+def _stream_openai(selected_text: str, related: List[Dict[str, Any]]) -> Iterator[str]:
+    if not os.environ.get("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY not set, using fallback")
+        return
+    with get_pool("openai").slot():
+        stream = _openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": build_prompt(selected_text, related)}],
+            temperature=0.3,
+            max_tokens=800,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 def _generate_gemini_insights(selected_text: str, related: List[Dict[str, Any]]) -> str:
     """Generate insights using Google Gemini"""
     try:
-        import google.generativeai as genai
-        
-        # Configure Gemini
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
+        if not os.environ.get("GEMINI_API_KEY"):
             logger.warning("GEMINI_API_KEY not set, using fallback")
             return _fallback_insights(selected_text, related)
         
-        genai.configure(api_key=api_key)
-        
-        # Create model
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
         # Build prompt
         prompt = build_prompt(selected_text, related)
         
-        # Generate content
-        response = model.generate_content(prompt)
+        # Generate content on the shared model
+        pool = get_pool("gemini")
+        with pool.slot():
+            response = _gemini_model().generate_content(prompt, request_options={"timeout": pool.timeout})
         
         if response and response.text:
             logger.info("✅ Gemini insights generated successfully")
@@ -170,27 +297,21 @@ def _generate_gemini_insights(selected_text: str, related: List[Dict[str, Any]])
 def _generate_openai_insights(selected_text: str, related: List[Dict[str, Any]]) -> str:
     """Generate insights using OpenAI"""
     try:
-        from openai import OpenAI
-        
-        # Configure OpenAI
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
+        if not os.environ.get("OPENAI_API_KEY"):
             logger.warning("OPENAI_API_KEY not set, using fallback")
             return _fallback_insights(selected_text, related)
         
-        client = OpenAI(api_key=api_key)
-        
         # Build prompt
         prompt = build_prompt(selected_text, related)
         
-        # Generate completion
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=800,
-            timeout=30
-        )
+        # Generate completion on the shared, pooled client
+        with get_pool("openai").slot():
+            response = _openai_client().chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=800
+            )
         
         if response and response.choices:
             content = response.choices[0].message.content
@@ -224,6 +345,7 @@ def get_llm_status() -> Dict[str, Any]:
             status["models"]["openai"] = OPENAI_MODEL
             status["configured"] = bool(os.environ.get("OPENAI_API_KEY"))
         
+        status["pools"] = {name: pool.stats() for name, pool in _pools.items()}
         return status
         
     except Exception as e:
@@ -1,18 +1,19 @@
 # backend/app/main.py
 import os
+import json
 import logging
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 
 from .indexer import (
-    upload_and_index, get_documents, delete_document, 
+    upload_and_index, get_documents, delete_document, get_related_documents,
     reindex, get_index_status, cleanup_orphaned_files
 )
-from .llm_adapter import generate_insights
+from .llm_adapter import generate_insights, stream_insights
 from .tts_adapter import generate_podcast_with_transcript
 
 # Configure logging
@@ -68,15 +69,15 @@ async def health_check():
         from .indexer import get_index
         index = get_index()
         stats = index.get_stats()
-    return {
-        "status": "healthy",
+        return {
+            "status": "healthy",
             "service": "Document Insight & Engagement System",
             "version": "2.0.0",
             "index_stats": stats
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-    return {
+        return {
             "status": "unhealthy",
             "error": str(e)
         }
@@ -149,6 +150,21 @@ async def list_documents():
         logger.error(f"Error listing documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/documents/{doc_id}/related")
+async def related_documents(doc_id: str, limit: int = 5):
+    """Documents most similar to this one, by mean section embedding"""
+    try:
+        result = get_related_documents(doc_id, limit=limit)
+        if result["status"] == "success":
+            return result
+        else:
+            raise HTTPException(status_code=404, detail=result.get("error", "Document not found"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding related documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/documents/{doc_id}")
 async def remove_document(doc_id: str):
     """Delete a document and its index entries"""
@@ -195,6 +211,44 @@ async def analyze_selection(request: SelectionRequest):
         logger.error(f"Error analyzing selection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/selection/analyze/stream")
+def analyze_selection_stream(request: SelectionRequest):
+    """Server-sent events: related sections first, then insight text chunks, then the full response"""
+    try:
+        from .indexer import get_index
+        
+        related = get_index().search(request.selected_text, top_k=request.top_k)
+    except Exception as e:
+        logger.error(f"Error analyzing selection: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def event(name: str, data: Any) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    def stream():
+        yield event("sections", {"selected_text": request.selected_text, "related_sections": related})
+        parts = []
+        try:
+            for chunk in stream_insights(request.selected_text, related):
+                parts.append(chunk)
+                yield event("token", {"text": chunk})
+        except Exception as e:
+            # The client already has part of the text, so tell it the stream is incomplete
+            yield event("error", {"detail": f"Error generating insights: {e}"})
+            return
+        yield event("done", {
+            "status": "success",
+            "selected_text": request.selected_text,
+            "current_doc_name": request.current_doc_name,
+            "related_sections": related,
+            "insights": "".join(parts).strip(),
+            "generated_at": "now"
+        })
+        logger.info(f"✅ Insights streamed for text: {request.selected_text[:50]}...")
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/text/analyze")
 async def analyze_text(request: SelectionRequest):
     """Analyze text input (alternative to selection)"""
@@ -0,0 +1,81 @@
+# backend/app/query_cache.py
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query: Unicode-normalized with whitespace collapsed"""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by normalized query text.
+
+    Cached vectors are stored read-only; callers get fresh arrays.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, query: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        return self.get_or_compute_many([query], lambda qs: [compute(q) for q in qs])[0]
+
+    def get_or_compute_many(self, queries: List[str],
+                            compute_many: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """(N, d) matrix for ``queries``; all misses are encoded in one ``compute_many`` call"""
+        keys = [normalize_query(q) for q in queries]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vec = found.get(key)
+                if vec is None:
+                    vec = self._data.get(key)
+                    if vec is not None:
+                        self._data.move_to_end(key)
+                        found[key] = vec
+                if vec is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            # Encode outside the lock so a slow model call does not serialize other lookups
+            vecs = np.array(compute_many(missing), dtype="float32").reshape(len(missing), -1)
+            vecs.setflags(write=False)
+            found.update(zip(missing, vecs))
+            if self.maxsize > 0:
+                with self._lock:
+                    for key in missing:
+                        self._data[key] = found[key]
+                        self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+        return np.stack([found[k] for k in keys])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
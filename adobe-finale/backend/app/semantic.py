@@ -11,6 +11,9 @@ import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 
+from .query_cache import QueryEmbeddingCache
+from .centroids import DocumentCentroids
+
 logger = logging.getLogger(__name__)
 
 DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.getcwd(), "data"))
@@ -115,6 +118,8 @@ class SemanticIndex:
         self.dim = self.model.get_sentence_embedding_dimension()
         self.index = None
         self.meta: List[SectionMeta] = []
+        self.query_cache = QueryEmbeddingCache()
+        self.centroids = DocumentCentroids(self.dim)
         self._load()
     
     def _load(self):
@@ -124,6 +129,7 @@ class SemanticIndex:
                 with open(self.meta_path, "r", encoding="utf-8") as f:
                     self.meta = [SectionMeta(**m) for m in json.load(f)]
                 self.index = faiss.read_index(self.faiss_path)
+                self._rebuild_centroids()
                 logger.info(f"✅ Loaded existing index with {len(self.meta)} sections")
             else:
                 self.index = faiss.IndexFlatIP(self.dim)
@@ -153,6 +159,7 @@ class SemanticIndex:
         """Clear the entire index"""
         self.index = faiss.IndexFlatIP(self.dim)
         self.meta = []
+        self.centroids.clear()
         
         if os.path.exists(self.meta_path):
             os.remove(self.meta_path)
@@ -208,6 +215,7 @@ class SemanticIndex:
             
             self.index.add(new_embeddings)
             self.meta.extend(new_meta)
+            self.centroids.add(doc_name, new_embeddings)
             
             self._save()
             logger.info(f"✅ Ingested {len(new_meta)} sections from {doc_name}")
@@ -245,7 +253,8 @@ class SemanticIndex:
                 logger.warning("Index is empty, cannot search")
                 return []
             
-            q_emb = self.model.encode([query], normalize_embeddings=True).astype("float32")
+            q_emb = self.query_cache.get_or_compute_many(
+                [query], lambda qs: self.model.encode(qs, normalize_embeddings=True))
             scores, idxs = self.index.search(q_emb, top_k)
             
             results = []
@@ -272,6 +281,23 @@ class SemanticIndex:
             logger.error(f"Error in search: {e}")
             return []
     
+    def _rebuild_centroids(self):
+        """Per-document mean embeddings from the stored vectors (the flat index keeps them exactly)"""
+        self.centroids.clear()
+        n = min(self.index.ntotal, len(self.meta))
+        if not n:
+            return
+        vectors = self.index.reconstruct_n(0, n)
+        rows: Dict[str, List[int]] = {}
+        for i, m in enumerate(self.meta[:n]):
+            rows.setdefault(m.doc_name, []).append(i)
+        for doc_name, doc_rows in rows.items():
+            self.centroids.add(doc_name, vectors[doc_rows])
+    
+    def related_documents(self, doc_name: str, top_n: int = 5) -> List[Dict[str, Any]]:
+        """Documents most similar to ``doc_name`` by centroid cosine similarity"""
+        return [{"doc_name": name, "score": score} for name, score in self.centroids.related(doc_name, top_n)]
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
         try:
@@ -280,7 +306,9 @@ class SemanticIndex:
                 "indexed_vectors": self.index.ntotal if self.index else 0,
                 "embedding_dimension": self.dim,
                 "model_name": self.model_name,
-                "documents": len(set(m.doc_id for m in self.meta))
+                "documents": len(set(m.doc_id for m in self.meta)),
+                "query_cache": self.query_cache.stats(),
+                "document_centroids": len(self.centroids)
             }
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed insights when the LLM provider fails
+"""
+import json
+
+import pytest
+
+from app import indexer, llm_adapter
+
+def _provider(*chunks, error=None):
+    def stream(selected_text, related):
+        yield from chunks
+        if error:
+            raise error
+    return stream
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setattr(llm_adapter, "USE_LLM", True)
+    monkeypatch.setattr(llm_adapter, "LLM_PROVIDER", "gemini")
+    return lambda stream: monkeypatch.setattr(llm_adapter, "_stream_gemini", stream)
+
+def test_failure_before_any_text_falls_back(gemini):
+    gemini(_provider(error=RuntimeError("quota exceeded")))
+    chunks = list(llm_adapter.stream_insights("graphs", []))
+    assert chunks == [llm_adapter._fallback_insights("graphs", [])]
+
+def test_failure_after_some_text_is_raised(gemini):
+    gemini(_provider("Graphs ", error=RuntimeError("connection reset")))
+    stream = llm_adapter.stream_insights("graphs", [])
+    assert next(stream) == "Graphs "
+    with pytest.raises(RuntimeError):
+        next(stream)
+
+def test_stream_route_ends_with_an_error_event(gemini, monkeypatch):
+    pytest.importorskip("azure.cognitiveservices.speech")
+    from fastapi.testclient import TestClient
+    from app import main
+
+    class Index:
+        def search(self, query, top_k=5):
+            return []
+
+    monkeypatch.setattr(indexer, "get_index", lambda: Index())
+    gemini(_provider("Graphs ", error=RuntimeError("connection reset")))
+    body = TestClient(main.app).post("/selection/analyze/stream", json={"selected_text": "graphs"}).text
+    events = [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+              for block in body.strip().split("\n\n")]
+    assert [name for name, _ in events] == ["sections", "token", "error"]
+    assert events[-1][1] == {"detail": "Error generating insights: connection reset"}
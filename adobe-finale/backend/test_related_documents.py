@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for related-document lookup by document centroid
+"""
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from app import indexer, semantic
+
+_DIM = 32
+
+class HashingEncoder:
+    """Offline stand-in for SentenceTransformer: bag of hashed words, L2-normalized"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return _DIM
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        single = isinstance(texts, str)
+        out = np.zeros((1 if single else len(texts), _DIM), dtype="float32")
+        for i, text in enumerate([texts] if single else texts):
+            for w in re.findall(r"\w+", text.lower()):
+                out[i, zlib.crc32(w.encode("utf-8")) % _DIM] += 1.0
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out[0] if single else out
+
+class TextReader:
+    """Reads test "PDFs" as one page of plain text"""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        self.pages = [type("Page", (), {"extract_text": lambda self: text})()]
+
+def _text(topic_words):
+    return "\n".join(f"Part {i} Notes\n" + " ".join(f"the {w} of {w}s" for w in topic_words) * 4
+                     for i in range(3))
+
+DOCS = {
+    "graphs.pdf": ["graph", "node", "edge", "message"],
+    "networks.pdf": ["graph", "node", "edge", "layer"],
+    "cooking.pdf": ["pasta", "sauce", "oven", "salt"],
+}
+
+@pytest.fixture
+def make_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic, "SentenceTransformer", HashingEncoder)
+    monkeypatch.setattr(semantic, "PdfReader", TextReader)
+    for name, words in DOCS.items():
+        (tmp_path / name).write_text(_text(words), encoding="utf-8")
+    (tmp_path / "index").mkdir()
+
+    def make():
+        index = semantic.SemanticIndex(index_dir=str(tmp_path / "index"))
+        monkeypatch.setattr(indexer, "_index", index)
+        return index
+
+    make.uploads = tmp_path
+    return make
+
+def test_related_documents_rank_by_centroid_and_survive_restart(make_index):
+    index = make_index()
+    for name in DOCS:
+        index.ingest_pdf(str(make_index.uploads / name), doc_id=name[:-4], doc_name=name)
+    ranked = [d["doc_name"] for d in index.related_documents("graphs.pdf")]
+    assert ranked == ["networks.pdf", "cooking.pdf"]
+
+    restarted = make_index()  # centroids are rebuilt from the stored vectors
+    assert restarted.get_stats()["document_centroids"] == 3
+    result = indexer.get_related_documents("graphs", limit=1)
+    assert result["status"] == "success" and result["filename"] == "graphs.pdf"
+    assert [(d["id"], d["filename"]) for d in result["related"]] == [("networks", "networks.pdf")]
+    assert result["related"][0]["sections"] == 3
+
+    assert indexer.get_related_documents("missing")["status"] == "error"
+
+def test_related_documents_route(make_index):
+    pytest.importorskip("azure.cognitiveservices.speech")
+    from fastapi.testclient import TestClient
+    from app import main
+
+    index = make_index()
+    for name in DOCS:
+        index.ingest_pdf(str(make_index.uploads / name), doc_id=name[:-4], doc_name=name)
+    client = TestClient(main.app)
+    r = client.get("/documents/cooking/related", params={"limit": 2})
+    assert r.status_code == 200 and len(r.json()["related"]) == 2
+    assert client.get("/documents/missing/related").status_code == 404
@@ -0,0 +1,303 @@
+# backend/app/ann_index.py
+import os
+import time
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# "auto" picks by corpus size; "flat", "hnsw" or "ivfpq" force one type
+ANN_INDEX_TYPE = os.environ.get("ANN_INDEX_TYPE", "auto").lower()
+ANN_HNSW_MIN_VECTORS = int(os.environ.get("ANN_HNSW_MIN_VECTORS", "20000"))
+ANN_IVFPQ_MIN_VECTORS = int(os.environ.get("ANN_IVFPQ_MIN_VECTORS", "250000"))
+
+HNSW_M = int(os.environ.get("ANN_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.environ.get("ANN_HNSW_EF_SEARCH", "128"))
+IVF_NPROBE = int(os.environ.get("ANN_IVF_NPROBE", "32"))
+# Filters matching at most this many vectors are searched exactly instead of through the ANN graph
+ANN_EXACT_FILTER_MAX = int(os.environ.get("ANN_EXACT_FILTER_MAX", "4096"))
+# Share of an HNSW index's vectors that may be tombstoned before it is rebuilt without them
+ANN_COMPACT_FRACTION = float(os.environ.get("ANN_COMPACT_FRACTION", "0.2"))
+IVF_TRAIN_SAMPLE = 100_000
+PQ_BITS = 8
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+def _ivf_lists(n_vectors: int) -> int:
+    return int(min(65536, max(16, 4 * np.sqrt(n_vectors))))
+
+def _pq_subquantizers(dim: int) -> int:
+    for m in (48, 32, 24, 16, 8, 4):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _min_training_vectors(n_vectors: int) -> int:
+    # faiss wants ~39 points per centroid for both the coarse and PQ codebooks
+    return 39 * max(_ivf_lists(n_vectors), 1 << PQ_BITS)
+
+def choose_index_type(n_vectors: int, requested: str = ANN_INDEX_TYPE) -> str:
+    """Index type for a corpus of ``n_vectors``; exact search while it is still cheap"""
+    if requested in INDEX_TYPES:
+        kind = requested
+    elif n_vectors >= ANN_IVFPQ_MIN_VECTORS:
+        kind = "ivfpq"
+    elif n_vectors >= ANN_HNSW_MIN_VECTORS:
+        kind = "hnsw"
+    else:
+        kind = "flat"
+    # IVF-PQ needs training data; until there is enough, HNSW stands in
+    if kind == "ivfpq" and n_vectors < _min_training_vectors(n_vectors):
+        kind = "hnsw"
+    return kind
+
+def index_type(index: faiss.Index) -> str:
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    return "flat"
+
+def _new_base(kind: str, dim: int, vectors: np.ndarray) -> faiss.Index:
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    if kind == "ivfpq":
+        nlist = _ivf_lists(len(vectors))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+        sample = vectors
+        if len(vectors) > IVF_TRAIN_SAMPLE:
+            rows = np.random.default_rng(0).choice(len(vectors), IVF_TRAIN_SAMPLE, replace=False)
+            sample = vectors[np.sort(rows)]
+        t0 = time.time()
+        index.train(np.ascontiguousarray(sample, dtype="float32"))
+        logger.info(f"🏋️ Trained IVF-PQ ({nlist} lists) on {len(sample)} vectors in {time.time() - t0:.1f}s")
+        return index
+    return faiss.IndexFlatIP(dim)
+
+def configure(index: faiss.Index) -> faiss.Index:
+    """Apply search-time parameters, which are not stored with the index"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = IVF_NPROBE
+    return index
+
+def build_index(vectors: np.ndarray, ids: Optional[np.ndarray] = None, kind: Optional[str] = None) -> faiss.Index:
+    """
+    Build an inner-product index over normalized ``vectors``.
+
+    With ``ids`` the index is wrapped in ``IndexIDMap2`` and searches return
+    those IDs; otherwise results are row positions. IVF-PQ needs training
+    data, so a corpus too small to train on gets HNSW instead.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    kind = choose_index_type(n, kind or ANN_INDEX_TYPE)
+
+    base = _new_base(kind, dim, vectors)
+    if ids is not None:
+        index = faiss.IndexIDMap2(base)
+        if n:
+            index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    else:
+        index = base
+        if n:
+            index.add(vectors)
+    return configure(index)
+
+class Tombstones:
+    """
+    IDs deleted from an index that cannot remove vectors in place (HNSW).
+    They stay in the graph, are skipped at search time through an IDSelector,
+    and are dropped for good when the index is compacted.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = np.unique(np.asarray(ids, dtype="int64"))
+        self._selector = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, vec_id: int) -> bool:
+        pos = np.searchsorted(self.ids, vec_id)
+        return bool(pos < len(self.ids) and self.ids[pos] == vec_id)
+
+    def add(self, ids: np.ndarray):
+        self.ids = np.union1d(self.ids, np.asarray(ids, dtype="int64"))
+        self._selector = None
+
+    def clear(self):
+        self.__init__()
+
+    def max_id(self) -> int:
+        return int(self.ids[-1]) if len(self.ids) else -1
+
+    def selector(self) -> Optional[faiss.IDSelector]:
+        """Selector admitting every ID except the tombstoned ones, or None when there are none"""
+        if not len(self.ids):
+            return None
+        if self._selector is None:
+            batch = faiss.IDSelectorBatch(self.ids)
+            self._selector = (batch, faiss.IDSelectorNot(batch))  # the Not selector only borrows batch
+        return self._selector[1]
+
+    def should_compact(self, index: faiss.Index) -> bool:
+        return len(self.ids) > ANN_COMPACT_FRACTION * max(index.ntotal, 1)
+
+def remove_ids(index: faiss.IndexIDMap2, ids: np.ndarray, tombstones: Tombstones) -> faiss.IndexIDMap2:
+    """
+    Remove ``ids`` in place, or tombstone them in an HNSW index, which cannot
+    delete without a full rebuild; see ``compact``.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if index_type(index) == "hnsw":
+        tombstones.add(ids)
+    else:
+        index.remove_ids(ids)
+    return index
+
+def compact(index: faiss.IndexIDMap2, tombstones: Tombstones) -> faiss.IndexIDMap2:
+    """Rebuild ``index`` without its tombstoned vectors"""
+    if not len(tombstones):
+        return index
+    all_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(all_ids, tombstones.ids)
+    vectors = index.index.reconstruct_n(0, index.ntotal)[keep]
+    tombstones.clear()
+    return build_index(vectors, ids=all_ids[keep], kind=index_type(index))
+
+def live_count(index: faiss.Index, tombstones: Tombstones) -> int:
+    return index.ntotal - len(tombstones)
+
+def _search_params(index: faiss.Index, sel: faiss.IDSelector, k: int) -> faiss.SearchParameters:
+    kind = index_type(index)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=max(HNSW_EF_SEARCH, k))
+    if kind == "ivfpq":
+        return faiss.SearchParametersIVF(sel=sel, nprobe=IVF_NPROBE)
+    return faiss.SearchParameters(sel=sel)
+
+def search(index: faiss.Index, queries: np.ndarray, k: int,
+           tombstones: Optional[Tombstones] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """``index.search`` that skips tombstoned IDs"""
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    sel = tombstones.selector() if tombstones is not None else None
+    if sel is None:
+        return index.search(queries, k)
+    return index.search(queries, k, params=_search_params(index, sel, k))
+
+def _exact_topk(queries: np.ndarray, fetch: Callable[[np.ndarray], np.ndarray], rows: np.ndarray, k: int,
+                chunk: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force inner-product top ``k`` over the vectors ``fetch(rows)``, gathered in chunks"""
+    D = np.full((len(queries), k), -np.inf, dtype="float32")
+    I = np.full((len(queries), k), -1, dtype="int64")
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        scores = queries @ fetch(part).T
+        D = np.concatenate([D, scores], axis=1)
+        I = np.concatenate([I, np.broadcast_to(part, scores.shape)], axis=1)
+        if D.shape[1] > k:
+            top = np.argpartition(-D, k - 1, axis=1)[:, :k]
+            D, I = np.take_along_axis(D, top, 1), np.take_along_axis(I, top, 1)
+    order = np.argsort(-D, axis=1, kind="stable")
+    return np.take_along_axis(D, order, 1), np.take_along_axis(I, order, 1)
+
+def search_rows(queries: np.ndarray, k: int, rows: np.ndarray,
+                vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top ``k`` among ``rows`` of ``vectors`` (row ``i`` is ID ``i``), for a
+    partition small enough to scan directly; only those rows are read.
+    Missing results are padded with ID -1, as FAISS does.
+    """
+    D, I = _exact_topk(np.ascontiguousarray(queries, dtype="float32"), lambda ids: vectors[ids],
+                       np.asarray(rows, dtype=np.int64), k)
+    I[np.isinf(D)] = -1
+    return D, I
+
+def search_filtered(index: faiss.Index, queries: np.ndarray, k: int, allowed: np.ndarray,
+                    vectors: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top ``k`` among the IDs where the boolean mask ``allowed`` is set, in one
+    pass: FAISS applies the filter while searching, so nothing has to be
+    overfetched. Small selections, and queries the approximate search could
+    not fill, are answered exactly from ``vectors`` (row ``i`` is ID ``i``), or
+    from the index itself when it stores exact vectors by ID.
+    Missing results are padded with ID -1, as FAISS does.
+    """
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    allowed = np.asarray(allowed, dtype=bool)
+    rows = np.flatnonzero(allowed)
+    fetch = None
+    if vectors is not None:
+        fetch = lambda ids: vectors[ids]
+    elif isinstance(index, faiss.IndexIDMap2) and index_type(index) != "ivfpq":
+        fetch = lambda ids: index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+    if fetch is not None and len(rows) <= ANN_EXACT_FILTER_MAX:
+        D, I = _exact_topk(queries, fetch, rows, k)
+        I[np.isinf(D)] = -1
+        return D, I
+
+    bitmap = np.packbits(allowed, bitorder="little")
+    sel = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    D, I = index.search(queries, k, params=_search_params(index, sel, k))
+
+    # A selective filter can starve the graph/list walk; complete those queries exactly
+    short = np.flatnonzero((I == -1).any(axis=1))
+    if fetch is not None and len(short) and len(rows) >= k:
+        D[short], I[short] = _exact_topk(queries[short], fetch, rows, k)
+    return D, I
+
+def exact_vectors(index: faiss.Index) -> Optional[np.ndarray]:
+    """All stored vectors in insertion order, or None if the index is lossy"""
+    if index_type(index) == "ivfpq":
+        return None
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return base.reconstruct_n(0, base.ntotal) if base.ntotal else np.zeros((0, base.d), dtype="float32")
+
+def recall_report(index: faiss.Index, vectors: np.ndarray, ids: Optional[np.ndarray] = None,
+                  k: int = 10, n_queries: int = 200) -> Dict[str, Any]:
+    """
+    Compare ``index`` with an exact flat search over the same ``vectors``:
+    recall@k and mean per-query latency of each, using sampled stored
+    vectors as queries.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n = len(vectors)
+    if n == 0:
+        return {}
+    k = min(k, n)
+    rows = np.random.default_rng(0).choice(n, min(n_queries, n), replace=False)
+    queries = vectors[rows]
+
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    t0 = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    if ids is not None:
+        truth = np.asarray(ids, dtype="int64")[truth]
+
+    t0 = time.perf_counter()
+    _, found = index.search(queries, k)
+    ann_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return {
+        "index_type": index_type(index),
+        "vectors": n,
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(hits / (k * len(queries)), 4),
+        "flat_ms_per_query": round(flat_ms, 3),
+        "ann_ms_per_query": round(ann_ms, 3),
+    }
@@ -0,0 +1,209 @@
+# backend/app/bm25.py
+import os
+import math
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tokens import term_counts
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ("dense", "bm25", "hybrid")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+DELTA_MERGE_MIN = 200_000  # postings
+
+def rrf_fuse(rankings: Sequence[Sequence[Tuple[int, float]]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of ranked ``(key, score)`` lists into one ``(key, fused score)`` list"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (key, _) in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+class BM25Index:
+    """
+    In-process inverted index with BM25 scoring over integer document keys.
+
+    Postings live in an immutable CSR segment plus a small in-memory delta
+    that ingestion appends to; ``compact()`` merges the delta (and drops
+    removed keys) into a new segment, e.g. before saving. Terms are the
+    32-bit word hashes from ``tokens.term_counts``.
+    """
+
+    def __init__(self):
+        self._terms = np.zeros(0, dtype=np.uint32)   # sorted term IDs of the segment
+        self._offsets = np.zeros(1, dtype=np.int64)  # postings of _terms[i] are [_offsets[i], _offsets[i+1])
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._tfs = np.zeros(0, dtype=np.float32)
+        self._delta: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._n_docs = 0
+        self._total_len = 0.0
+        self._removed: set = set()  # tombstoned keys whose postings are still stored
+        self._delta_postings = 0
+
+    # ---------- Updates ----------
+    def _grow(self, max_key: int):
+        if max_key < len(self._alive):
+            return
+        size = max(max_key + 1, 2 * len(self._alive), 1024)
+        self._doc_len = np.concatenate([self._doc_len, np.zeros(size - len(self._doc_len), dtype=np.float32)])
+        self._alive = np.concatenate([self._alive, np.zeros(size - len(self._alive), dtype=bool)])
+
+    def add(self, key: int, text: str):
+        self.add_counts([(key, term_counts(text))])
+
+    def add_counts(self, docs: Iterable[Tuple[int, Dict[int, int]]]):
+        """Add documents already tokenized with ``tokens.term_counts`` (tokenize outside any lock)"""
+        docs = [(int(key), counts) for key, counts in docs]
+        if docs:
+            self._grow(max(key for key, _ in docs))
+        self.remove(key for key, _ in docs)
+        if self._removed.intersection(key for key, _ in docs):
+            self.compact()  # a reused key must not inherit its previous postings
+        for key, counts in docs:
+            length = sum(counts.values())
+            for term, tf in counts.items():
+                keys, tfs = self._delta.setdefault(term, ([], []))
+                keys.append(key)
+                tfs.append(tf)
+            self._delta_postings += len(counts)
+            self._doc_len[key] = length
+            self._alive[key] = True
+            self._n_docs += 1
+            self._total_len += length
+        # Amortized: the delta is merged once it is a sizeable fraction of the segment
+        if self._delta_postings > max(DELTA_MERGE_MIN, len(self._keys) // 4):
+            self.compact()
+
+    def remove(self, keys: Iterable[int]):
+        """Tombstone ``keys``; their postings are dropped at the next compaction"""
+        for key in keys:
+            key = int(key)
+            if key < len(self._alive) and self._alive[key]:
+                self._alive[key] = False
+                self._removed.add(key)
+                self._n_docs -= 1
+                self._total_len -= float(self._doc_len[key])
+
+    def clear(self):
+        self.__init__()
+
+    def compact(self):
+        """Merge the delta into the segment and drop removed keys"""
+        if not self._delta and not self._removed:
+            return
+        postings: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for i, term in enumerate(self._terms.tolist()):
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+            postings[term] = (self._keys[lo:hi], self._tfs[lo:hi])
+        for term, (keys, tfs) in self._delta.items():
+            old_k, old_t = postings.get(term, (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)))
+            postings[term] = (np.concatenate([old_k, np.asarray(keys, dtype=np.int64)]),
+                              np.concatenate([old_t, np.asarray(tfs, dtype=np.float32)]))
+
+        terms, offsets, all_keys, all_tfs = [], [0], [], []
+        for term in sorted(postings):
+            keys, tfs = postings[term]
+            live = self._alive[keys]
+            if not live.any():
+                continue
+            terms.append(term)
+            all_keys.append(keys[live])
+            all_tfs.append(tfs[live])
+            offsets.append(offsets[-1] + int(live.sum()))
+        self._terms = np.asarray(terms, dtype=np.uint32)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._keys = np.concatenate(all_keys) if all_keys else np.zeros(0, dtype=np.int64)
+        self._tfs = np.concatenate(all_tfs) if all_tfs else np.zeros(0, dtype=np.float32)
+        self._delta = {}
+        self._removed = set()
+        self._delta_postings = 0
+
+    # ---------- Queries ----------
+    def _postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        keys, tfs = [], []
+        i = int(np.searchsorted(self._terms, term))
+        if i < len(self._terms) and self._terms[i] == term:
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+            keys.append(self._keys[lo:hi])
+            tfs.append(self._tfs[lo:hi])
+        if term in self._delta:
+            dk, dt = self._delta[term]
+            keys.append(np.asarray(dk, dtype=np.int64))
+            tfs.append(np.asarray(dt, dtype=np.float32))
+        if not keys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        keys, tfs = np.concatenate(keys), np.concatenate(tfs)
+        live = self._alive[keys]
+        return keys[live], tfs[live]
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top ``k`` ``(key, score)`` pairs for ``query``. ``allowed`` is an optional
+        boolean mask over keys restricting which documents may match.
+        """
+        if self._n_docs == 0 or k <= 0:
+            return []
+        avgdl = self._total_len / self._n_docs if self._n_docs else 1.0
+        all_keys, all_scores = [], []
+        for term in term_counts(query):
+            keys, tfs = self._postings(term)
+            df = len(keys)
+            if allowed is not None and df:
+                keys_ok = keys < len(allowed)
+                keys_ok[keys_ok] = allowed[keys[keys_ok]]
+                keys, tfs = keys[keys_ok], tfs[keys_ok]
+            if not len(keys):
+                continue
+            idf = math.log(1.0 + (self._n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._doc_len[keys] / avgdl)
+            all_keys.append(keys)
+            all_scores.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+        if not all_keys:
+            return []
+
+        keys = np.concatenate(all_keys)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(uniq[i]), float(scores[i])) for i in top]
+
+    # ---------- Persistence ----------
+    def keys(self) -> np.ndarray:
+        return np.flatnonzero(self._alive)
+
+    def stats(self) -> Dict[str, int]:
+        return {"documents": self._n_docs, "terms": len(self._terms) + len(self._delta),
+                "postings": int(len(self._keys) + self._delta_postings)}
+
+    def save(self, path: str):
+        """Compact and write atomically"""
+        self.compact()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, terms=self._terms, offsets=self._offsets, keys=self._keys, tfs=self._tfs,
+                     doc_len=self._doc_len, alive=self._alive)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            index = cls()
+            index._terms, index._offsets = data["terms"], data["offsets"]
+            index._keys, index._tfs = data["keys"], data["tfs"]
+            index._doc_len, index._alive = data["doc_len"].copy(), data["alive"].copy()
+            index._n_docs = int(index._alive.sum())
+            index._total_len = float(index._doc_len[index._alive].sum())
+            return index
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable keyword index {os.path.basename(path)}: {e}")
+            return None
@@ -0,0 +1,123 @@
+# backend/app/centroids.py
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Documents kept by the first stage of a two-stage search (0 searches every section)
+SEARCH_TOP_DOCS = int(os.environ.get("SEARCH_TOP_DOCS", "0"))
+
+class DocumentCentroids:
+    """
+    Mean section embedding of every document, kept as running sums so
+    ingest and delete update it in O(sections of that document).
+
+    Rows are dense; removing a document moves the last row into its slot.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.names: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._sums = np.zeros((0, dim), dtype="float32")
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._unit: Optional[np.ndarray] = None  # normalized centroids, rebuilt lazily
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, doc_name: str) -> bool:
+        return doc_name in self._pos
+
+    def size(self, doc_name: str) -> int:
+        """Number of sections folded into ``doc_name``'s centroid"""
+        pos = self._pos.get(doc_name)
+        return 0 if pos is None else int(self._counts[pos])
+
+    def add(self, doc_name: str, vectors: np.ndarray):
+        """Fold the section ``vectors`` of ``doc_name`` into its centroid"""
+        if not len(vectors):
+            return
+        pos = self._pos.get(doc_name)
+        if pos is None:
+            pos = self._pos[doc_name] = len(self.names)
+            self.names.append(doc_name)
+            self._sums = np.vstack([self._sums, np.zeros((1, self.dim), dtype="float32")])
+            self._counts = np.append(self._counts, 0)
+        self._sums[pos] += np.asarray(vectors, dtype="float32").sum(axis=0)
+        self._counts[pos] += len(vectors)
+        self._unit = None
+
+    def remove(self, doc_name: str):
+        pos = self._pos.pop(doc_name, None)
+        if pos is None:
+            return
+        last = len(self.names) - 1
+        if pos != last:
+            self.names[pos] = self.names[last]
+            self._pos[self.names[pos]] = pos
+            self._sums[pos] = self._sums[last]
+            self._counts[pos] = self._counts[last]
+        self.names.pop()
+        self._sums = self._sums[:last]
+        self._counts = self._counts[:last]
+        self._unit = None
+
+    def clear(self):
+        self.__init__(self.dim)
+
+    def unit(self) -> np.ndarray:
+        """(n_docs, dim) L2-normalized centroids, for cosine similarity"""
+        if self._unit is None:
+            norms = np.linalg.norm(self._sums, axis=1, keepdims=True) + 1e-12
+            self._unit = self._sums / norms
+        return self._unit
+
+    def top(self, queries: np.ndarray, m: int) -> List[List[Tuple[str, float]]]:
+        """The ``m`` most similar documents for each (normalized) query vector"""
+        if not self.names or m <= 0:
+            return [[] for _ in queries]
+        scores = np.asarray(queries, dtype="float32") @ self.unit().T
+        m = min(m, len(self.names))
+        top = np.argpartition(-scores, m - 1, axis=1)[:, :m]
+        out = []
+        for row, cand in zip(scores, top):
+            cand = cand[np.argsort(-row[cand], kind="stable")]
+            out.append([(self.names[j], float(row[j])) for j in cand])
+        return out
+
+    def related(self, doc_name: str, n: int) -> List[Tuple[str, float]]:
+        """Documents closest to ``doc_name``, excluding itself"""
+        pos = self._pos.get(doc_name)
+        if pos is None:
+            return []
+        ranked = self.top(self.unit()[pos:pos + 1], n + 1)[0]
+        return [(name, score) for name, score in ranked if name != doc_name][:n]
+
+    # ---------- Persistence ----------
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, names=np.array(self.names, dtype=str), sums=self._sums, counts=self._counts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> Optional["DocumentCentroids"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            if data["sums"].shape[1:] != (dim,):
+                raise ValueError(f"dimension {data['sums'].shape[1:]} != {dim}")
+            centroids = cls(dim)
+            centroids.names = [str(n) for n in data["names"]]
+            centroids._pos = {n: i for i, n in enumerate(centroids.names)}
+            centroids._sums = data["sums"].astype("float32")
+            centroids._counts = data["counts"].astype(np.int64)
+            return centroids
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable document centroids {os.path.basename(path)}: {e}")
+            return None
@@ -0,0 +1,46 @@
+# backend/app/chat_context.py
+import os
+import re
+from typing import Any, Dict, List
+
+CHAT_TOP_K = int(os.environ.get("CHAT_TOP_K", "8"))                     # sections retrieved per question
+CHAT_CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS", "3000"))  # prompt budget for those sections
+CHAT_SEARCH_MODE = os.environ.get("CHAT_SEARCH_MODE", "hybrid")
+_CHARS_PER_TOKEN = 4     # close enough for English prose with Gemini/GPT tokenizers
+_MIN_PARTIAL_TOKENS = 64  # below this a truncated section adds little
+
+_SENT_END_RE = re.compile(r"[.!?](?=\s)")
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+def _truncate(text: str, max_chars: int) -> str:
+    """``text`` cut to ``max_chars``, at the last sentence end when there is one"""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    ends = [m.end() for m in _SENT_END_RE.finditer(head + " ")]
+    return head[:ends[-1]] if ends else head.rsplit(" ", 1)[0] + " …"
+
+def build_context(sections: List[Dict[str, Any]], budget_tokens: int = CHAT_CONTEXT_TOKENS) -> Dict[str, Any]:
+    """
+    Numbered context blocks from ``sections`` (most relevant first, each with
+    pdf, heading, page_start, page_end and text) within ``budget_tokens``.
+
+    Sections are taken whole in rank order; the first one that does not fit
+    is cut at a sentence boundary if enough budget is left, and the rest are
+    dropped, so the prompt size is bounded whatever the document length.
+    """
+    blocks, used, sources = [], 0, []
+    for s in sections:
+        header = f"[{len(blocks) + 1}] {s['heading']} (pages {s['page_start']}-{s['page_end']})\n"
+        left = budget_tokens - used - estimate_tokens(header)
+        if left < _MIN_PARTIAL_TOKENS:
+            break
+        text = _truncate(s["text"].strip(), left * _CHARS_PER_TOKEN)
+        blocks.append(header + text)
+        used += estimate_tokens(blocks[-1])
+        sources.append({"heading": s["heading"], "page_start": s["page_start"], "page_end": s["page_end"]})
+        if len(text) < len(s["text"].strip()):
+            break
+    return {"context": "\n\n".join(blocks), "tokens": used, "sources": sources}
@@ -0,0 +1,125 @@
+# backend/app/content_store.py
+import os
+import hashlib
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+HASH_CHUNK_SIZE = 1 << 20  # 1MB
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_stream(fileobj, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Hash a binary file object from its current position in fixed-size chunks"""
+    h = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+def sha256_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Hash a file without loading it into memory"""
+    with open(path, "rb") as f:
+        return sha256_stream(f, chunk_size)
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"upload exceeds {limit} bytes")
+        self.limit = limit
+
+async def spool_upload(upload, dest_dir: str, max_bytes: int = 0,
+                       chunk_size: int = HASH_CHUNK_SIZE) -> Tuple[str, str, int]:
+    """
+    Stream ``upload`` (anything with an async ``read(n)``, e.g. an UploadFile)
+    into a hidden temp file in ``dest_dir``, hashing as it goes.
+
+    Returns ``(temp_path, sha256, size)``; move the temp file into place with
+    ``os.replace`` so readers never see a partial PDF. Raises UploadTooLarge
+    as soon as ``max_bytes`` is exceeded, leaving nothing behind.
+    """
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, h.hexdigest(), size
+
+class ContentStore:
+    """
+    Content-addressed registry of uploaded PDFs.
+
+    The first file seen with a given SHA-256 is the canonical copy and owns
+    the indexed sections; later byte-identical files are recorded as aliases
+    of it so they are never parsed, embedded or returned twice.
+    """
+
+    def __init__(self):
+        self.by_hash: Dict[str, str] = {}   # sha256 -> canonical file name
+        self.aliases: Dict[str, str] = {}   # duplicate file name -> canonical file name
+
+    def canonical(self, name: str) -> str:
+        return self.aliases.get(name, name)
+
+    def lookup(self, sha: str) -> Optional[str]:
+        return self.by_hash.get(sha)
+
+    def register(self, name: str, sha: str) -> Optional[str]:
+        """Record ``name``; return the canonical name if it duplicates an existing file"""
+        canonical = self.by_hash.get(sha)
+        if canonical is None:
+            self.by_hash[sha] = name
+            return None
+        if canonical != name:
+            self.aliases[name] = canonical
+        return canonical
+
+    def unregister(self, name: str):
+        """Drop the hash record of canonical ``name``, keeping its aliases, so it can be registered again"""
+        for sha, c in list(self.by_hash.items()):
+            if c == name:
+                del self.by_hash[sha]
+
+    def aliases_of(self, canonical: str):
+        return [a for a, c in self.aliases.items() if c == canonical]
+
+    def forget(self, name: str):
+        """Drop ``name`` whether it is an alias or a canonical copy"""
+        if self.aliases.pop(name, None) is not None:
+            return
+        for sha, c in list(self.by_hash.items()):
+            if c == name:
+                del self.by_hash[sha]
+        for alias in self.aliases_of(name):
+            del self.aliases[alias]
+
+    def rename_canonical(self, old: str, new: str):
+        """Promote alias ``new`` to canonical in place of ``old``"""
+        self.aliases.pop(new, None)
+        for sha, c in self.by_hash.items():
+            if c == old:
+                self.by_hash[sha] = new
+        for alias, c in self.aliases.items():
+            if c == old:
+                self.aliases[alias] = new
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"by_hash": self.by_hash, "aliases": self.aliases}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ContentStore":
+        store = cls()
+        if data:
+            store.by_hash = dict(data.get("by_hash", {}))
+            store.aliases = dict(data.get("aliases", {}))
+        return store
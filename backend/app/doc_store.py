@@ -0,0 +1,94 @@
+# backend/app/doc_store.py
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    seq        INTEGER PRIMARY KEY,
+    pdf_name   TEXT NOT NULL,
+    heading    TEXT NOT NULL,
+    page_start INTEGER NOT NULL,
+    page_end   INTEGER NOT NULL,
+    text       TEXT NOT NULL,
+    vector     BLOB NOT NULL,
+    sent_vecs  BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_sections_pdf_name ON sections(pdf_name);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_SECTION_FIELDS = ["pdf_name", "heading", "page_start", "page_end", "text"]
+
+class DocStore:
+    """
+    SQLite persistence for DocIndex: one row per section with its embedding
+    and sentence vectors, plus small JSON metadata (documents, file
+    fingerprints, content hashes).
+
+    Rows are kept in section order, so an upload writes only its new rows
+    and a removal deletes only the removed documents' rows. Each write
+    stores the metadata in the same transaction, so documents are never
+    recorded without their sections.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def append(self, sections: List[Any], vectors: np.ndarray, meta: Dict[str, Any]):
+        """Add rows for ``sections`` (Section objects) and their ``vectors``, then store ``meta``"""
+        rows = [(s.pdf_name, s.heading, s.page_start, s.page_end, s.text,
+                 np.ascontiguousarray(v, dtype=np.float32).tobytes(),
+                 None if s.sent_vecs is None else np.ascontiguousarray(s.sent_vecs, dtype=np.float16).tobytes())
+                for s, v in zip(sections, vectors)]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO sections ({', '.join(_SECTION_FIELDS)}, vector, sent_vecs) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            self._put_meta(meta)
+
+    def drop(self, names: List[str], renames: Dict[str, str], meta: Dict[str, Any]):
+        """Delete the sections of ``names``, move sections of ``old`` to ``new`` per ``renames``, store ``meta``"""
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE sections SET pdf_name = ? WHERE pdf_name = ?",
+                                   [(new, old) for old, new in renames.items()])
+            self._conn.executemany("DELETE FROM sections WHERE pdf_name = ?", [(n,) for n in names])
+            self._put_meta(meta)
+
+    def put_meta(self, meta: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._put_meta(meta)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sections")
+            self._conn.execute("DELETE FROM meta")
+
+    def load(self) -> Tuple[List[Dict[str, Any]], np.ndarray, List[Optional[np.ndarray]], Dict[str, Any]]:
+        """(section fields, vectors, sentence vectors or None per section, meta), in section order"""
+        with self._lock:
+            meta = {k: json.loads(v) for k, v in self._conn.execute("SELECT key, value FROM meta")}
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_SECTION_FIELDS)}, vector, sent_vecs FROM sections ORDER BY seq").fetchall()
+        fields = [dict(zip(_SECTION_FIELDS, r[:5])) for r in rows]
+        vectors = np.frombuffer(b"".join(r[5] for r in rows), dtype=np.float32).reshape(len(rows), self.dim).copy()
+        sent_vecs = [None if r[6] is None else np.frombuffer(r[6], dtype=np.float16).reshape(-1, self.dim)
+                     for r in rows]
+        return fields, vectors, sent_vecs, meta
+
+    def _put_meta(self, meta: Dict[str, Any]):
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               [(k, json.dumps(v, ensure_ascii=False)) for k, v in meta.items()])
@@ -1,14 +1,12 @@
 # backend/app/indexer.py
 import os
-import shutil
 import logging
 from typing import List, Dict, Any, Optional
 from fastapi import UploadFile, HTTPException
 from .semantic import SemanticIndex, UPLOAD_DIR
+from .content_store import spool_upload, UploadTooLarge
 import re
 from datetime import datetime
-import numpy as np
-import faiss
 
 logger = logging.getLogger(__name__)
 
@@ -39,24 +37,28 @@ async def save_pdf(file: UploadFile) -> str:
                 detail=f"Only PDF files allowed. Received: {file.filename}"
             )
         
-        # Validate file size (max 50MB)
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset to beginning
-        
-        if file_size > 50 * 1024 * 1024:  # 50MB
+        # Stream to a temp file, enforcing the size limit (max 50MB) and hashing on the fly
+        try:
+            tmp_path, content_hash, file_size = await spool_upload(file, UPLOAD_DIR, max_bytes=50 * 1024 * 1024)
+        except UploadTooLarge:
             raise HTTPException(
                 status_code=400,
                 detail="File too large. Maximum size: 50MB"
             )
         
+        # Reuse an already indexed byte-identical PDF instead of storing a copy
+        duplicate_of = get_index().find_duplicate(content_hash)
+        if duplicate_of:
+            os.remove(tmp_path)
+            logger.info(f"PDF {file.filename} is identical to {duplicate_of}, not storing a copy")
+            return os.path.join(UPLOAD_DIR, duplicate_of)
+        
         # Create safe filename
         safe_filename = _create_safe_filename(file.filename)
         dest_path = os.path.join(UPLOAD_DIR, safe_filename)
         
-        # Save file
-        with open(dest_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        # Move into place atomically
+        os.replace(tmp_path, dest_path)
         
         logger.info(f"PDF saved: {safe_filename} ({file_size} bytes)")
         return dest_path
@@ -186,52 +188,50 @@ def get_documents() -> List[Dict[str, Any]]:
         logger.error(f"Error getting documents: {e}")
         return []
 
+def get_related_documents(doc_name: str, limit: int = 5) -> Dict[str, Any]:
+    """Documents most similar to ``doc_name``, with the same summary fields as get_documents"""
+    try:
+        index = get_index()
+        related = index.related_documents(doc_name, top_n=limit)
+        if not related and doc_name not in index.centroids:
+            return {
+                "status": "error",
+                "error": f"Document '{doc_name}' not found in index"
+            }
+        
+        docs = {d["doc_name"]: d for d in get_documents()}
+        for item in related:
+            doc = docs.get(item["doc_name"], {})
+            item.update(doc_id=doc.get("doc_id"), total_sections=doc.get("total_sections", 0),
+                        total_words=doc.get("total_words", 0))
+        
+        return {
+            "status": "success",
+            "doc_name": doc_name,
+            "related": related
+        }
+        
+    except Exception as e:
+        logger.error(f"Error finding documents related to '{doc_name}': {e}")
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
 def delete_document(doc_name: str) -> Dict[str, Any]:
     """Delete a document and its sections from the index"""
     try:
         index = get_index()
         
-        # Find sections to remove
-        sections_to_remove = [i for i, section in enumerate(index.meta) 
-                            if section.doc_name == doc_name]
+        # Drop the document's vectors by ID; remaining sections keep their embeddings
+        sections_removed = index.delete_document(doc_name)
         
-        if not sections_to_remove:
+        if not sections_removed:
             return {
                 "status": "error",
                 "error": f"Document '{doc_name}' not found in index"
             }
         
-        # Remove sections (in reverse order to maintain indices)
-        for i in reversed(sections_to_remove):
-            del index.meta[i]
-        
-        # Rebuild FAISS index
-        if index.meta:
-            # Extract remaining embeddings
-            remaining_embeddings = []
-            for section in index.meta:
-                try:
-                    embedding = index.model.encode(section.content, normalize_embeddings=True)
-                    remaining_embeddings.append(embedding)
-                except Exception as e:
-                    logger.error(f"Error encoding section {section.id}: {e}")
-                    continue
-            
-            if remaining_embeddings:
-                # Create new index with remaining embeddings
-                new_embeddings = np.vstack(remaining_embeddings).astype("float32")
-                index.index = faiss.IndexFlatIP(index.dim)
-                index.index.add(new_embeddings)
-            else:
-                # No valid embeddings left
-                index.index = faiss.IndexFlatIP(index.dim)
-        else:
-            # No sections left
-            index.index = faiss.IndexFlatIP(index.dim)
-        
-        # Save updated index
-        index._save()
-        
         # Remove PDF file if it exists
         pdf_path = os.path.join(UPLOAD_DIR, doc_name)
         if os.path.exists(pdf_path):
@@ -243,7 +243,7 @@ def delete_document(doc_name: str) -> Dict[str, Any]:
         return {
             "status": "success",
             "deleted_document": doc_name,
-            "sections_removed": len(sections_to_remove),
+            "sections_removed": sections_removed,
             "remaining_sections": len(index.meta)
         }
         
@@ -1,6 +1,9 @@
 import os
 from typing import List, Dict, Any, Tuple
-from .llm_adapter import gemini_complete
+from .llm_adapter import gemini_complete, gemini_complete_async, gemini_stream_async
+
+# Bump when either prompt changes, so cached insight responses are not reused
+PROMPT_VERSION = "1"
 
 _SYSTEM_PROMPT = """You are an expert research analyst creating contextual insights across multiple PDF documents.
 
@@ -42,7 +45,7 @@ IMPORTANT RULES:
 - Keep each section concise but comprehensive
 """
 
-def generate_insights_from_selection(selection: str, related: List[Dict[str, Any]]):
+def _insights_prompt(selection: str, related: List[Dict[str, Any]]) -> str:
     # Build grounded context for Gemini
     context_blocks = []
     for r in related:
@@ -54,7 +57,7 @@ CONTENT: {r['snippet']}"""
     
     context = "\n\n".join(context_blocks) if context_blocks else "No related sections found in current documents."
 
-    user_prompt = f"""SELECTED TEXT:
+    return f"""SELECTED TEXT:
 \"\"\"{selection}\"\"\"
 
 RELEVANT DOCUMENT SECTIONS (from your library):
@@ -72,17 +75,24 @@ Generate insights that help researchers understand:
 
 Focus on academic quality and research insights."""
 
-    completion = gemini_complete(system_prompt=_SYSTEM_PROMPT, user_prompt=user_prompt)
+def generate_insights_from_selection(selection: str, related: List[Dict[str, Any]]):
+    completion = gemini_complete(system_prompt=_SYSTEM_PROMPT, user_prompt=_insights_prompt(selection, related))
     
     # Generate podcast script from insights
     podcast_script = _create_podcast_script(selection, completion, related)
     
     return completion, podcast_script
 
-def _create_podcast_script(selection: str, insights: str, related: List[Dict[str, Any]]) -> str:
-    """Create an engaging podcast script from the insights"""
-    
-    podcast_prompt = f"""Create an engaging, interactive 3-5 minute research podcast transcript from these insights.
+async def generate_insights_async(selection: str, related: List[Dict[str, Any]]) -> str:
+    """Insights only, without blocking the event loop; pair with create_podcast_script_async"""
+    return await gemini_complete_async(system_prompt=_SYSTEM_PROMPT, user_prompt=_insights_prompt(selection, related))
+
+def stream_insights_async(selection: str, related: List[Dict[str, Any]]):
+    """Insight text chunks as Gemini produces them"""
+    return gemini_stream_async(system_prompt=_SYSTEM_PROMPT, user_prompt=_insights_prompt(selection, related))
+
+def _podcast_prompt(selection: str, insights: str) -> str:
+    return f"""Create an engaging, interactive 3-5 minute research podcast transcript from these insights.
 
 SELECTED TEXT: {selection}
 
@@ -110,14 +120,30 @@ Create a natural conversation flow between two hosts discussing the research. Us
 
 CRITICAL: DO NOT include any stage directions like "(Intro Music fades in and out)", "(Outro Music fades in)", or any text in parentheses. Only include the actual spoken conversation between Sarah and Alex."""
 
+_PODCAST_SYSTEM_PROMPT = "You are an expert podcast transcript writer specializing in academic research content. Create natural, conversational transcripts that make complex research accessible and exciting. Focus on smooth dialogue flow, remove stage directions, use simple speaker labels (Sarah: and Alex:), and ensure the conversation sounds like a real podcast. Keep it engaging and conversational without being overly formal."
+
+def _create_podcast_script(selection: str, insights: str, related: List[Dict[str, Any]]) -> str:
+    """Create an engaging podcast script from the insights"""
     try:
         return gemini_complete(
-            system_prompt="You are an expert podcast transcript writer specializing in academic research content. Create natural, conversational transcripts that make complex research accessible and exciting. Focus on smooth dialogue flow, remove stage directions, use simple speaker labels (Sarah: and Alex:), and ensure the conversation sounds like a real podcast. Keep it engaging and conversational without being overly formal.",
-            user_prompt=podcast_prompt
+            system_prompt=_PODCAST_SYSTEM_PROMPT,
+            user_prompt=_podcast_prompt(selection, insights)
         )
     except:
         # Enhanced fallback script if Gemini fails
-        return f"""Sarah: Welcome to Research Insights, where we dive deep into the latest academic discoveries! I'm Sarah, and today we're exploring a fascinating concept from your research.
+        return FALLBACK_PODCAST_SCRIPT
+
+async def create_podcast_script_async(selection: str, insights: str) -> str:
+    """Async counterpart of _create_podcast_script, with the same fallback"""
+    try:
+        return await gemini_complete_async(
+            system_prompt=_PODCAST_SYSTEM_PROMPT,
+            user_prompt=_podcast_prompt(selection, insights)
+        )
+    except Exception:
+        return FALLBACK_PODCAST_SCRIPT
+
+FALLBACK_PODCAST_SCRIPT = """Sarah: Welcome to Research Insights, where we dive deep into the latest academic discoveries! I'm Sarah, and today we're exploring a fascinating concept from your research.
 
 Alex: Hi everyone! I'm Alex, and I'm excited to break down this concept across multiple research papers. What we found is absolutely fascinating!
 
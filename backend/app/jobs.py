@@ -0,0 +1,183 @@
+# backend/app/jobs.py
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_JOB_WORKERS = int(os.environ.get("INGEST_JOB_WORKERS", "1"))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_DELAY = float(os.environ.get("INGEST_RETRY_DELAY", "10"))
+
+# Files that reach one of these states are never processed again
+FILE_DONE_STATES = ("indexed", "duplicate", "failed")
+JOB_DONE_STATES = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id         TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    error      TEXT,
+    retry_at   REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id     TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    detail     TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+"""
+
+# Processes a batch of paths, calling progress(name, status, detail) per file
+ProcessFn = Callable[[List[str], Callable[[str, str, Optional[str]], None]], Any]
+
+class JobQueue:
+    """
+    SQLite-backed queue of PDF ingestion jobs.
+
+    Jobs survive restarts: anything left ``running`` by a previous process is
+    queued again and only its unfinished files are reprocessed. A fixed pool
+    of worker threads bounds how much ingestion runs at once, and a job whose
+    batch raises is retried up to ``max_attempts`` times.
+    """
+
+    def __init__(self, db_path: str, process: ProcessFn, workers: int = INGEST_JOB_WORKERS,
+                 max_attempts: int = INGEST_MAX_ATTEMPTS, retry_delay: float = INGEST_RETRY_DELAY):
+        self.process = process
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        with self._lock, self._conn:
+            resumed = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (time.time(),)).rowcount
+        if resumed:
+            logger.info(f"🔁 Re-queued {resumed} ingestion jobs interrupted by a restart")
+
+    # ---------- Public ----------
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def submit(self, paths: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, now, now))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, name, path, status, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(job_id, os.path.basename(p), p, now) for p in paths])
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, attempts, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+            if row is None:
+                return None
+            files = self._conn.execute(
+                "SELECT name, status, detail, updated_at FROM job_files WHERE job_id = ? ORDER BY rowid",
+                (job_id,)).fetchall()
+
+        job = dict(zip(("id", "status", "attempts", "error", "created_at", "updated_at"), row))
+        job["files"] = [{"name": n, "status": s, "detail": d} for n, s, d, _ in files]
+        job["updated_at"] = max([job["updated_at"]] + [f[3] for f in files])
+        counts: Dict[str, int] = {}
+        for f in job["files"]:
+            counts[f["status"]] = counts.get(f["status"], 0) + 1
+        job["counts"] = counts
+        job["total"] = len(files)
+        job["done"] = sum(counts.get(s, 0) for s in FILE_DONE_STATES)
+        return job
+
+    # ---------- Internal ----------
+    def _claim(self) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND retry_at <= ? ORDER BY created_at LIMIT 1",
+                (now,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, row[0]))
+            return row[0]
+
+    def _set_file(self, job_id: str, name: str, status: str, detail: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET status = ?, detail = ?, updated_at = ? WHERE job_id = ? AND name = ?",
+                (status, detail, time.time(), job_id, name))
+
+    def _set_job(self, job_id: str, status: str, error: Optional[str] = None, retry_at: float = 0):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, retry_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, retry_at, time.time(), job_id))
+
+    def _worker(self):
+        while not self._stopped:
+            job_id = self._claim()
+            if job_id is None:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            self._run(job_id)
+
+    def _run(self, job_id: str):
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            files = self._conn.execute(
+                f"SELECT name, path FROM job_files WHERE job_id = ? AND status NOT IN "
+                f"({', '.join('?' for _ in FILE_DONE_STATES)})", (job_id, *FILE_DONE_STATES)).fetchall()
+
+        paths = []
+        for name, path in files:
+            if os.path.exists(path):
+                paths.append(path)
+            else:
+                self._set_file(job_id, name, "failed", "file not found")
+
+        t0 = time.time()
+        try:
+            if paths:
+                self.process(paths, lambda name, status, detail=None: self._set_file(job_id, name, status, detail))
+            self._set_job(job_id, "done")
+            logger.info(f"✅ Ingestion job {job_id} finished: {len(paths)} files in {time.time() - t0:.1f}s")
+        except Exception as e:
+            if attempts >= self.max_attempts:
+                logger.error(f"❌ Ingestion job {job_id} failed after {attempts} attempts: {e}")
+                self._set_job(job_id, "failed", str(e))
+            else:
+                logger.warning(f"⚠️ Ingestion job {job_id} attempt {attempts} failed, retrying: {e}")
+                self._set_job(job_id, "queued", str(e), retry_at=time.time() + self.retry_delay)
@@ -1,22 +1,191 @@
 import os
-from typing import Optional
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict
 import google.generativeai as genai
 
 # Use GEMINI_API_KEY environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # in-flight requests per provider
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds, queueing for a slot included
+
+class ProviderPool:
+    """
+    Concurrency limit and timeout shared by every caller of one LLM provider.
+
+    Sync callers and async callers draw from the same slots; the async
+    side only hands the wait to a thread when no slot is free, so the
+    uncontended path never leaves the event loop. Those waits run on the
+    pool's own executor of ``max_concurrency`` threads, never on the
+    event loop's default executor that request handlers also use.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._waiters = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                           thread_name_prefix=f"llm-{name}-wait")
+        self.in_flight = 0
+        self.requests = 0
+        self.queued = 0
+        self.timeouts = 0
+
+    def _wait(self, deadline: float) -> bool:
+        return self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+
+    def _queue(self):
+        with self._lock:
+            self.queued += 1
+
+    def _acquired(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        return TimeoutError(f"{self.name}: no free slot within {self.timeout:.0f}s "
+                            f"({self.max_concurrency} requests in flight)")
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            self._queue()
+            if not self._wait(time.monotonic() + self.timeout):
+                raise self._timed_out()
+        self._acquired()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        if not self._slots.acquire(blocking=False):
+            self._queue()
+            # Waiters beyond the executor's threads queue without a thread; the deadline
+            # still counts from now
+            wait = self._waiters.submit(self._wait, time.monotonic() + self.timeout)
+            try:
+                ok = await asyncio.wrap_future(wait)
+            except asyncio.CancelledError:
+                # A wait that already started can't be interrupted: hand its slot back once it gets one
+                wait.add_done_callback(lambda f: not f.cancelled() and f.result() and self._slots.release())
+                raise
+            if not ok:
+                raise self._timed_out()
+        self._acquired()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def remaining(self, started: float) -> float:
+        """Request timeout left after waiting for a slot since ``started``"""
+        return max(1.0, self.timeout - (time.monotonic() - started))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+        }
+
+_pools: Dict[str, ProviderPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(provider: str) -> ProviderPool:
+    """Process-wide pool for ``provider``, created on first use"""
+    pool = _pools.get(provider)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(provider, ProviderPool(provider))
+    return pool
+
+def llm_stats() -> Dict[str, Any]:
+    return {"model": GEMINI_MODEL, "providers": {name: pool.stats() for name, pool in _pools.items()}}
+
+_configured = False
+_configure_lock = threading.Lock()
 
 def _ensure_client():
-    # Configure Gemini with API key
+    # Configure Gemini with API key (once; the client and its connections are then reused)
+    global _configured
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY environment variable not set")
-    genai.configure(api_key=GEMINI_API_KEY)
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                genai.configure(api_key=GEMINI_API_KEY)
+                _configured = True
 
-def gemini_complete(system_prompt: str, user_prompt: str) -> str:
-    _ensure_client()
-    model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_prompt)
-    resp = model.generate_content(user_prompt, safety_settings=None)  # keep defaults if needed
+@lru_cache(maxsize=32)
+def _model(system_prompt: str):
+    return genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_prompt)
+
+def _response_text(resp) -> str:
     if hasattr(resp, "text"):
         return resp.text
     # Concatenate parts if needed
     return "\n".join([p.text for p in getattr(resp, "candidates", []) if getattr(p, "text", "")])
+
+def gemini_complete(system_prompt: str, user_prompt: str) -> str:
+    _ensure_client()
+    pool = get_pool("gemini")
+    started = time.monotonic()
+    with pool.slot():
+        resp = _model(system_prompt).generate_content(
+            user_prompt, safety_settings=None,  # keep defaults if needed
+            request_options={"timeout": pool.remaining(started)})
+    return _response_text(resp)
+
+async def gemini_complete_async(system_prompt: str, user_prompt: str) -> str:
+    """Non-blocking gemini_complete, on the SDK's async client"""
+    _ensure_client()
+    model = _model(system_prompt)
+    if not hasattr(model, "generate_content_async"):  # older SDKs: keep the event loop free anyway
+        return await asyncio.to_thread(gemini_complete, system_prompt, user_prompt)
+    pool = get_pool("gemini")
+    started = time.monotonic()
+    async with pool.aslot():
+        resp = await model.generate_content_async(
+            user_prompt, safety_settings=None, request_options={"timeout": pool.remaining(started)})
+    return _response_text(resp)
+
+async def gemini_stream_async(system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+    """Yield the completion in text chunks as Gemini streams them"""
+    _ensure_client()
+    model = _model(system_prompt)
+    if not hasattr(model, "generate_content_async"):
+        yield await asyncio.to_thread(gemini_complete, system_prompt, user_prompt)
+        return
+    pool = get_pool("gemini")
+    started = time.monotonic()
+    async with pool.aslot():  # held until the stream is drained
+        resp = await model.generate_content_async(
+            user_prompt, safety_settings=None, stream=True,
+            request_options={"timeout": pool.remaining(started)})
+        async for chunk in resp:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # a blocked or empty candidate has no text parts
+            if text:
+                yield text
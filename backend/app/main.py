@@ -1,9 +1,14 @@
 import os
+import json
 import uuid
+import asyncio
+import time
+import logging
+import threading
 from typing import List, Optional, Dict, Any
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 import os
@@ -17,9 +22,19 @@ import os
 load_dotenv()
 
 from .search_index import DocIndex
-from .insights import build_insights_payload, generate_insights_from_selection
+from .bm25 import SEARCH_MODES
+from .content_store import spool_upload, UploadTooLarge
+from .jobs import JobQueue, JOB_DONE_STATES
+from .insights import (build_insights_payload, generate_insights_async, create_podcast_script_async,
+                       stream_insights_async, PROMPT_VERSION, FALLBACK_PODCAST_SCRIPT)
+from .response_cache import ResponseCache, make_key
+from .query_cache import normalize_query
 from .tts import synthesize_podcast
-from .llm_adapter import gemini_complete
+from .llm_adapter import gemini_complete_async, gemini_stream_async, llm_stats, LLM_TIMEOUT
+from .chat_context import build_context, CHAT_TOP_K, CHAT_SEARCH_MODE
+from .rerank import get_reranker
+
+logger = logging.getLogger(__name__)
 
 # ---------- ENV ----------
 ADOBE_EMBED_API_KEY = os.getenv("ADOBE_EMBED_API_KEY", "")
@@ -29,6 +44,10 @@ TTS_PROVIDER = os.getenv("TTS_PROVIDER", "azure")
 
 UPLOAD_DIR = os.path.abspath(os.getenv("UPLOAD_DIR", "./data/uploads"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+JOBS_DB = os.path.abspath(os.getenv("JOBS_DB", os.path.join(os.path.dirname(UPLOAD_DIR), "jobs.db")))
+RESPONSE_CACHE_DB = os.path.abspath(os.getenv("RESPONSE_CACHE_DB",
+                                              os.path.join(os.path.dirname(UPLOAD_DIR), "responses.db")))
 
 # ---------- APP ----------
 app = FastAPI(title="Adobe Finale Backend", version="1.0")
@@ -43,23 +62,90 @@ app.add_middleware(
 
 # ---------- GLOBAL INDEX ----------
 _index = None
+_index_lock = threading.Lock()
 
 def get_index():
     global _index
     if _index is None:
-        _index = DocIndex(storage_dir=UPLOAD_DIR)
+        with _index_lock:  # ingestion workers may ask for it at the same time as a request
+            if _index is None:
+                _index = DocIndex(storage_dir=UPLOAD_DIR)
     return _index
 
+# ---------- RESPONSE CACHE ----------
+_responses = None
+
+def get_response_cache():
+    global _responses
+    if _responses is None:
+        _responses = ResponseCache(RESPONSE_CACHE_DB)
+    return _responses
+
+# ---------- DEFERRED PODCAST SCRIPTS ----------
+# Scripts generated after /analyze_selection has returned. Their state lives in the
+# response cache's SQLite file, so a poll works on any worker and after a restart;
+# the tasks of this worker are kept only so a poll can wait on them directly.
+_podcast_tasks: Dict[str, "asyncio.Task"] = {}
+# A script still pending this long was being generated by a worker that has since died
+_PODCAST_PENDING_TIMEOUT = 2 * LLM_TIMEOUT
+
+def _defer_podcast(generate) -> str:
+    """Run ``generate()`` (a coroutine function returning the script) after the response"""
+    script_id = uuid.uuid4().hex
+    get_response_cache().put_deferred(script_id, "pending")
+
+    async def run():
+        try:
+            script = await generate()
+        except Exception as e:
+            get_response_cache().put_deferred(script_id, "failed", {"detail": f"Error generating podcast script: {e}"})
+        else:
+            get_response_cache().put_deferred(script_id, "done", {"podcast_script": script})
+
+    task = asyncio.create_task(run())
+    _podcast_tasks[script_id] = task
+    task.add_done_callback(lambda _: _podcast_tasks.pop(script_id, None))
+    return script_id
+
+# ---------- INGESTION JOBS ----------
+_jobs = None
+
+def get_jobs():
+    global _jobs
+    if _jobs is None:
+        _jobs = JobQueue(JOBS_DB, process=lambda paths, progress: get_index().add_pdfs(paths, progress=progress))
+        _jobs.start()
+    return _jobs
+
+@app.on_event("startup")
+def resume_ingest_jobs():
+    get_jobs()  # picks up jobs left unfinished by a restart
+
+@app.on_event("startup")
+def preload_reranker():
+    get_reranker().preload()  # in the background, so the first rerank request doesn't pay for it
+
 # ---------- MODELS ----------
 class AnalyzeSelectionReq(BaseModel):
     current_pdf: str
     selected_text: str
     max_sections: int = 5
+    mode: str = "dense"  # "dense", "bm25" or "hybrid"
+    rerank: bool = False  # cross-encoder reorders the candidates, so fewer sections can go to the LLM
+    defer_podcast: bool = False  # return insights at once; fetch the script from podcast_script_url
 
 class PodcastReq(BaseModel):
     script: str
     speaker_mode: str = "duo"  # "duo" or "single"
 
+class BatchSearchReq(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    exclude_pdf: Optional[str] = None
+    pdfs: Optional[List[str]] = None  # only search these documents
+    mode: str = "dense"
+    rerank: bool = False
+
 class ChatQuery(BaseModel):
     question: str
     pdf_name: str
@@ -67,7 +153,9 @@ class ChatQuery(BaseModel):
 # ---------- ROUTES ----------
 @app.get("/health")
 def health():
-    return {"status": "ok", "pdf_count": len(get_index().documents)}
+    index = get_index()
+    return {"status": "ok", "pdf_count": len(index.documents), "index_stats": index.get_stats(),
+            "response_cache": get_response_cache().stats(), "llm": llm_stats()}
 
 @app.post("/upload")
 async def upload(files: List[UploadFile] = File(..., alias="files")):
@@ -76,30 +164,82 @@ async def upload(files: List[UploadFile] = File(..., alias="files")):
     if len(files) > 50:
         raise HTTPException(400, "Max 50 files per batch.")
 
-    saved = []
     for f in files:
         if not f.filename.lower().endswith(".pdf"):
             raise HTTPException(400, f"Only PDF allowed: {f.filename}")
-        safe_name = f.filename.replace("/", "_")
-        out_path = os.path.join(UPLOAD_DIR, safe_name)
-        with open(out_path, "wb") as w:
-            w.write(await f.read())
+
+    # Spool the whole batch before moving anything into UPLOAD_DIR, so a rejected
+    # file leaves no earlier ones behind on disk without an ingestion job
+    spooled = []
+    try:
+        for f in files:
+            tmp_path, sha, _ = await spool_upload(f, UPLOAD_DIR, max_bytes=MAX_UPLOAD_MB * 1024 * 1024)
+            spooled.append((f.filename.replace("/", "_"), tmp_path, sha))
+    except BaseException as e:
+        for _, tmp_path, _ in spooled:
+            os.remove(tmp_path)
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(413, f"File too large: {files[len(spooled)].filename} (max {MAX_UPLOAD_MB}MB)")
+        raise
+
+    saved = []
+    duplicates = {}
+    batch_hashes = {}
+    for safe_name, tmp_path, sha in spooled:
+        # Byte-identical to a PDF we already have: reuse it instead of storing/indexing again
+        existing = batch_hashes.get(sha) or get_index().find_duplicate(sha)
+        if existing:
+            os.remove(tmp_path)
+            duplicates[safe_name] = existing
+            continue
+        batch_hashes[sha] = safe_name
+
+        os.replace(tmp_path, os.path.join(UPLOAD_DIR, safe_name))
         saved.append(safe_name)
 
     # Return immediately, index in background
-    import asyncio
-    asyncio.create_task(index_pdfs_async(saved))
+    job_id = None
+    if saved:
+        job_id = get_jobs().submit([os.path.join(UPLOAD_DIR, s) for s in saved])
     
-    return {"files": saved, "message": "Files uploaded successfully. Indexing in background..."}
+    return {
+        "files": saved,
+        "duplicates": duplicates,
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}" if job_id else None,
+        "events_url": f"/jobs/{job_id}/events" if job_id else None,
+        "message": "Files uploaded successfully. Indexing in background..."
+    }
 
-async def index_pdfs_async(saved_files: List[str]):
-    """Index PDFs asynchronously without blocking the upload response"""
-    try:
-        paths = [os.path.join(UPLOAD_DIR, s) for s in saved_files]
-        get_index().add_pdfs(paths)
-        print(f"✅ Indexed {len(saved_files)} PDFs in background")
-    except Exception as e:
-        print(f"❌ Background indexing failed: {e}")
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job state whenever it changes, until it finishes"""
+    if get_jobs().get(job_id) is None:
+        raise HTTPException(404, "Job not found")
+
+    async def stream():
+        last = None
+        while True:
+            job = get_jobs().get(job_id)
+            if job is None:
+                return
+            if (job["updated_at"], job["status"]) != last:
+                last = (job["updated_at"], job["status"])
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            if job["status"] in JOB_DONE_STATES:
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/files")
 def list_files():
@@ -127,20 +267,40 @@ def get_file(filename: str):
 
 
 
-@app.post("/analyze_selection")
-def analyze_selection(req: AnalyzeSelectionReq):
-    # 1) semantic search for relevant sections (excluding current_pdf if you want)
-    results = get_index().search_sections(req.selected_text, top_k=req.max_sections, exclude_pdf=req.current_pdf)
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _retrieve_for_selection(req: AnalyzeSelectionReq):
+    """Related sections and their snippets for a selection, plus the response cache key and index version"""
+    if req.mode not in SEARCH_MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(SEARCH_MODES)}")
+    # 1) semantic search for relevant sections (excluding current_pdf if you want); CPU work stays off the loop
+    index = await asyncio.to_thread(get_index)
+    results = await asyncio.to_thread(index.search_sections, req.selected_text, top_k=req.max_sections,
+                                      exclude_pdf=req.current_pdf, mode=req.mode, rerank=req.rerank)
 
     # 2) pick 2–4 sentence snippets per section
-    snippets = get_index().make_snippets(results)
+    snippets = await asyncio.to_thread(index.make_snippets, results, query=req.selected_text)
+    cache_key = make_key(normalize_query(req.selected_text), [s.key for s in results], PROMPT_VERSION, GEMINI_MODEL)
+    return snippets, cache_key, index.index_version
 
-    # 3) insights with Gemini (grounded strictly on snippets)
-    insights, podcast_script = generate_insights_from_selection(
-        selection=req.selected_text,
-        related=snippets
-    )
+async def _podcast_for(req: AnalyzeSelectionReq, insights: str, cache_key: str, index_version: str):
+    """(script, None), or (None, deferred script id) with defer_podcast"""
+    async def finish_podcast() -> str:
+        script = await create_podcast_script_async(req.selected_text, insights)
+        if script != FALLBACK_PODCAST_SCRIPT:  # don't pin a failed generation
+            try:
+                get_response_cache().put(cache_key, index_version, {"insights": insights, "podcast_script": script})
+            except Exception as e:
+                logger.warning(f"Could not cache the analysis: {e}")  # the script itself is still good
+        return script
+
+    if req.defer_podcast:
+        return None, _defer_podcast(finish_podcast)
+    return await finish_podcast(), None
 
+def _selection_payload(req: AnalyzeSelectionReq, snippets, insights: str, podcast_script: Optional[str],
+                       script_id: Optional[str]) -> Dict[str, Any]:
     payload = build_insights_payload(
         current_pdf=req.current_pdf,
         selection=req.selected_text,
@@ -148,8 +308,99 @@ def analyze_selection(req: AnalyzeSelectionReq):
         insights=insights,
         podcast_script=podcast_script
     )
+    if script_id:
+        payload["podcast_script_id"] = script_id
+        payload["podcast_script_url"] = f"/analyze_selection/podcast_script/{script_id}"
     return payload
 
+@app.post("/analyze_selection")
+async def analyze_selection(req: AnalyzeSelectionReq):
+    snippets, cache_key, index_version = await _retrieve_for_selection(req)
+
+    # 3) insights with Gemini (grounded strictly on snippets), reused while the library is unchanged
+    cached = get_response_cache().get(cache_key, index_version)
+    script_id = None
+    if cached is not None:
+        insights, podcast_script = cached["insights"], cached["podcast_script"]
+    else:
+        insights = await generate_insights_async(req.selected_text, snippets)
+        podcast_script, script_id = await _podcast_for(req, insights, cache_key, index_version)
+    return _selection_payload(req, snippets, insights, podcast_script, script_id)
+
+@app.post("/analyze_selection/stream")
+async def analyze_selection_stream(req: AnalyzeSelectionReq):
+    """
+    Server-sent events: ``sections`` (the related snippets, right after retrieval),
+    ``token`` chunks of the insight text as Gemini writes it, then ``done`` with the
+    same payload /analyze_selection returns (or ``error``).
+    """
+    snippets, cache_key, index_version = await _retrieve_for_selection(req)
+
+    async def stream():
+        yield _sse("sections", {"current_pdf": req.current_pdf, "related_sections": snippets})
+        cached = get_response_cache().get(cache_key, index_version)
+        script_id = None
+        if cached is not None:
+            insights, podcast_script = cached["insights"], cached["podcast_script"]
+            yield _sse("token", {"text": insights})
+        else:
+            parts = []
+            try:
+                async for chunk in stream_insights_async(req.selected_text, snippets):
+                    parts.append(chunk)
+                    yield _sse("token", {"text": chunk})
+            except Exception as e:
+                yield _sse("error", {"detail": f"Error generating insights: {e}"})
+                return
+            insights = "".join(parts)
+            podcast_script, script_id = await _podcast_for(req, insights, cache_key, index_version)
+        yield _sse("done", _selection_payload(req, snippets, insights, podcast_script, script_id))
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/analyze_selection/podcast_script/{script_id}")
+async def get_podcast_script(script_id: str, wait: float = Query(0, ge=0, le=60)):
+    """
+    A deferred podcast script: status "pending", "done" or "failed" (with ``detail``).
+    With ``wait`` the call holds up to that many seconds for it to finish.
+    """
+    cache = get_response_cache()
+    result = cache.get_deferred(script_id)
+    if result is None:
+        raise HTTPException(404, "Podcast script not found")
+    deadline = time.monotonic() + wait
+    while result["status"] == "pending" and time.monotonic() < deadline:
+        task = _podcast_tasks.get(script_id)
+        if task is not None:
+            await asyncio.wait([task], timeout=deadline - time.monotonic())
+        else:
+            await asyncio.sleep(min(0.25, deadline - time.monotonic()))  # generated on another worker
+        result = cache.get_deferred(script_id)
+    if (result["status"] == "pending" and script_id not in _podcast_tasks and
+            time.time() - result["created_at"] > _PODCAST_PENDING_TIMEOUT):
+        result = {"status": "failed", "payload": {"detail": "Podcast script generation was interrupted"}}
+    payload = result["payload"] or {}
+    out = {"id": script_id, "status": result["status"], "podcast_script": payload.get("podcast_script")}
+    if result["status"] == "failed":
+        out["detail"] = payload["detail"]
+    return out
+
+@app.post("/search/batch")
+def search_batch(req: BatchSearchReq):
+    """Related sections for many queries (e.g. every heading of a new paper) in one vectorized call"""
+    if not req.queries:
+        raise HTTPException(400, "No queries provided.")
+    if len(req.queries) > 256:
+        raise HTTPException(400, "Max 256 queries per batch.")
+    if req.mode not in SEARCH_MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(SEARCH_MODES)}")
+    index = get_index()
+    results = index.search_many(req.queries, top_k=req.top_k, exclude_pdf=req.exclude_pdf,
+                                mode=req.mode, pdfs=req.pdfs, rerank=req.rerank)
+    return {"results": [{"query": q, "sections": index.make_snippets(hits, query=q)}
+                        for q, hits in zip(req.queries, results)]}
+
 @app.post("/generate_podcast")
 def generate_podcast(req: PodcastReq):
     out_name = f"podcast_{uuid.uuid4().hex}.mp3"
@@ -163,29 +414,62 @@ def generate_podcast(req: PodcastReq):
     return {"audio": f"/files/{out_name}", "transcript": req.script}
 
 # ---------- NEW CHAT ENDPOINTS ----------
+async def _chat_prompts(query: ChatQuery):
+    """System and user prompt grounded in the PDF's sections most relevant to the question, plus their sources"""
+    pdf_path = os.path.join(UPLOAD_DIR, query.pdf_name.replace("/", "_"))
+    if not os.path.exists(pdf_path):
+        raise HTTPException(404, "PDF not found")
+    
+    # Retrieve from this PDF's partition only, then keep what fits the context budget
+    index = await asyncio.to_thread(get_index)
+    sections = await asyncio.to_thread(index.search_sections, query.question, top_k=CHAT_TOP_K,
+                                       mode=CHAT_SEARCH_MODE, pdfs=[query.pdf_name])
+    ctx = build_context([{"heading": s.heading, "page_start": s.page_start, "page_end": s.page_end,
+                          "text": s.text} for s in sections])
+    
+    system_prompt = f"""You are a helpful assistant answering questions about a PDF document. 
+    Answer based ONLY on the numbered excerpts of the PDF {query.pdf_name} given below, citing them like [1].
+    Be concise, accurate, and helpful. If the question cannot be answered from the excerpts, say so."""
+    
+    excerpts = ctx["context"] or "No indexed content was found for this PDF."
+    user_prompt = f"PDF EXCERPTS:\n{excerpts}\n\nQuestion: {query.question}"
+    return system_prompt, user_prompt, ctx["sources"]
+
 @app.post("/chat/ask")
 async def ask_pdf(query: ChatQuery):
     """Ask a question about a specific PDF using Gemini"""
     try:
-        # Get the PDF content for context
-        pdf_path = os.path.join(UPLOAD_DIR, query.pdf_name.replace("/", "_"))
-        if not os.path.exists(pdf_path):
-            raise HTTPException(404, "PDF not found")
+        system_prompt, user_prompt, sources = await _chat_prompts(query)
         
-        # Use our existing Gemini integration
-        system_prompt = f"""You are a helpful assistant answering questions about a PDF document. 
-        Answer based ONLY on the content of the PDF: {query.pdf_name}
-        Be concise, accurate, and helpful. If the question cannot be answered from the PDF content, say so."""
+        answer = await gemini_complete_async(system_prompt=system_prompt, user_prompt=user_prompt)
         
-        user_prompt = f"Question: {query.question}\n\nPlease answer based on the PDF content."
-        
-        answer = gemini_complete(system_prompt=system_prompt, user_prompt=user_prompt)
-        
-        return {"answer": answer, "pdf_name": query.pdf_name, "question": query.question}
+        return {"answer": answer, "pdf_name": query.pdf_name, "question": query.question, "sources": sources}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error processing question: {str(e)}")
 
+@app.post("/chat/ask/stream")
+async def ask_pdf_stream(query: ChatQuery):
+    """Server-sent ``token`` events as the answer is generated, then ``done`` with the full answer"""
+    system_prompt, user_prompt, sources = await _chat_prompts(query)
+
+    async def stream():
+        parts = []
+        try:
+            async for chunk in gemini_stream_async(system_prompt=system_prompt, user_prompt=user_prompt):
+                parts.append(chunk)
+                yield _sse("token", {"text": chunk})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error processing question: {e}"})
+            return
+        yield _sse("done", {"answer": "".join(parts), "pdf_name": query.pdf_name, "question": query.question,
+                            "sources": sources})
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/chat/speak")
 async def speak_answer(text: str = Form(...)):
     """Convert text answer to speech using Azure TTS"""
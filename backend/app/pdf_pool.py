@@ -0,0 +1,105 @@
+# backend/app/pdf_pool.py
+import os
+import time
+import signal
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 0 = one worker per core, leaving one core for the embedding consumer
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+PDF_PARSE_TIMEOUT = float(os.environ.get("PDF_PARSE_TIMEOUT", "120"))
+_TIMEOUT_GRACE = 30.0  # the backstop gives workers' own SIGALRM timeout this long to fire first
+_POLL_INTERVAL = 1.0
+
+class ExtractionTimeout(Exception):
+    """Raised inside a worker when a single PDF exceeds the parse timeout"""
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout("PDF parsing exceeded timeout")
+
+_started = None  # worker side: queue on which each file's start time is reported
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+def _run_with_timeout(extract_fn: Callable[[str], Any], path: str, timeout: float) -> Any:
+    """Worker-side wrapper that bounds a single file's parse time where SIGALRM exists"""
+    if _started is not None:
+        _started.put((path, time.time()))
+    use_alarm = timeout > 0 and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return extract_fn(path)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def iter_extracted(
+    paths: List[str],
+    extract_fn: Callable[[str], Any],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> Iterator[Tuple[str, Any, Optional[str]]]:
+    """
+    Parse PDFs concurrently across processes, yielding ``(path, result, error)``
+    as each file finishes so the caller can embed while other files are parsed.
+
+    ``extract_fn`` must be a module-level function so it can be sent to workers.
+    A file that fails or exceeds ``timeout`` seconds yields ``result=None`` and
+    an error string instead of stalling the batch.
+    """
+    workers = workers or PDF_WORKERS
+    timeout = PDF_PARSE_TIMEOUT if timeout is None else timeout
+    if not paths:
+        return
+
+    # Even a single worker runs in the pool: parsing inline would lose the per-file timeout
+    workers = max(1, min(workers, len(paths)))
+    started_q = multiprocessing.SimpleQueue() if timeout > 0 else None
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started_q,))
+    futures = {executor.submit(_run_with_timeout, extract_fn, p, timeout): p for p in paths}
+
+    # Backstop for platforms without SIGALRM: a file is given up on once it has
+    # been parsing for timeout + grace, timed from when a worker picked it up.
+    # Time the consumer spends between yields never counts against queued
+    # files, and files that finished meanwhile are simply yielded.
+    pending = set(futures)
+    started: Dict[str, float] = {}
+    stuck = False
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=_POLL_INTERVAL if timeout > 0 else None,
+                                 return_when=FIRST_COMPLETED)
+            for fut in done:
+                path = futures[fut]
+                try:
+                    yield path, fut.result(), None
+                except Exception as e:
+                    logger.warning(f"⚠️ Extraction failed for {os.path.basename(path)}: {e}")
+                    yield path, None, f"{type(e).__name__}: {e}"
+            if timeout <= 0:
+                continue
+            while not started_q.empty():
+                path, t0 = started_q.get()
+                started[path] = t0
+            now = time.time()
+            expired = {fut for fut in pending if not fut.done() and futures[fut] in started
+                       and now - started[futures[fut]] > timeout + _TIMEOUT_GRACE}
+            for fut in expired:
+                stuck = True
+                logger.error(f"❌ Extraction timed out for {os.path.basename(futures[fut])}")
+                yield futures[fut], None, f"ExtractionTimeout: no result after {timeout + _TIMEOUT_GRACE:.0f}s"
+            pending -= expired
+    finally:
+        if stuck:
+            # Stuck workers would otherwise outlive the pool
+            for proc in list(getattr(executor, "_processes", {}).values()):
+                proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
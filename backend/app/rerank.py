@@ -0,0 +1,161 @@
+# backend/app/rerank.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.environ.get("RERANK_TOP_N", "20"))        # candidates fetched for reranking
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "150"))  # per request
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", "4096"))
+_MAX_CHARS = 2000  # the cross-encoder truncates to 512 tokens anyway
+
+# (section key, text) pairs in first-stage order
+Candidates = Sequence[Tuple[str, str]]
+
+class CrossEncoderReranker:
+    """
+    Reorders first-stage search hits with a CPU cross-encoder.
+
+    Scoring stops when the latency budget would be exceeded: the longest
+    prefix of candidates that has scores (new or cached) is reordered and
+    the rest keep their first-stage order. Scores are cached per
+    (normalized query, section key).
+
+    The model loads in the background (``preload``, called at startup);
+    until it is ready, requests keep their first-stage order instead of
+    paying the load time.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._model = None
+        self._failed = False
+        self._loader: Optional[threading.Thread] = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._pair_ms: Optional[float] = None  # moving average of inference time per pair
+        self.scored = 0
+        self.cache_hits = 0
+        self.skipped = 0
+
+    # ---------- Public ----------
+    def rerank(self, query: str, candidates: Candidates,
+               budget_ms: float = RERANK_BUDGET_MS) -> List[int]:
+        """Candidate positions in reranked order"""
+        return self.rerank_many([query], [candidates], budget_ms)[0]
+
+    def rerank_many(self, queries: List[str], candidate_lists: List[Candidates],
+                    budget_ms: float = RERANK_BUDGET_MS) -> List[List[int]]:
+        """Rerank several queries' candidates under one shared latency budget"""
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        keys = [normalize_query(q) for q in queries]
+        scores: List[Dict[int, float]] = [{} for _ in queries]
+        todo: List[Tuple[int, int]] = []  # (query, candidate) pairs to run, best first-stage ranks first
+
+        with self._lock:
+            for qi, cands in enumerate(candidate_lists):
+                for ci, (section_key, _) in enumerate(cands):
+                    cached = self._cache.get((keys[qi], section_key))
+                    if cached is None:
+                        todo.append((ci, qi))
+                        continue
+                    self._cache.move_to_end((keys[qi], section_key))
+                    scores[qi][ci] = cached
+                    self.cache_hits += 1
+        todo = [(qi, ci) for ci, qi in sorted(todo)]
+
+        model = None
+        if todo and budget_ms > 0:
+            model = self._model
+            if model is None:
+                self.preload()
+        done = 0
+        while model is not None and done < len(todo):
+            batch = todo[done:done + self.batch_size]
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            if self._pair_ms is not None and self._pair_ms * len(batch) > remaining_ms:
+                break
+            t0 = time.perf_counter()
+            try:
+                pairs = [(queries[qi], candidate_lists[qi][ci][1][:_MAX_CHARS]) for qi, ci in batch]
+                batch_scores = np.asarray(model.predict(pairs, batch_size=self.batch_size,
+                                                        show_progress_bar=False), dtype="float32").ravel()
+            except Exception as e:
+                logger.error(f"❌ Reranking failed, keeping search order: {e}")
+                break
+            pair_ms = (time.perf_counter() - t0) * 1000 / len(batch)
+            self._pair_ms = pair_ms if self._pair_ms is None else 0.8 * self._pair_ms + 0.2 * pair_ms
+
+            with self._lock:
+                for (qi, ci), score in zip(batch, batch_scores.tolist()):
+                    scores[qi][ci] = score
+                    self._cache[(keys[qi], candidate_lists[qi][ci][0])] = score
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self.scored += len(batch)
+            done += len(batch)
+        self.skipped += len(todo) - done
+
+        orders = []
+        for qi, cands in enumerate(candidate_lists):
+            prefix = 0
+            while prefix < len(cands) and prefix in scores[qi]:
+                prefix += 1
+            head = sorted(range(prefix), key=lambda ci: -scores[qi][ci])
+            orders.append(head + list(range(prefix, len(cands))))
+        return orders
+
+    def preload(self):
+        """Start loading the model in a background thread, once"""
+        with self._load_lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load, name="rerank-load", daemon=True)
+                self._loader.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "load_failed": self._failed,
+            "scored": self.scored,
+            "cache_hits": self.cache_hits,
+            "skipped_over_budget": self.skipped,
+            "cache_size": len(self._cache),
+            "ms_per_pair": round(self._pair_ms, 3) if self._pair_ms is not None else None,
+        }
+
+    # ---------- Internal ----------
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+            logger.info(f"✅ Cross-encoder loaded: {self.model_name}")
+        except Exception as e:
+            self._failed = True
+            logger.error(f"❌ Failed to load cross-encoder {self.model_name}, reranking disabled: {e}")
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+def get_reranker() -> CrossEncoderReranker:
+    """Process-wide reranker; the model loads in the background from the first preload() or use"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker()
+    return _reranker
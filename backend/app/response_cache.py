@@ -0,0 +1,135 @@
+# backend/app/response_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key           TEXT PRIMARY KEY,
+    index_version TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    accessed_at   REAL NOT NULL,
+    hits          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_responses_version ON responses(index_version);
+CREATE TABLE IF NOT EXISTS deferred (
+    id         TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    payload    TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+def make_key(*parts: Any) -> str:
+    """Content address of a request: SHA-256 over the JSON of ``parts``"""
+    blob = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    SQLite-backed cache of generated LLM responses.
+
+    Entries expire after ``ttl`` seconds, the least recently used are
+    evicted beyond ``max_entries``, and storing an entry for a new index
+    version drops every entry made against an older one.
+
+    It also keeps results generated after their request returned (see
+    ``put_deferred``), so any worker can answer a poll for them, across
+    restarts too.
+    """
+
+    def __init__(self, db_path: str, ttl: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str, index_version: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, index_version, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[1] != index_version or now - row[2] > self.ttl):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, index_version: str, payload: Dict[str, Any]):
+        now = time.time()
+        with self._lock, self._conn:
+            stale = self._conn.execute(
+                "DELETE FROM responses WHERE index_version != ? OR created_at < ?",
+                (index_version, now - self.ttl)).rowcount
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, index_version, payload, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, index_version, json.dumps(payload, ensure_ascii=False), now, now))
+            evicted = self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+        if stale or evicted:
+            logger.info(f"🧹 Response cache dropped {stale} stale and {evicted} least recently used entries")
+
+    def put_deferred(self, result_id: str, status: str, payload: Optional[Dict[str, Any]] = None):
+        """Record the ``status`` ("pending", "done" or "failed") of a deferred result"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM deferred WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "INSERT INTO deferred (id, status, payload, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, payload = excluded.payload",
+                (result_id, status, None if payload is None else json.dumps(payload, ensure_ascii=False), now))
+            self._conn.execute(
+                "DELETE FROM deferred WHERE id IN (SELECT id FROM deferred ORDER BY created_at DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def get_deferred(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """{"status", "payload", "created_at"} of a deferred result, or None if unknown or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, payload, created_at FROM deferred WHERE id = ?", (result_id,)).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        return {"status": row[0], "payload": None if row[1] is None else json.loads(row[1]), "created_at": row[2]}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -1,8 +1,12 @@
 import os
 import json
 import re
-from typing import List, Dict, Any, Tuple, Optional
-from dataclasses import dataclass
+import zlib
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Tuple, Optional, Callable, Union
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import faiss
@@ -10,8 +14,27 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from pdfminer.high_level import extract_text
 
+from .pdf_pool import iter_extracted
+from .content_store import ContentStore, sha256_file
+from .doc_store import DocStore
+from . import ann_index
+from .rwlock import RWLock
+from .query_cache import QueryEmbeddingCache
+from .bm25 import BM25Index, SEARCH_MODES, rrf_fuse
+from .tokens import term_counts
+from .rerank import get_reranker, RERANK_TOP_N
+
+logger = logging.getLogger(__name__)
+
 # Lightweight, fast model (<100MB)
 _EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+_EMB_BATCH = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+_INDEX_FORMAT = 1
+# faiss.index and bm25.npz are rewritten once this fraction of sections was appended since the last write
+DOC_INDEX_CHECKPOINT_FRACTION = float(os.environ.get("DOC_INDEX_CHECKPOINT_FRACTION", "0.25"))
+_CHECKPOINT_MIN_ROWS = 1024  # below this the tail is cheap to re-add on load
+SNIPPET_SENTENCES = int(os.environ.get("SNIPPET_SENTENCES", "3"))
+_HYBRID_DEPTH = 3  # each ranking fused in hybrid mode is this many times top_k deep
 
 @dataclass
 class Section:
@@ -20,88 +43,310 @@ class Section:
     page_start: int
     page_end: int
     text: str
-    vector: np.ndarray
+    # float16 embeddings of _split_sentences(text), for query-biased snippets
+    sent_vecs: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @property
+    def key(self) -> str:
+        """Stable identity for caches; changes when the section text does"""
+        return f"{self.pdf_name}:{self.page_start}:{zlib.crc32(self.text.encode('utf-8')):08x}"
+
+def _fingerprint(path: str) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"sha256": sha256_file(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _parse_pdf(path: str) -> Dict[str, Any]:
+    """
+    Extract text and sections from one PDF (runs inside extraction workers).
+    Extraction errors propagate, so the file is reported as failed rather
+    than recorded as an indexed document with no sections.
+    """
+    full_text = extract_text(path) or ""
+    return {
+        "pages": max(1, full_text.count("\x0c")),  # crude page count fallback
+        # Split into sections using heading heuristics (Round 1A-ish)
+        "sections": DocIndex._split_into_sections(full_text)
+    }
 
 class DocIndex:
-    def __init__(self, storage_dir: str):
+    """
+    Searchable section index over the uploaded PDFs.
+
+    Searches hold a shared read lock only while probing FAISS. Ingestion
+    (one batch at a time) parses and embeds without any lock, then
+    publishes each embedded batch under a short write lock.
+    """
+
+    def __init__(self, storage_dir: str, workers: Optional[int] = None, index_dir: Optional[str] = None):
         self.storage_dir = storage_dir
+        self.workers = workers
+        self.index_dir = index_dir or os.getenv(
+            "DOC_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(storage_dir)), "doc_index"))
+        self.db_path = os.path.join(self.index_dir, "doc_index.db")
+        # Checkpoint of the first ``_checkpoint_rows`` sections; later sections are re-added on load
+        self.faiss_path = os.path.join(self.index_dir, "faiss.index")
+        self.bm25_path = os.path.join(self.index_dir, "bm25.npz")
         self.model = SentenceTransformer(_EMB_MODEL)
+        self.dim = self.model.get_sentence_embedding_dimension()
         self.sections: List[Section] = []
+        # Row i is the embedding of sections[i]; spare capacity lets uploads append in place
+        self._vec_buf = np.zeros((0, self.dim), dtype="float32")
+        # Document code of each section, so filters become one vectorized mask
+        self._doc_codes = np.zeros(0, dtype=np.int32)
+        self._doc_ids: Dict[str, int] = {}
+        # Sorted section rows of every document code: a per-document partition of the vectors
+        self._doc_rows: Dict[int, np.ndarray] = {}
         self.documents: Dict[str, Dict[str, Any]] = {}  # name -> {"pages": int}
+        self.files: Dict[str, Dict[str, Any]] = {}  # name -> {"sha256", "size", "mtime_ns"}
+        self.store = ContentStore()  # byte-identical PDFs share the canonical copy's sections
         self.faiss_index = None
-        self.id2idx: Dict[int, int] = {}
+        self.bm25 = BM25Index()  # keyed by position in self.sections
+        self.ann_report: Dict[str, Any] = {}
+        self._checkpoint_rows = 0
+        self._lock = RWLock()
+        self.query_cache = QueryEmbeddingCache()
+        self._ingest_lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.db = DocStore(self.db_path, self.dim)
+
+        # Load the persisted index, then embed only new or changed PDFs
+        self._warm_boot()
 
-        # Boot from disk PDFs if present
-        self._cold_boot()
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vec_buf[:len(self.sections)]
 
     # ---------- Public ----------
     def list_pdf_names(self) -> List[str]:
         return [f for f in os.listdir(self.storage_dir) if f.lower().endswith(".pdf")]
 
-    def add_pdfs(self, paths: List[str]):
-        secs = []
+    def find_duplicate(self, sha256: str) -> Optional[str]:
+        """Name of the indexed PDF with this content hash, if any"""
+        with self._lock.read():
+            return self.store.lookup(sha256)
+
+    def add_pdfs(self, paths: List[str],
+                 progress: Optional[Callable[[str, str, Optional[str]], None]] = None) -> Dict[str, str]:
+        """
+        Index new PDFs; returns {duplicate name: canonical name} for byte-identical files.
+
+        ``progress(name, status, detail)`` is called once per file as it becomes
+        searchable ("indexed"), is skipped as a copy of ``detail`` ("duplicate")
+        or cannot be parsed ("failed", with the error as ``detail``).
+        """
+        report = progress or (lambda name, status, detail=None: None)
+        with self._ingest_lock:
+            return self._add_pdfs(paths, report)
+
+    def _add_pdfs(self, paths: List[str], report: Callable[[str, str, Optional[str]], None]) -> Dict[str, str]:
+        fingerprints = {}
+        with self._lock.read():
+            indexed, aliases = set(self.documents), dict(self.store.aliases)
         for p in paths:
             name = os.path.basename(p)
-            if name in self.documents:
-                continue
-            try:
-                full_text = extract_text(p) or ""
-            except Exception:
-                full_text = ""
-            pages = max(1, full_text.count("\x0c"))  # crude page count fallback
-            self.documents[name] = {"pages": pages}
-
-            # Split into sections using heading heuristics (Round 1A-ish)
-            split_sections = self._split_into_sections(full_text)
-            
-            # Batch embed all sections at once (much faster)
-            if split_sections:
-                texts = [s["text"] for s in split_sections]
-                embeddings = self._embed(texts)
-                
-                for i, s in enumerate(split_sections):
-                    secs.append(Section(
-                        pdf_name=name,
-                        heading=s["heading"],
-                        page_start=s["page_start"],
-                        page_end=s["page_end"],
-                        text=s["text"],
-                        vector=embeddings[i]
-                    ))
-        
-        # Merge & rebuild FAISS
-        if secs:
-            self.sections.extend(secs)
-            self._rebuild_faiss()
+            if name in indexed:
+                report(name, "indexed", None)
+            elif name in aliases:
+                report(name, "duplicate", aliases[name])
+            elif name not in fingerprints:
+                fingerprints[name] = (p, _fingerprint(p))  # hashing happens outside the lock
 
+        todo = []
+        duplicates: Dict[str, str] = {}
+        with self._lock.write():
+            for name, (p, fp) in fingerprints.items():
+                self.files[name] = fp
+                canonical = self.store.register(name, fp["sha256"])
+                if canonical and canonical != name:  # its own earlier record is not a duplicate
+                    duplicates[name] = canonical
+                else:
+                    todo.append(p)
+        for name, canonical in duplicates.items():
+            report(name, "duplicate", canonical)
 
+        added = 0
+        pending: List[Tuple[str, Dict[str, Any]]] = []
+        waiting: Dict[str, Dict[str, Any]] = {}  # parsed files whose sections are not yet published
 
-    def search_sections(self, query: str, top_k: int = 5, exclude_pdf: Optional[str] = None):
-        if not self.sections:
-            return []
-        qv = self._embed([query])[0].astype("float32")
-        D, I = self.faiss_index.search(np.array([qv]), top_k * 3)  # overfetch, filter later
-        hits = []
-        for idx in I[0]:
-            if int(idx) == -1:
-                continue
-            s = self.sections[idx]
-            if exclude_pdf and s.pdf_name == exclude_pdf:
-                continue
-            hits.append(s)
-            if len(hits) == top_k:
-                break
-        return hits
+        def flush():
+            # Batch embed all pending sections at once (much faster)
+            nonlocal added
+            if not pending:
+                return
+            embeddings = self._embed([s["text"] for _, s in pending])
+            faiss.normalize_L2(embeddings)  # cosine via inner product
+            sentences = [self._split_sentences(s["text"]) for _, s in pending]
+            sent_vecs = self._embed_sentences(sentences)
+            counts = [term_counts(s["text"]) for _, s in pending]
+            secs = [Section(
+                pdf_name=name,
+                heading=s["heading"],
+                page_start=s["page_start"],
+                page_end=s["page_end"],
+                text=s["text"],
+                sent_vecs=vecs
+            ) for (name, s), vecs in zip(pending, sent_vecs)]
+            with self._lock.read():
+                self.db.append(secs, embeddings, self._meta(waiting))  # only this batch's rows are written
+            self._publish(secs, embeddings, counts, waiting)
+            added += len(pending)
+            pending.clear()
+            for name in waiting:
+                report(name, "indexed", None)
+            waiting.clear()
 
-    def make_snippets(self, sections: List[Section]) -> List[Dict[str, Any]]:
+        try:
+            # PDFs are parsed in a process pool; this loop is the single embedding consumer
+            for path, parsed, error in iter_extracted(todo, _parse_pdf, workers=self.workers):
+                name = os.path.basename(path)
+                if error:
+                    # Not recorded as a document, so the next start tries this file again
+                    logger.warning(f"Could not parse {name}, will retry on next start: {error}")
+                    with self._lock.write():
+                        self._unregister(name)
+                    report(name, "failed", error)
+                    continue
+                if parsed["sections"]:
+                    pending.extend((name, s) for s in parsed["sections"])
+                    waiting[name] = {"pages": parsed["pages"]}
+                else:
+                    with self._lock.write():
+                        self.documents[name] = {"pages": parsed["pages"]}
+                    report(name, "indexed", None)
+                if len(pending) >= _EMB_BATCH:
+                    flush()
+            flush()
+        except BaseException:
+            # A retry of this batch must parse again whatever was not published yet
+            with self._lock.write():
+                unpublished = [os.path.basename(p) for p in todo if os.path.basename(p) not in self.documents]
+                for name in unpublished:
+                    self._unregister(name)
+                self.db.drop(unpublished, {}, self._meta())
+            raise
+        finally:
+            if added:
+                with self._lock.write():
+                    self.bm25.compact()
+                with self._lock.read():
+                    self._save()  # keep what was published even if the batch failed later
+
+        if added:
+            logger.info(f"Appended {added} sections to the index ({len(self.sections)} total)")
+        elif todo or duplicates:
+            with self._lock.read():
+                self._save()
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} duplicate PDFs: {duplicates}")
+        return duplicates
+
+
+
+    @property
+    def index_version(self) -> str:
+        """Fingerprint of the indexed content; changes whenever a PDF is added, changed or removed"""
+        with self._lock.read():
+            files = sorted((name, f.get("sha256")) for name, f in self.files.items())
+            state = json.dumps([_INDEX_FORMAT, _EMB_MODEL, files, sorted(self.documents)])
+        return hashlib.sha256(state.encode("utf-8")).hexdigest()[:16]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock.read():
+            return {
+                "documents": len(self.documents),
+                "duplicates": len(self.store.aliases),
+                "sections": len(self.sections),
+                "index_type": ann_index.index_type(self.faiss_index) if self.faiss_index is not None else None,
+                "ann_report": self.ann_report,
+                "query_cache": self.query_cache.stats(),
+                "keyword_index": self.bm25.stats(),
+                "reranker": get_reranker().stats(),
+            }
+
+    def search_sections(self, query: str, top_k: int = 5, exclude_pdf: Union[str, List[str], None] = None,
+                        mode: str = "dense", pdfs: Optional[List[str]] = None, rerank: bool = False):
+        return self.search_many([query], top_k=top_k, exclude_pdf=exclude_pdf, mode=mode, pdfs=pdfs,
+                                rerank=rerank)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    exclude_pdf: Union[str, List[str], None] = None, mode: str = "dense",
+                    pdfs: Optional[List[str]] = None, rerank: bool = False) -> List[List[Section]]:
+        """
+        Sections for each query, with one embedding pass and one FAISS call for the batch.
+        ``mode`` is "dense", "bm25" (keyword only) or "hybrid" (reciprocal-rank fusion of both).
+
+        ``pdfs`` restricts results to those documents and ``exclude_pdf`` (one name
+        or several) removes documents; the filter is applied inside the index, so
+        each query gets ``top_k`` hits whenever that many sections pass it.
+
+        With ``rerank`` the top ``RERANK_TOP_N`` candidates are reordered by a
+        cross-encoder within its latency budget before cutting to ``top_k``.
+        """
+        if rerank:
+            pool = self.search_many(queries, max(top_k, RERANK_TOP_N), exclude_pdf, mode, pdfs)
+            orders = get_reranker().rerank_many(queries, [[(s.key, s.text) for s in hits] for hits in pool])
+            return [[hits[j] for j in order[:top_k]] for hits, order in zip(pool, orders)]
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+        results: List[List[Section]] = [[] for _ in queries]
+        active = [i for i, q in enumerate(queries) if q.strip()]
+        if not self.sections or not active or top_k <= 0:
+            return results
+        if mode != "bm25":
+            qv = self.query_cache.get_or_compute_many([queries[i] for i in active], self._embed)
+        depth = top_k * _HYBRID_DEPTH if mode == "hybrid" else top_k
+        with self._lock.read():
+            # A few documents are searched by scanning only their partitions, not the whole index
+            rows = self._document_rows(pdfs) if pdfs is not None and not exclude_pdf else None
+            if rows is not None and len(rows) > ann_index.ANN_EXACT_FILTER_MAX:
+                rows = None
+            if rows is not None:
+                allowed = None if mode == "dense" else self._rows_mask(rows)
+                if not len(rows):
+                    return results
+            else:
+                allowed = self._filter_mask(pdfs, [exclude_pdf] if isinstance(exclude_pdf, str) else exclude_pdf)
+                if allowed is not None and not allowed.any():
+                    return results
+            if mode != "bm25":
+                k = min(depth, len(self.sections))
+                if rows is not None:
+                    D, I = ann_index.search_rows(qv, k, rows, self.vectors)
+                elif allowed is None:
+                    D, I = self.faiss_index.search(qv, k)
+                else:
+                    D, I = ann_index.search_filtered(self.faiss_index, qv, k, allowed, self.vectors)
+            for r, i in enumerate(active):
+                if mode == "dense":
+                    ranked = [int(idx) for idx in I[r] if int(idx) != -1]
+                else:
+                    sparse = self.bm25.search(queries[i], depth, allowed=allowed)
+                    if mode == "hybrid":
+                        sparse = rrf_fuse([[(int(idx), 0.0) for idx in I[r] if int(idx) != -1], sparse])
+                    ranked = [key for key, _ in sparse]
+                results[i] = [self.sections[idx] for idx in ranked[:top_k]]
+        return results
+
+    def make_snippets(self, sections: List[Section], query: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Return 2–4 sentence snippets per section, with navigation metadata.
+
+        With ``query`` the sentences most similar to it are picked, using the
+        sentence embeddings cached at ingest and the query vector the search
+        already computed (a cache hit), so no text is encoded here.
         """
+        qv = self.query_cache.get_or_compute(query, lambda q: self._embed([q])[0]) if query else None
         out = []
         for s in sections:
             sents = self._split_sentences(s.text)
+            if qv is not None and len(sents) > SNIPPET_SENTENCES:
+                if s.sent_vecs is None or len(s.sent_vecs) != len(sents):
+                    s.sent_vecs = self._embed_sentences([sents])[0]  # sections indexed before caching existed
+                sims = s.sent_vecs.astype(np.float32) @ qv
+                chosen = sorted(np.argsort(-sims, kind="stable")[:SNIPPET_SENTENCES].tolist())
+                snippet = " ".join(sents[i] for i in chosen)
             # pick the densest 3 sentences near the middle as snippet
-            if len(sents) <= 4:
+            elif len(sents) <= 4:
                 snippet = " ".join(sents)
             else:
                 mid = len(sents) // 2
@@ -117,26 +362,266 @@ class DocIndex:
         return out
 
     # ---------- Internal ----------
-    def _cold_boot(self):
-        paths = [os.path.join(self.storage_dir, p) for p in self.list_pdf_names()]
-        if paths:
-            self.add_pdfs(paths)
+    def _warm_boot(self):
+        self._load()
+        on_disk = {name: os.path.join(self.storage_dir, name) for name in self.list_pdf_names()}
+
+        # Forget documents whose file was removed or whose content changed
+        known = list(self.documents) + list(self.store.aliases)
+        stale = [name for name in known
+                 if name not in on_disk or not self._is_unchanged(name, on_disk[name])]
+        if stale:
+            self._drop_documents(stale)
+
+        new = [path for name, path in on_disk.items()
+               if name not in self.documents and name not in self.store.aliases]
+        if new:
+            self.add_pdfs(new)
+        elif stale:
+            self._save()
+
+    def _is_unchanged(self, name: str, path: str) -> bool:
+        known = self.files.get(name)
+        if not known:
+            return False
+        st = os.stat(path)
+        if known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return True
+        # Touched but possibly identical: fall back to the content hash
+        if sha256_file(path) != known["sha256"]:
+            return False
+        known.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        return True
+
+    def _filter_mask(self, pdfs: Optional[List[str]], exclude: Optional[List[str]]) -> Optional[np.ndarray]:
+        """Boolean mask over sections for a document filter, or None when nothing is filtered"""
+        if pdfs is None and not exclude:
+            return None
+        def codes(names):
+            found = (self._doc_ids.get(self.store.canonical(n)) for n in names)
+            return np.array([c for c in found if c is not None], dtype=np.int32)
+        mask = np.ones(len(self.sections), dtype=bool) if pdfs is None else np.isin(self._doc_codes, codes(pdfs))
+        if exclude:
+            mask &= ~np.isin(self._doc_codes, codes(exclude))
+        return mask
+
+    def _document_rows(self, names: List[str]) -> np.ndarray:
+        """Sorted section rows of the named documents, from their partitions"""
+        codes = {self._doc_ids.get(self.store.canonical(n)) for n in names}
+        parts = [self._doc_rows[c] for c in codes if c in self._doc_rows]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def _rows_mask(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(self.sections), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _encode_documents(self, secs: List[Section]) -> np.ndarray:
+        return np.array([self._doc_ids.setdefault(s.pdf_name, len(self._doc_ids)) for s in secs], dtype=np.int32)
+
+    def _partition_rows(self, codes: np.ndarray, offset: int = 0):
+        """Append rows ``offset + i`` to the partition of ``codes[i]``"""
+        order = np.argsort(codes, kind="stable")
+        uniq, starts = np.unique(codes[order], return_index=True)
+        for code, part in zip(uniq.tolist(), np.split(order.astype(np.int64) + offset, starts[1:])):
+            prev = self._doc_rows.get(code)
+            self._doc_rows[code] = part if prev is None else np.concatenate([prev, part])
+
+    def _reindex_documents(self):
+        self._doc_ids = {}
+        self._doc_rows = {}
+        self._doc_codes = self._encode_documents(self.sections)
+        self._partition_rows(self._doc_codes)
+
+    def _unregister(self, name: str):
+        """Forget the fingerprint of a file that never became searchable"""
+        self.files.pop(name, None)
+        self.store.unregister(name)
+
+    def _drop_documents(self, names: List[str]):
+        gone = set(names)
+        renames: Dict[str, str] = {}
+        for name in gone:
+            self.files.pop(name, None)
+            if name in self.store.aliases:
+                self.store.forget(name)
+                continue
+            # A surviving byte-identical copy inherits the sections instead of re-embedding
+            heir = next((a for a in self.store.aliases_of(name) if a not in gone), None)
+            if heir:
+                self.documents[heir] = self.documents.pop(name)
+                for s in self.sections:
+                    if s.pdf_name == name:
+                        s.pdf_name = heir
+                self.store.rename_canonical(name, heir)
+                renames[name] = heir
+            else:
+                self.store.forget(name)
+                self.documents.pop(name, None)
+
+        keep = np.array([s.pdf_name in self.documents for s in self.sections], dtype=bool)
+        if not keep.all():
+            self._vec_buf = self.vectors[keep].copy()
+            self.sections = [s for s, k in zip(self.sections, keep) if k]
+            self.faiss_index = None
+            self._rebuild_faiss()
+            self._rebuild_keywords()
+            self._checkpoint_rows = 0  # rows moved, so the checkpoints no longer match
+        self._reindex_documents()
+        self.db.drop([n for n in gone if n not in renames], renames, self._meta())
+        logger.info(f"Dropped {len(gone)} removed/changed PDFs from index")
+
+    def _load(self) -> bool:
+        try:
+            fields, vectors, sent_vecs, meta = self.db.load()
+            if not meta:
+                return False
+            if meta.get("format") != _INDEX_FORMAT:
+                raise ValueError(f"unsupported index format {meta.get('format')}")
+
+            self.documents = meta["documents"]
+            self.files = meta["files"]
+            self.store = ContentStore.from_dict(meta.get("content_store"))
+            self.sections = [Section(**f, sent_vecs=v) for f, v in zip(fields, sent_vecs)]
+            self._vec_buf = vectors
+            self._reindex_documents()
+            self._load_checkpoint(meta.get("checkpoint_rows", 0))
+            if self._checkpoint_rows < len(self.sections):
+                self._save()
+            logger.info(f"Loaded persisted index: {len(self.documents)} PDFs, {len(self.sections)} sections "
+                        f"({len(self.sections) - self._checkpoint_rows} re-added after the last checkpoint)")
+            return True
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable index in {self.index_dir}: {e}")
+            self.db.clear()
+            self.sections, self.documents, self.files = [], {}, {}
+            self._vec_buf = np.zeros((0, self.dim), dtype="float32")
+            self.store = ContentStore()
+            self.faiss_index = None
+            self.bm25 = BM25Index()
+            self._checkpoint_rows = 0
+            self._reindex_documents()
+            return False
+
+    def _load_checkpoint(self, rows: int):
+        """Restore FAISS and BM25 from the checkpoint of the first ``rows`` sections and add the rest"""
+        n = len(self.sections)
+        index = faiss.read_index(self.faiss_path) if 0 < rows <= n and os.path.exists(self.faiss_path) else None
+        if index is not None and index.ntotal == rows:
+            if rows < n:
+                index.add(self.vectors[rows:])
+            if ann_index.index_type(index) == ann_index.choose_index_type(n):
+                self.faiss_index = ann_index.configure(index)
+        bm25 = BM25Index.load(self.bm25_path) if self.faiss_index is not None else None
+        if bm25 is not None and bm25.stats()["documents"] == rows:
+            bm25.add_counts((i, term_counts(self.sections[i].text)) for i in range(rows, n))
+            bm25.compact()
+            self.bm25 = bm25
+            self._checkpoint_rows = rows
+        else:
+            self.faiss_index = None
+            self._rebuild_faiss()
+            self._rebuild_keywords()
+            self._checkpoint_rows = 0
+
+    def _meta(self, documents: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Metadata stored alongside the section rows; ``documents`` are recorded as indexed too"""
+        return {
+            "format": _INDEX_FORMAT,
+            "documents": {**self.documents, **(documents or {})},
+            "files": self.files,
+            "content_store": self.store.to_dict(),
+            "checkpoint_rows": self._checkpoint_rows,
+        }
+
+    def _save(self, checkpoint: bool = False):
+        """
+        Persist the metadata. Section rows are written as they are published,
+        so the FAISS and keyword files are only rewritten when ``checkpoint``
+        is set or enough sections were appended since they last were.
+        """
+        behind = len(self.sections) - self._checkpoint_rows
+        if checkpoint or behind > max(_CHECKPOINT_MIN_ROWS, DOC_INDEX_CHECKPOINT_FRACTION * self._checkpoint_rows):
+            if self.faiss_index is not None:
+                tmp = self.faiss_path + ".tmp"
+                faiss.write_index(self.faiss_index, tmp)
+                os.replace(tmp, self.faiss_path)
+            elif os.path.exists(self.faiss_path):
+                os.remove(self.faiss_path)
+            self.bm25.save(self.bm25_path)
+            self._checkpoint_rows = len(self.sections)
+        self.db.put_meta(self._meta())
+
+    def _append_vectors(self, vecs: np.ndarray):
+        n, extra = len(self.sections), len(vecs)
+        if n + extra > len(self._vec_buf):
+            grown = np.zeros((max(n + extra, 2 * len(self._vec_buf), 1024), self.dim), dtype="float32")
+            grown[:n] = self._vec_buf[:n]
+            self._vec_buf = grown
+        self._vec_buf[n:n + extra] = vecs
+
+    def _publish(self, secs: List[Section], vecs: np.ndarray, counts: List[Dict[int, int]],
+                 documents: Dict[str, Dict[str, Any]]):
+        """
+        Make an embedded batch searchable and record ``documents`` as indexed in
+        the same step. The live index is appended to in place; when the corpus
+        must move to another index type, the new index is built off to the side
+        first and swapped in under the write lock.
+        """
+        total = len(self.sections) + len(vecs)
+        rebuilt = None
+        if self.faiss_index is None or \
+                ann_index.index_type(self.faiss_index) != ann_index.choose_index_type(total):
+            rebuilt = self._build_faiss(np.concatenate([self.vectors, vecs]))
+        with self._lock.write():
+            n = len(self.sections)
+            self._append_vectors(vecs)
+            self.sections.extend(secs)
+            codes = self._encode_documents(secs)
+            self._doc_codes = np.concatenate([self._doc_codes, codes])
+            self._partition_rows(codes, offset=n)
+            self.bm25.add_counts((n + i, c) for i, c in enumerate(counts))
+            self.documents.update(documents)
+            if rebuilt is not None:
+                self.faiss_index = rebuilt
+            else:
+                self.faiss_index.add(vecs)
 
     def _rebuild_faiss(self):
-        vecs = np.array([s.vector for s in self.sections], dtype="float32")
-        if vecs.size == 0:
-            return
-        d = vecs.shape[1]
-        index = faiss.IndexFlatIP(d)  # cosine via normalized vectors
-        faiss.normalize_L2(vecs)
-        index.add(vecs)
-        self.faiss_index = index
+        if len(self.sections):
+            self.faiss_index = self._build_faiss(self.vectors)
+
+    def _rebuild_keywords(self):
+        self.bm25 = BM25Index()
+        self.bm25.add_counts((i, term_counts(s.text)) for i, s in enumerate(self.sections))
+        self.bm25.compact()
+
+    def _build_faiss(self, vecs: np.ndarray):
+        index = ann_index.build_index(vecs)
+        if ann_index.index_type(index) != "flat":
+            self.ann_report = ann_index.recall_report(index, vecs)
+            logger.info(f"Built {self.ann_report['index_type']} index over {len(vecs)} sections: "
+                        f"recall@{self.ann_report['k']}={self.ann_report['recall_at_k']}")
+        return index
+
+    def _embed_sentences(self, sentence_lists: List[List[str]]) -> List[np.ndarray]:
+        """Embed the sentences of several sections in one pass; float16 halves the cache size"""
+        flat = [x for sents in sentence_lists for x in sents]
+        vecs = self._embed(flat).astype(np.float16) if flat else np.zeros((0, self.dim), dtype=np.float16)
+        out, start = [], 0
+        for sents in sentence_lists:
+            out.append(vecs[start:start + len(sents)])
+            start += len(sents)
+        return out
 
     def _embed(self, texts: List[str]) -> np.ndarray:
-        emb = self.model.encode(texts, show_progress_bar=False, normalize_embeddings=True)
+        emb = self.model.encode(texts, batch_size=_EMB_BATCH, show_progress_bar=False, normalize_embeddings=True)
         return np.array(emb, dtype="float32")
 
-    def _split_into_sections(self, text: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _split_into_sections(text: str) -> List[Dict[str, Any]]:
         """
         Very simple sectionizer:
         - Heading: line with Title Case or ALL CAPS and followed by blank line or longer text
@@ -152,7 +637,7 @@ class DocIndex:
             cur_heading = f"Page {p_idx+1}"
             cur_buf = []
             for ln in lines:
-                if self._looks_like_heading(ln):
+                if DocIndex._looks_like_heading(ln):
                     # flush previous
                     if cur_buf:
                         sections.append({
@@ -0,0 +1,129 @@
+# backend/app/section_store.py
+import os
+import json
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Everything except ``content``, which stays on disk until a search needs it
+_META_COLUMNS = [
+    "vec_id", "id", "doc_id", "doc_name", "heading", "content_hash",
+    "page_start", "page_end", "word_count", "created_at", "updated_at",
+]
+
+# Precomputed snippet features (see tokens.TextFeatures); NULL until computed
+_FEATURE_COLUMNS = ["sent_bounds", "tok_ids", "tok_sent"]
+
+_DEFAULTS = {"content_hash": "", "word_count": 0, "created_at": "", "updated_at": ""}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    vec_id       INTEGER PRIMARY KEY,
+    id           TEXT NOT NULL,
+    doc_id       TEXT NOT NULL,
+    doc_name     TEXT NOT NULL,
+    heading      TEXT NOT NULL,
+    content      TEXT NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    page_start   INTEGER,
+    page_end     INTEGER,
+    word_count   INTEGER NOT NULL DEFAULT 0,
+    created_at   TEXT NOT NULL DEFAULT '',
+    updated_at   TEXT NOT NULL DEFAULT '',
+    sent_bounds  BLOB,
+    tok_ids      BLOB,
+    tok_sent     BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_sections_doc_name ON sections(doc_name);
+"""
+
+class SectionStore:
+    """
+    Append-friendly SQLite store for section metadata keyed by vector ID.
+
+    Writes touch only the rows being added or removed, and section content
+    is read lazily by ID so memory does not grow with total corpus text.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def append(self, rows: Iterable[Dict[str, Any]]):
+        cols = _META_COLUMNS + ["content"] + _FEATURE_COLUMNS
+        sql = f"INSERT OR REPLACE INTO sections ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+        with self._lock, self._conn:
+            self._conn.executemany(sql, [
+                tuple(r[c] if r.get(c) is not None else _DEFAULTS.get(c) for c in cols) for r in rows
+            ])
+
+    def delete(self, vec_ids: List[int]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM sections WHERE vec_id = ?", [(int(v),) for v in vec_ids])
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sections")
+
+    def set_content_hash(self, doc_name: str, content_hash: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sections SET content_hash = ? WHERE doc_name = ?", (content_hash, doc_name))
+
+    def load_meta(self) -> List[Dict[str, Any]]:
+        """All rows without their content, ordered by vector ID"""
+        with self._lock:
+            cur = self._conn.execute(f"SELECT {', '.join(_META_COLUMNS)} FROM sections ORDER BY vec_id")
+            return [dict(zip(_META_COLUMNS, row)) for row in cur]
+
+    def get_contents(self, vec_ids: List[int]) -> Dict[int, str]:
+        if not vec_ids:
+            return {}
+        ids = [int(v) for v in vec_ids]
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT vec_id, content FROM sections WHERE vec_id IN ({', '.join('?' for _ in ids)})", ids)
+            return dict(cur.fetchall())
+
+    def get_contents_with_features(self, vec_ids: List[int]) -> Dict[int, Tuple[str, Optional[bytes], Optional[bytes], Optional[bytes]]]:
+        """{vec_id: (content, sent_bounds, tok_ids, tok_sent)}; feature blobs may be None"""
+        if not vec_ids:
+            return {}
+        ids = [int(v) for v in vec_ids]
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT vec_id, content, {', '.join(_FEATURE_COLUMNS)} FROM sections "
+                f"WHERE vec_id IN ({', '.join('?' for _ in ids)})", ids)
+            return {row[0]: tuple(row[1:]) for row in cur}
+
+    def set_features(self, rows: Dict[int, Tuple[str, bytes, bytes, bytes]]):
+        """Store (content, sent_bounds, tok_ids, tok_sent) for sections indexed before features existed"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"UPDATE sections SET content = ?, {', '.join(c + ' = ?' for c in _FEATURE_COLUMNS)} WHERE vec_id = ?",
+                [(*values, int(vec_id)) for vec_id, values in rows.items()])
+
+    def get_content(self, vec_id: int) -> str:
+        return self.get_contents([vec_id]).get(int(vec_id), "")
+
+    def import_json(self, json_path: str) -> int:
+        """One-time migration from the legacy sections_meta.json list"""
+        with open(json_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        for i, r in enumerate(rows):
+            if r.get("vec_id", -1) < 0:
+                r["vec_id"] = i
+        self.append(rows)
+        logger.info(f"🔁 Migrated {len(rows)} sections from {os.path.basename(json_path)}")
+        return len(rows)
+
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
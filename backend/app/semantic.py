@@ -1,6 +1,5 @@
 # backend/app/semantic.py
 import os
-import json
 import re
 import uuid
 from typing import List, Dict, Any, Optional, Tuple
@@ -10,6 +9,18 @@ import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 import logging
+import time
+
+from .pdf_pool import iter_extracted
+from .content_store import sha256_file
+from .section_store import SectionStore
+from .snapshots import SnapshotLog
+from . import ann_index
+from .query_cache import QueryEmbeddingCache
+from . import tokens
+from .bm25 import BM25Index, SEARCH_MODES, rrf_fuse
+from .centroids import DocumentCentroids, SEARCH_TOP_DOCS
+from .rerank import get_reranker, RERANK_TOP_N
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +31,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(INDEX_DIR, exist_ok=True)
 
 MODEL_NAME = os.environ.get("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
 
 def _is_heading(line: str) -> bool:
     """Enhanced heading detection with competition-ready heuristics"""
@@ -103,6 +115,27 @@ def _split_into_sections(text: str) -> List[Dict[str, Any]]:
     
     return sections
 
+def _extract_sections(file_path: str) -> List[Dict[str, Any]]:
+    """Read a PDF and return its sections that are long enough to index"""
+    reader = PdfReader(file_path)
+    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    if not text.strip():
+        return []
+    # Skip very short sections
+    return [sec for sec in _split_into_sections(text) if len(sec["content"].strip()) >= 100]
+
+def _snippet_from_features(text: str, features: "tokens.TextFeatures", query_ids: np.ndarray,
+                           max_sents: int = 4) -> str:
+    """Same selection as _snippets_from_text, using features precomputed at ingest"""
+    chosen = tokens.best_sentences(features, query_ids, max_sents)
+    snippet = " ".join(text[features.bounds[i, 0]:features.bounds[i, 1]] for i in chosen)
+    
+    # Ensure snippet isn't too long
+    if len(snippet) > 500:
+        snippet = snippet[:500] + "..."
+    
+    return snippet.strip()
+
 def _snippets_from_text(text: str, query: str, max_sents: int = 4) -> str:
     """Enhanced query-biased snippet extraction"""
     # Clean text
@@ -150,6 +183,8 @@ class SectionMeta(BaseModel):
     doc_name: str
     heading: str
     content: str
+    vec_id: int = -1
+    content_hash: str = ""
     page_start: Optional[int] = None
     page_end: Optional[int] = None
     word_count: int = 0
@@ -159,11 +194,15 @@ class SectionMeta(BaseModel):
 class SemanticIndex:
     """Enhanced semantic index with competition-ready features"""
     
-    def __init__(self, index_dir: str = INDEX_DIR, model_name: str = MODEL_NAME):
+    def __init__(self, index_dir: str = INDEX_DIR, model_name: str = MODEL_NAME, batch_size: int = EMBED_BATCH_SIZE):
         self.index_dir = index_dir
-        self.meta_path = os.path.join(index_dir, "sections_meta.json")
-        self.faiss_path = os.path.join(index_dir, "faiss.index")
+        self.meta_path = os.path.join(index_dir, "sections_meta.json")  # legacy, migrated on load
+        self.db_path = os.path.join(index_dir, "sections.db")
+        self.faiss_path = os.path.join(index_dir, "faiss.index")  # legacy, adopted as first snapshot
+        self.bm25_path = os.path.join(index_dir, "bm25.npz")
+        self.centroids_path = os.path.join(index_dir, "doc_centroids.npz")
         self.model_name = model_name
+        self.batch_size = batch_size
         
         # Initialize with error handling
         try:
@@ -174,37 +213,247 @@ class SemanticIndex:
             logger.error(f"❌ Failed to load SentenceTransformer: {e}")
             raise
         
+        os.makedirs(index_dir, exist_ok=True)
+        self.store = SectionStore(self.db_path)
+        self.snapshots = SnapshotLog(index_dir)
+        
         self.index = None
+        # Section content is not kept in memory; see section_content()
         self.meta: List[SectionMeta] = []
+        self._id2pos: Dict[int, int] = {}
+        self._hash2doc: Dict[str, str] = {}
+        self._doc2ids: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self.tombstones = ann_index.Tombstones()  # deleted IDs still in an HNSW graph
+        self.ann_report: Dict[str, Any] = {}
+        self.query_cache = QueryEmbeddingCache()
+        self.bm25 = BM25Index()
+        self.centroids = DocumentCentroids(self.dim)
         self._load()
     
+    def _new_index(self) -> faiss.Index:
+        """Create an empty index whose vectors are addressed by stable section IDs"""
+        return ann_index.build_index(np.zeros((0, self.dim), dtype="float32"), ids=np.zeros(0, dtype="int64"))
+    
     def _load(self):
-        """Load existing index and metadata"""
+        """Load existing index and section metadata (without content)"""
         try:
-            if os.path.exists(self.meta_path) and os.path.exists(self.faiss_path):
-                with open(self.meta_path, "r", encoding="utf-8") as f:
-                    self.meta = [SectionMeta(**m) for m in json.load(f)]
+            if self.store.is_new and os.path.exists(self.meta_path):
+                self.store.import_json(self.meta_path)
+            
+            self.meta = [SectionMeta(content="", **row) for row in self.store.load_meta()]
+            self.index = self.snapshots.load_index()
+            if self.index is None and os.path.exists(self.faiss_path):
+                # Pre-snapshot layout: adopt the single index file as the first snapshot
                 self.index = faiss.read_index(self.faiss_path)
-                logger.info(f"✅ Loaded existing index: {len(self.meta)} sections, {self.index.ntotal} vectors")
-            else:
-                self.index = faiss.IndexFlatIP(self.dim)
+                if not isinstance(self.index, faiss.IndexIDMap2):
+                    self._migrate_positional_index()
+                self.snapshots.write_snapshot(self.index)
+                os.remove(self.faiss_path)
+            if self.index is None:
+                self.index = self._new_index()
                 logger.info("🆕 Created new FAISS index")
+            
+            ann_index.configure(self.index)
+            replayed = self._replay_log()
+            repaired = self._check_consistency()
+            self._rebuild_id_map()
+            keywords_synced = self._sync_keywords()
+            centroids_synced = self._sync_centroids()
+            if repaired or self._maybe_rebuild_index():
+                self._save(force=True)
+            else:
+                if keywords_synced:
+                    self.bm25.save(self.bm25_path)
+                if centroids_synced:
+                    self.centroids.save(self.centroids_path)
+            logger.info(f"✅ Loaded existing index: {len(self.meta)} sections, {self.index.ntotal} vectors "
+                        f"({replayed} log records replayed)")
         except Exception as e:
+            # Starting empty would let the consistency check and the next snapshot
+            # delete every stored section, so refuse to start instead
             logger.error(f"❌ Error loading index: {e}")
-            self.index = faiss.IndexFlatIP(self.dim)
-            self.meta = []
+            raise
+    
+    def _migrate_positional_index(self):
+        """Wrap a legacy position-addressed index in an ID map without re-embedding"""
+        n = min(self.index.ntotal, len(self.meta))
+        vectors = self.index.reconstruct_n(0, n) if n else np.zeros((0, self.dim), dtype="float32")
+        self.store.delete([m.vec_id for m in self.meta[n:]])
+        self.meta = self.meta[:n]
+        for i, m in enumerate(self.meta):
+            m.vec_id = i
+        self.index = self._new_index()
+        if n:
+            self.index.add_with_ids(vectors, np.arange(n, dtype="int64"))
+        logger.info(f"🔁 Migrated legacy index to stable section IDs ({n} vectors)")
+    
+    def _replay_log(self) -> int:
+        """Re-apply ingest log records written after the current snapshot"""
+        replayed = 0
+        for record in self.snapshots.replay():
+            ids = np.array(record["ids"], dtype="int64")
+            if record["op"] == "add":
+                self.index.add_with_ids(record["vectors"], ids)
+            elif record["op"] == "delete":
+                self.index = ann_index.remove_ids(self.index, ids, self.tombstones)
+            replayed += 1
+        return replayed
+    
+    def _check_consistency(self) -> int:
+        """Reconcile vector IDs with stored sections; returns the number of entries repaired"""
+        index_ids = set(faiss.vector_to_array(self.index.id_map).tolist())
+        meta_ids = {m.vec_id for m in self.meta}
+        
+        orphan_vectors = sorted(index_ids - meta_ids)
+        orphan_sections = sorted(meta_ids - index_ids)
+        repaired = len(orphan_sections)
+        if orphan_vectors:
+            if ann_index.index_type(self.index) == "hnsw":
+                # Deletions the snapshot's graph still holds: tombstoned again, nothing to repair
+                self.tombstones.add(orphan_vectors)
+            else:
+                logger.warning(f"⚠️ Removing {len(orphan_vectors)} vectors with no stored section")
+                self.index = ann_index.remove_ids(self.index, np.array(orphan_vectors, dtype="int64"),
+                                                  self.tombstones)
+                repaired += len(orphan_vectors)
+        if orphan_sections:
+            logger.warning(f"⚠️ Removing {len(orphan_sections)} stored sections with no vector")
+            self.store.delete(orphan_sections)
+            missing = set(orphan_sections)
+            self.meta = [m for m in self.meta if m.vec_id not in missing]
+        return repaired
     
-    def _save(self, embeddings: Optional[np.ndarray] = None):
-        """Save index and metadata with error handling"""
+    def _maybe_rebuild_index(self) -> bool:
+        """
+        Compact away tombstoned vectors once there are enough of them, and
+        move to the index type suited to the current corpus size (see
+        ``ann_index.choose_index_type``). In auto mode the index only ever
+        grows into a more approximate type, so deletions do not cause churn.
+        """
+        compacted = self._maybe_compact()
+        current = ann_index.index_type(self.index)
+        target = ann_index.choose_index_type(ann_index.live_count(self.index, self.tombstones))
+        if target == current:
+            return compacted
+        if ann_index.ANN_INDEX_TYPE not in ann_index.INDEX_TYPES and \
+                ann_index.INDEX_TYPES.index(target) < ann_index.INDEX_TYPES.index(current):
+            return compacted
+        vectors = ann_index.exact_vectors(self.index)
+        if vectors is None:
+            return compacted  # IVF-PQ codes are lossy; rebuilding from them would compound the error
+        
+        t0 = time.time()
+        ids = faiss.vector_to_array(self.index.id_map)
+        live = ~np.isin(ids, self.tombstones.ids)
+        vectors, ids = vectors[live], ids[live]
+        self.tombstones.clear()
+        index = ann_index.build_index(vectors, ids=ids, kind=target)
+        self.ann_report = ann_index.recall_report(index, vectors, ids=ids)
+        self.index = index
+        logger.info(f"🔁 Rebuilt index as {target} over {len(ids)} vectors in {time.time() - t0:.1f}s: "
+                    f"recall@{self.ann_report.get('k')}={self.ann_report.get('recall_at_k')}, "
+                    f"{self.ann_report.get('ann_ms_per_query')}ms vs flat "
+                    f"{self.ann_report.get('flat_ms_per_query')}ms per query")
+        return True
+    
+    def _sync_keywords(self) -> int:
+        """
+        Load the keyword index and bring it in line with the stored sections
+        (it is only saved with snapshots); returns the number of sections added.
+        """
+        self.bm25 = BM25Index.load(self.bm25_path) or BM25Index()
+        have = set(self.bm25.keys().tolist())
+        want = {m.vec_id for m in self.meta}
+        if have - want:
+            self.bm25.remove(have - want)
+        missing = sorted(want - have)
+        for start in range(0, len(missing), 1000):
+            batch = missing[start:start + 1000]
+            contents = self.store.get_contents(batch)
+            self.bm25.add_counts((vec_id, tokens.term_counts(contents.get(vec_id, ""))) for vec_id in batch)
+        if missing:
+            logger.info(f"🔤 Added {len(missing)} sections to the keyword index")
+        return len(missing) + len(have - want)
+    
+    def _sync_centroids(self) -> int:
+        """
+        Load the document centroids and recompute any that do not match the
+        stored sections (they are only saved with snapshots); returns the
+        number of documents changed.
+        """
+        self.centroids = DocumentCentroids.load(self.centroids_path, self.dim) or DocumentCentroids(self.dim)
+        stale = [name for name in self.centroids.names if name not in self._doc2ids]
+        for name in stale:
+            self.centroids.remove(name)
+        missing = [name for name, ids in self._doc2ids.items() if self.centroids.size(name) != len(ids)]
+        lossy = ann_index.index_type(self.index) == "ivfpq"
+        for name in missing:
+            ids = self._doc2ids[name]
+            if lossy:
+                contents = self.store.get_contents(ids)
+                vectors = self._encode([contents.get(vec_id, "") for vec_id in ids])
+            else:
+                vectors = self.index.reconstruct_batch(np.array(ids, dtype="int64"))
+            self.centroids.remove(name)
+            self.centroids.add(name, vectors)
+        if missing:
+            logger.info(f"📍 Computed centroids for {len(missing)} documents")
+        return len(missing) + len(stale)
+    
+    def _maybe_compact(self) -> bool:
+        """Rebuild the HNSW graph without its tombstoned vectors once they are a large enough share"""
+        if not self.tombstones.should_compact(self.index):
+            return False
+        t0 = time.time()
+        dropped = len(self.tombstones)
+        self.index = ann_index.compact(self.index, self.tombstones)
+        logger.info(f"🧹 Compacted index: dropped {dropped} deleted vectors, {self.index.ntotal} remain "
+                    f"({time.time() - t0:.1f}s)")
+        return True
+    
+    def _rebuild_id_map(self):
+        """Recompute vector ID, document and content hash lookups after meta changes"""
+        self._id2pos = {m.vec_id: i for i, m in enumerate(self.meta)}
+        self._hash2doc = {m.content_hash: m.doc_name for m in self.meta if m.content_hash}
+        self._doc2ids = {}
+        for m in self.meta:
+            self._doc2ids.setdefault(m.doc_name, []).append(m.vec_id)
+        # IDs still tombstoned in the graph must not be handed out again
+        self._next_id = max(max(self._id2pos, default=-1), self.tombstones.max_id()) + 1
+    
+    def find_duplicate(self, content_hash: str) -> Optional[str]:
+        """Name of the indexed document with this file hash, if any"""
+        return self._hash2doc.get(content_hash)
+    
+    def _contents_with_features(self, vec_ids: List[int]) -> Dict[int, Tuple[str, "tokens.TextFeatures"]]:
+        """Section texts with snippet features, computing and storing any that are missing"""
+        out, backfill = {}, {}
+        for vec_id, (content, *blobs) in self.store.get_contents_with_features(vec_ids).items():
+            features = tokens.TextFeatures.from_blobs(*blobs)
+            if features is None:
+                content = _clean_text(content)
+                features = tokens.analyze(content)
+                backfill[vec_id] = (content, *features.to_blobs())
+            out[vec_id] = (content, features)
+        if backfill:
+            self.store.set_features(backfill)
+        return out
+    
+    def section_content(self, m: SectionMeta) -> str:
+        """Load a section's text from the metadata store"""
+        return self.store.get_content(m.vec_id)
+    
+    def _save(self, force: bool = False):
+        """
+        Make the index durable. Changes are already in the ingest log and the
+        section store; a new snapshot is written once the log grows large.
+        """
         try:
-            if embeddings is not None and self.index.ntotal == 0:
-                self.index = faiss.IndexFlatIP(self.dim)
-                self.index.add(embeddings)
-            
-            faiss.write_index(self.index, self.faiss_path)
-            
-            with open(self.meta_path, "w", encoding="utf-8") as f:
-                json.dump([m.dict() for m in self.meta], f, ensure_ascii=False, indent=2)
+            if self._maybe_rebuild_index() or force or self.snapshots.should_snapshot():
+                self.snapshots.write_snapshot(self.index)
+                self.bm25.save(self.bm25_path)
+                self.centroids.save(self.centroids_path)
             
             logger.info(f"✅ Index saved: {len(self.meta)} sections, {self.index.ntotal} vectors")
         except Exception as e:
@@ -214,8 +463,17 @@ class SemanticIndex:
     def clear(self):
         """Clear all indexed data"""
         try:
-            self.index = faiss.IndexFlatIP(self.dim)
+            self.index = self._new_index()
+            self.tombstones.clear()
             self.meta = []
+            self._rebuild_id_map()
+            self.store.clear()
+            self.snapshots.reset()
+            self.bm25.clear()
+            self.centroids.clear()
+            for path in (self.bm25_path, self.centroids_path):
+                if os.path.exists(path):
+                    os.remove(path)
             
             if os.path.exists(self.meta_path):
                 os.remove(self.meta_path)
@@ -231,6 +489,82 @@ class SemanticIndex:
         norms = np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
         return X / norms
     
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches of ``batch_size`` with one model call"""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype="float32")
+    
+    def _index_sections(self, docs: List[Tuple[str, str, str, List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """Batch-embed the sections of (doc_id, doc_name, content_hash, sections) docs and add them"""
+        now = str(np.datetime64('now'))
+        new_meta = []
+        for doc_id, doc_name, content_hash, sections in docs:
+            for sec in sections:
+                new_meta.append(SectionMeta(
+                    id=uuid.uuid4().hex,
+                    doc_id=doc_id,
+                    doc_name=doc_name,
+                    heading=sec["heading"],
+                    content=_clean_text(sec["content"]),  # snippet offsets index the cleaned text
+                    content_hash=content_hash,
+                    word_count=len(sec["content"].split()),
+                    created_at=now,
+                    updated_at=now
+                ))
+        
+        if not new_meta:
+            self._hash2doc.update((h, name) for _, name, h, _ in docs)
+            return {"sections_added": 0, "embed_seconds": 0.0, "sections_per_sec": 0.0}
+        
+        start = time.perf_counter()
+        new_embeddings = self._encode([m.content for m in new_meta])
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        
+        if self.index is None or self.index.d != self.dim:
+            self.index = self._new_index()
+            self.tombstones.clear()
+        
+        ids = np.arange(self._next_id, self._next_id + len(new_meta), dtype="int64")
+        self.snapshots.append("add", ids, new_embeddings)
+        for m, vec_id in zip(new_meta, ids):
+            m.vec_id = int(vec_id)
+            self._id2pos[m.vec_id] = len(self.meta)
+            self.meta.append(m)
+        self._next_id += len(new_meta)
+        self.index.add_with_ids(new_embeddings, ids)
+        self.bm25.add_counts((m.vec_id, tokens.term_counts(m.content)) for m in new_meta)
+        doc_rows: Dict[str, List[int]] = {}
+        for row, m in enumerate(new_meta):
+            doc_rows.setdefault(m.doc_name, []).append(row)
+            self._doc2ids.setdefault(m.doc_name, []).append(m.vec_id)
+        for doc_name, doc_row_ids in doc_rows.items():
+            self.centroids.add(doc_name, new_embeddings[doc_row_ids])
+        
+        # Persist only the new rows with their snippet features, then drop their text from memory
+        rows = []
+        for m in new_meta:
+            row = m.model_dump()
+            row["sent_bounds"], row["tok_ids"], row["tok_sent"] = tokens.analyze(m.content).to_blobs()
+            rows.append(row)
+        self.store.append(rows)
+        # Only once committed: a failed embed must not make the file a duplicate of itself
+        self._hash2doc.update((h, name) for _, name, h, _ in docs)
+        for m in new_meta:
+            m.content = ""
+        
+        rate = len(new_meta) / elapsed
+        logger.info(f"🧮 Embedded {len(new_meta)} sections in {elapsed:.2f}s ({rate:.1f} sections/sec)")
+        return {
+            "sections_added": len(new_meta),
+            "embed_seconds": round(elapsed, 3),
+            "sections_per_sec": round(rate, 1)
+        }
+    
     def ingest_pdf(self, file_path: str, doc_id: Optional[str] = None, doc_name: Optional[str] = None) -> Dict[str, Any]:
         """Enhanced PDF ingestion with better error handling"""
         try:
@@ -239,102 +573,159 @@ class SemanticIndex:
             
             logger.info(f"📚 Processing PDF: {doc_name}")
             
+            # Byte-identical copies share the already indexed sections
+            content_hash = sha256_file(file_path)
+            duplicate_of = self.find_duplicate(content_hash)
+            if duplicate_of:
+                logger.info(f"⏭️ {doc_name} is identical to indexed {duplicate_of}, skipping")
+                return {
+                    "success": True,
+                    "doc_name": doc_name,
+                    "duplicate_of": duplicate_of,
+                    "sections_added": 0,
+                    "total_sections": len(self.meta)
+                }
+            
             # Read PDF with error handling
             try:
-                reader = PdfReader(file_path)
-                text = "\n".join(page.extract_text() or "" for page in reader.pages)
+                sections = _extract_sections(file_path)
             except Exception as e:
                 logger.error(f"❌ Error reading PDF {doc_name}: {e}")
                 return {"error": f"Failed to read PDF: {e}"}
             
-            if not text.strip():
-                logger.warning(f"⚠️ PDF {doc_name} has no extractable text")
-                return {"warning": "No text content found"}
-            
-            # Split into sections
-            sections = _split_into_sections(text)
-            logger.info(f"📖 Extracted {len(sections)} sections from {doc_name}")
-            
-            new_embeddings = []
-            new_meta = []
-            
-            for sec in sections:
-                if len(sec["content"].strip()) < 100:  # Skip very short sections
-                    continue
-                
-                s_id = uuid.uuid4().hex
-                meta = SectionMeta(
-                    id=s_id,
-                    doc_id=doc_id,
-                    doc_name=doc_name,
-                    heading=sec["heading"],
-                    content=sec["content"],
-                    word_count=len(sec["content"].split()),
-                    created_at=str(np.datetime64('now')),
-                    updated_at=str(np.datetime64('now'))
-                )
-                
-                new_meta.append(meta)
-                
-                # Generate embedding
-                try:
-                    embedding = self.model.encode(sec["content"], normalize_embeddings=True)
-                    new_embeddings.append(embedding)
-                except Exception as e:
-                    logger.error(f"❌ Error encoding section {s_id}: {e}")
-                    continue
-            
-            if not new_meta:
+            if not sections:
                 logger.warning(f"⚠️ No valid sections found in {doc_name}")
                 return {"warning": "No valid sections extracted"}
             
-            # Add to index
-            new_embeddings = np.vstack(new_embeddings).astype("float32")
-            
-            if self.index is None or self.index.d != self.dim:
-                self.index = faiss.IndexFlatIP(self.dim)
+            logger.info(f"📖 Extracted {len(sections)} sections from {doc_name}")
             
-            self.index.add(new_embeddings)
-            self.meta.extend(new_meta)
+            # Embed all sections of the document together
+            stats = self._index_sections([(doc_id, doc_name, content_hash, sections)])
             
             # Save updated index
             self._save()
             
-            logger.info(f"✅ Successfully indexed {len(new_meta)} sections from {doc_name}")
+            logger.info(f"✅ Successfully indexed {stats['sections_added']} sections from {doc_name}")
             return {
                 "success": True,
                 "doc_name": doc_name,
-                "sections_added": len(new_meta),
-                "total_sections": len(self.meta)
+                "sections_added": stats["sections_added"],
+                "total_sections": len(self.meta),
+                "sections_per_sec": stats["sections_per_sec"]
             }
             
         except Exception as e:
             logger.error(f"❌ Error ingesting PDF {file_path}: {e}")
             return {"error": f"Failed to ingest PDF: {e}"}
     
-    def scan_and_ingest(self, upload_dir: str = UPLOAD_DIR) -> Dict[str, Any]:
-        """Scan upload directory and ingest new PDFs"""
+    def delete_document(self, doc_name: str) -> int:
+        """Remove a document's vectors by ID and compact metadata (no re-embedding)"""
+        ids = [m.vec_id for m in self.meta if m.doc_name == doc_name]
+        if not ids:
+            return 0
+        
+        self.snapshots.append("delete", ids)
+        self.store.delete(ids)
+        self.index = ann_index.remove_ids(self.index, np.array(ids, dtype="int64"), self.tombstones)
+        self.bm25.remove(ids)
+        self.centroids.remove(doc_name)
+        self.meta = [m for m in self.meta if m.doc_name != doc_name]
+        self._rebuild_id_map()
+        self._save()
+        
+        logger.info(f"🗑️ Removed {len(ids)} sections of {doc_name} from index")
+        return len(ids)
+    
+    def _backfill_hashes(self, upload_dir: str):
+        """Attach file hashes to sections indexed before deduplication existed"""
+        missing: Dict[str, List[SectionMeta]] = {}
+        for m in self.meta:
+            if not m.content_hash:
+                missing.setdefault(m.doc_name, []).append(m)
+        for doc_name, metas in missing.items():
+            path = os.path.join(upload_dir, doc_name)
+            if not os.path.exists(path):
+                continue
+            content_hash = sha256_file(path)
+            for m in metas:
+                m.content_hash = content_hash
+            self.store.set_content_hash(doc_name, content_hash)
+            self._hash2doc.setdefault(content_hash, doc_name)
+    
+    def scan_and_ingest(self, upload_dir: str = UPLOAD_DIR, workers: Optional[int] = None) -> Dict[str, Any]:
+        """Scan upload directory and ingest new PDFs, parsing them in a process pool"""
         try:
             pdfs = [os.path.join(upload_dir, f) for f in os.listdir(upload_dir) 
                    if f.lower().endswith(".pdf")]
             
             logger.info(f"🔍 Found {len(pdfs)} PDFs in upload directory")
             
+            self._backfill_hashes(upload_dir)
+            
+            indexed = {m.doc_name for m in self.meta}
             results = []
+            hashes = {}
+            to_parse = []
             for pdf_path in pdfs:
                 doc_name = os.path.basename(pdf_path)
                 
                 # Check if already ingested
-                if any(doc_name == m.doc_name for m in self.meta):
+                if doc_name in indexed:
                     logger.info(f"⏭️ Skipping already indexed: {doc_name}")
                     continue
                 
-                result = self.ingest_pdf(pdf_path, doc_name=doc_name)
-                results.append(result)
+                # Skip byte-identical copies of indexed (or earlier scanned) files
+                content_hash = sha256_file(pdf_path)
+                duplicate_of = self.find_duplicate(content_hash) or hashes.get(content_hash)
+                if duplicate_of:
+                    logger.info(f"⏭️ Skipping {doc_name}, identical to {duplicate_of}")
+                    results.append({"doc_name": doc_name, "duplicate_of": duplicate_of})
+                    continue
+                
+                hashes[content_hash] = doc_name
+                to_parse.append(pdf_path)
+            
+            path_hashes = {os.path.join(upload_dir, name): h for h, name in hashes.items()}
+            pending = []
+            ingested = 0
+            embedded = 0
+            embed_seconds = 0.0
+            
+            def flush():
+                nonlocal embedded, embed_seconds
+                stats = self._index_sections(pending)
+                embedded += stats["sections_added"]
+                embed_seconds += stats["embed_seconds"]
+                pending.clear()
+            
+            # Parsers run concurrently; this loop is the single embedding consumer
+            for pdf_path, sections, error in iter_extracted(to_parse, _extract_sections, workers=workers):
+                doc_name = os.path.basename(pdf_path)
+                
+                if error:
+                    logger.error(f"❌ Error reading PDF {doc_name}: {error}")
+                    results.append({"doc_name": doc_name, "error": f"Failed to read PDF: {error}"})
+                    continue
+                
+                if not sections:
+                    results.append({"doc_name": doc_name, "warning": "No valid sections extracted"})
+                    continue
+                
+                pending.append((uuid.uuid4().hex, doc_name, path_hashes[pdf_path], sections))
+                results.append({"success": True, "doc_name": doc_name, "sections_added": len(sections)})
+                ingested += 1
+                
+                if sum(len(secs) for _, _, _, secs in pending) >= self.batch_size:
+                    flush()
+            
+            flush()
+            if ingested:
+                self._save(force=True)
             
             return {
                 "scanned": len(pdfs),
-                "ingested": len([r for r in results if r.get("success")]),
+                "ingested": ingested,
+                "sections_per_sec": round(embedded / embed_seconds, 1) if embed_seconds else 0.0,
                 "results": results
             }
             
@@ -342,68 +733,176 @@ class SemanticIndex:
             logger.error(f"❌ Error scanning upload directory: {e}")
             return {"error": f"Scan failed: {e}"}
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def search(self, query: str, top_k: int = 5, mode: str = "dense",
+               top_docs: Optional[int] = None, rerank: bool = False) -> List[Dict[str, Any]]:
         """Enhanced semantic search with better error handling"""
+        if not query.strip():
+            logger.warning("⚠️ Empty query provided")
+            return []
+        results = self.search_many([query], top_k, mode=mode, top_docs=top_docs, rerank=rerank)[0]
+        logger.info(f"🔍 Search completed: {len(results)} results for query '{query[:50]}...'")
+        return results
+    
+    def search_many(self, queries: List[str], top_k: int = 5, mode: str = "dense",
+                    top_docs: Optional[int] = None, rerank: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries at once: one encoder pass for the uncached
+        queries and one FAISS call per widening round. Returns one result
+        list per query, in order (empty for blank queries).
+        
+        ``mode`` is "dense" (vectors), "bm25" (keywords) or "hybrid"
+        (reciprocal-rank fusion of both; scores are then fused ranks).
+        
+        With ``top_docs`` (default ``SEARCH_TOP_DOCS``; 0 disables) the search
+        runs in two stages: the documents whose centroids are closest to the
+        query are picked first, and only their sections are searched.
+        
+        With ``rerank`` the top ``RERANK_TOP_N`` candidates are reordered by a
+        cross-encoder, as far as its latency budget allows, before cutting to ``top_k``.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
         try:
-            if self.index is None or self.index.ntotal == 0:
+            if self.index is None or ann_index.live_count(self.index, self.tombstones) == 0:
                 logger.warning("⚠️ No indexed content available for search")
-                return []
+                return results
             
-            if not query.strip():
-                logger.warning("⚠️ Empty query provided")
-                return []
+            active = [i for i, q in enumerate(queries) if q.strip()]
+            if not active:
+                return results
             
-            # Generate query embedding
-            try:
-                q_emb = self.model.encode([query], normalize_embeddings=True).astype("float32")
-            except Exception as e:
-                logger.error(f"❌ Error encoding query: {e}")
-                return []
+            # Generate query embeddings (repeated selections hit the cache)
+            rows = {}
+            if mode != "bm25":
+                try:
+                    q_emb = self.query_cache.get_or_compute_many([queries[i] for i in active], self._encode)
+                except Exception as e:
+                    logger.error(f"❌ Error encoding queries: {e}")
+                    return results
+                rows = dict(zip(active, q_emb))
             
-            # Search with error handling
-            try:
-                scores, idxs = self.index.search(q_emb, min(top_k, self.index.ntotal))
-            except Exception as e:
-                logger.error(f"❌ Error searching index: {e}")
-                return []
+            # Stage one (optional): restrict each query to the sections of its closest documents
+            top_docs = SEARCH_TOP_DOCS if top_docs is None else top_docs
+            masks: Dict[int, np.ndarray] = {}
+            if mode != "bm25" and 0 < top_docs < len(self.centroids):
+                for i, docs in zip(active, self.centroids.top(np.stack([rows[i] for i in active]), top_docs)):
+                    mask = np.zeros(self._next_id, dtype=bool)
+                    for doc_name, _ in docs:
+                        mask[self._doc2ids.get(doc_name, [])] = True
+                    masks[i] = mask
             
-            # Process results
-            results = []
-            for j, score in zip(idxs[0], scores[0]):
-                if j == -1 or j >= len(self.meta):
-                    continue
+            # Legacy duplicate documents collapse to one hit, so widen k until enough survive
+            wanted = max(top_k, RERANK_TOP_N) if rerank else top_k
+            hits: Dict[int, List[Tuple[SectionMeta, str, Optional[tokens.TextFeatures], float]]] = {}
+            searchable_total = ann_index.live_count(self.index, self.tombstones)
+            k = min(wanted, searchable_total)
+            pending = active
+            while pending:
+                # Search with error handling
+                if mode != "bm25":
+                    try:
+                        if masks:
+                            found = [ann_index.search_filtered(self.index, rows[i][None, :], k, masks[i])
+                                     for i in pending]
+                            scores = np.concatenate([s for s, _ in found])
+                            idxs = np.concatenate([j for _, j in found])
+                        else:
+                            scores, idxs = ann_index.search(self.index, np.stack([rows[i] for i in pending]), k,
+                                                            self.tombstones)
+                    except Exception as e:
+                        logger.error(f"❌ Error searching index: {e}")
+                        return results
                 
-                m = self.meta[j]
-                snippet = _snippets_from_text(m.content, query, max_sents=4)
+                candidates = {}
+                for r, i in enumerate(pending):
+                    ranked = []
+                    if mode != "bm25":
+                        ranked = [(int(j), float(score)) for j, score in zip(idxs[r], scores[r]) if int(j) != -1]
+                    if mode == "bm25":
+                        ranked = self.bm25.search(queries[i], k)
+                    elif mode == "hybrid":
+                        ranked = rrf_fuse([ranked, self.bm25.search(queries[i], k, allowed=masks.get(i))])
+                    candidates[i] = [(self.meta[self._id2pos[j]], score) for j, score in ranked if j in self._id2pos]
+                contents = self._contents_with_features(
+                    list({m.vec_id for cands in candidates.values() for m, _ in cands}))
                 
-                results.append({
-                    "score": float(score),
-                    "doc_id": m.doc_id,
-                    "doc_name": m.doc_name,
-                    "heading": m.heading,
-                    "snippet": snippet,
-                    "section_id": m.id,
-                    "word_count": m.word_count,
-                    "full_content": m.content[:1000] + "..." if len(m.content) > 1000 else m.content
-                })
+                widen = []
+                for i, cands in candidates.items():
+                    hits[i] = []
+                    seen = set()
+                    for m, score in cands:
+                        content, features = contents.get(m.vec_id, ("", None))
+                        if (m.heading, content) in seen:
+                            continue
+                        seen.add((m.heading, content))
+                        hits[i].append((m, content, features, score))
+                    searchable = int(masks[i].sum()) if i in masks else searchable_total
+                    if len(hits[i]) < wanted and k < searchable:
+                        widen.append(i)
+                pending = widen
+                k = min(k * 2, searchable_total)
             
-            logger.info(f"🔍 Search completed: {len(results)} results for query '{query[:50]}...'")
+            if rerank:
+                orders = get_reranker().rerank_many(
+                    [queries[i] for i in active],
+                    [[(m.id, content) for m, content, _, _ in hits[i][:wanted]] for i in active])
+                for i, order in zip(active, orders):
+                    hits[i] = [hits[i][j] for j in order]
+            
+            # Process results
+            for i in active:
+                query_ids = tokens.token_ids(queries[i])
+                for m, content, features, score in hits[i][:top_k]:
+                    if features is not None:
+                        snippet = _snippet_from_features(content, features, query_ids, max_sents=4)
+                    else:
+                        snippet = _snippets_from_text(content, queries[i], max_sents=4)
+                    
+                    results[i].append({
+                        "score": score,
+                        "doc_id": m.doc_id,
+                        "doc_name": m.doc_name,
+                        "heading": m.heading,
+                        "snippet": snippet,
+                        "section_id": m.id,
+                        "word_count": m.word_count,
+                        "full_content": content[:1000] + "..." if len(content) > 1000 else content
+                    })
+            
+            if len(queries) > 1:
+                logger.info(f"🔍 Batch search completed: {len(active)} queries, "
+                            f"{sum(len(r) for r in results)} results")
             return results
             
         except Exception as e:
             logger.error(f"❌ Error in search: {e}")
-            return []
+            return results
+    
+    def related_documents(self, doc_name: str, top_n: int = 5) -> List[Dict[str, Any]]:
+        """Documents most similar to ``doc_name`` by centroid cosine similarity"""
+        return [{"doc_name": name, "score": score} for name, score in self.centroids.related(doc_name, top_n)]
     
     def get_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
         try:
             return {
                 "total_sections": len(self.meta),
-                "indexed_vectors": self.index.ntotal if self.index else 0,
+                "indexed_vectors": ann_index.live_count(self.index, self.tombstones) if self.index else 0,
+                "tombstoned_vectors": len(self.tombstones),
                 "embedding_dimension": self.dim,
                 "model_name": self.model_name,
                 "documents": len(set(m.doc_id for m in self.meta)),
-                "index_size_mb": os.path.getsize(self.faiss_path) / (1024 * 1024) if os.path.exists(self.faiss_path) else 0
+                "index_type": ann_index.index_type(self.index),
+                "ann_report": self.ann_report,
+                "index_size_mb": self.snapshots.index_bytes() / (1024 * 1024),
+                "snapshot_version": (self.snapshots.current or {}).get("version", 0),
+                "ingest_log_mb": self.snapshots.log_bytes() / (1024 * 1024),
+                "metadata_size_mb": self.store.size_bytes() / (1024 * 1024),
+                "query_cache": self.query_cache.stats(),
+                "keyword_index": self.bm25.stats(),
+                "document_centroids": len(self.centroids),
+                "reranker": get_reranker().stats()
             }
         except Exception as e:
             logger.error(f"❌ Error getting stats: {e}")
@@ -0,0 +1,220 @@
+# backend/app/snapshots.py
+import os
+import re
+import json
+import base64
+import shutil
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_LOG_BYTES = int(os.environ.get("INDEX_SNAPSHOT_LOG_MB", "32")) * 1024 * 1024
+SNAPSHOTS_TO_KEEP = 2
+_SNAPSHOT_DIR_RE = re.compile(r"^v(\d+)$")
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # not supported on this platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class SnapshotLog:
+    """
+    Versioned FAISS snapshots plus an append-only ingest log.
+
+    Every add/delete is appended (with its vectors) and fsynced to
+    ``ingest.log`` before the in-memory index changes, so an acknowledged
+    ingest survives a crash. Snapshots are written to a fresh
+    ``snapshots/vNNNNNN`` directory and published by atomically replacing
+    the ``CURRENT`` pointer; on restart only log records newer than the
+    current snapshot are replayed.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.snapshot_root = os.path.join(index_dir, "snapshots")
+        self.current_path = os.path.join(index_dir, "CURRENT")
+        self.log_path = os.path.join(index_dir, "ingest.log")
+        os.makedirs(self.snapshot_root, exist_ok=True)
+        self.seq = 0
+        self.current: Optional[Dict[str, Any]] = self._read_current()
+        self._remove_orphans()
+
+    # ---------- Snapshots ----------
+    def _versions(self) -> List[int]:
+        found = (_SNAPSHOT_DIR_RE.match(d) for d in os.listdir(self.snapshot_root))
+        return [int(m.group(1)) for m in found if m]
+
+    def _remove_orphans(self):
+        """Drop temp dirs and versions never made current (a crash before the pointer was replaced)"""
+        current = (self.current or {}).get("version", 0)
+        for d in os.listdir(self.snapshot_root):
+            m = _SNAPSHOT_DIR_RE.match(d)
+            if m is None or int(m.group(1)) > current:
+                logger.warning(f"⚠️ Removing unpublished snapshot directory {d}")
+                shutil.rmtree(os.path.join(self.snapshot_root, d), ignore_errors=True)
+
+    def _read_current(self) -> Optional[Dict[str, Any]]:
+        """
+        The published snapshot's manifest. If the pointer is missing or
+        unreadable, the newest snapshot with a readable manifest is used
+        instead: every vNNNNNN directory was complete before it was renamed
+        into place, and the log still holds everything after its seq.
+        """
+        missing = not os.path.exists(self.current_path)
+        if not missing:
+            try:
+                with open(self.current_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"❌ Unreadable snapshot pointer: {e}")
+        for version in sorted(self._versions(), reverse=True):
+            manifest = self._read_manifest(f"v{version:06d}")
+            if manifest is not None:
+                logger.warning(f"⚠️ Falling back to snapshot {manifest['dir']}")
+                self._write_pointer(manifest)
+                return manifest
+        if missing:
+            return None
+        raise RuntimeError(f"Snapshot pointer {self.current_path} is unreadable and no snapshot "
+                           f"in {self.snapshot_root} has a readable manifest; refusing to start")
+
+    def _read_manifest(self, name: str) -> Optional[Dict[str, Any]]:
+        directory = os.path.join(self.snapshot_root, name)
+        try:
+            with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Skipping snapshot {name}: {e}")
+            return None
+        if manifest.get("dir") != name or not os.path.exists(os.path.join(directory, "faiss.index")):
+            logger.warning(f"⚠️ Skipping snapshot {name}: incomplete")
+            return None
+        return manifest
+
+    def _write_pointer(self, manifest: Dict[str, Any]):
+        tmp_ptr = self.current_path + ".tmp"
+        with open(tmp_ptr, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_ptr, self.current_path)
+        _fsync_dir(self.index_dir)
+
+    def load_index(self) -> Optional[faiss.Index]:
+        """Index from the current snapshot, or None if there is none yet"""
+        if not self.current:
+            return None
+        path = os.path.join(self.snapshot_root, self.current["dir"], "faiss.index")
+        index = faiss.read_index(path)
+        self.seq = max(self.seq, self.current["seq"])
+        return index
+
+    def write_snapshot(self, index: faiss.Index) -> Dict[str, Any]:
+        """Persist ``index`` as a new version and atomically make it current"""
+        self._remove_orphans()
+        # Past every directory on disk, so a version left unpublished by a crash is never reused
+        version = max([(self.current or {}).get("version", 0)] + self._versions()) + 1
+        name = f"v{version:06d}"
+        tmp_dir = os.path.join(self.snapshot_root, name + ".tmp")
+        final_dir = os.path.join(self.snapshot_root, name)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        index_path = os.path.join(tmp_dir, "faiss.index")
+        faiss.write_index(index, index_path)
+        with open(index_path, "rb") as f:
+            os.fsync(f.fileno())
+        manifest = {"version": version, "dir": name, "seq": self.seq, "ntotal": int(index.ntotal)}
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_dir, final_dir)
+        _fsync_dir(self.snapshot_root)
+
+        self._write_pointer(manifest)
+        self.current = manifest
+
+        # Everything in the log is now covered by the snapshot
+        open(self.log_path, "wb").close()
+        self._prune()
+        logger.info(f"📸 Index snapshot {name} written ({manifest['ntotal']} vectors, seq {self.seq})")
+        return manifest
+
+    def _prune(self):
+        keep = {f"v{v:06d}" for v in sorted(self._versions())[-SNAPSHOTS_TO_KEEP:]}
+        keep.add(self.current["dir"])
+        for d in os.listdir(self.snapshot_root):
+            if d not in keep:
+                shutil.rmtree(os.path.join(self.snapshot_root, d), ignore_errors=True)
+
+    # ---------- Ingest log ----------
+    def append(self, op: str, ids: List[int], vectors: Optional[np.ndarray] = None) -> int:
+        """Durably record an ``add`` (with vectors) or ``delete`` before applying it"""
+        self.seq += 1
+        record: Dict[str, Any] = {"seq": self.seq, "op": op, "ids": [int(i) for i in ids]}
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype="float32")
+            record["dim"] = int(vectors.shape[1])
+            record["vectors"] = base64.b64encode(vectors.tobytes()).decode("ascii")
+        with open(self.log_path, "ab") as f:
+            f.write((json.dumps(record) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return self.seq
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """Yield log records newer than the current snapshot, dropping a torn tail"""
+        if not os.path.exists(self.log_path):
+            return
+        after = (self.current or {}).get("seq", 0)
+        good_bytes = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("⚠️ Ingest log ends with a partial record, truncating it")
+                    break
+                good_bytes += len(line)
+                self.seq = max(self.seq, record["seq"])
+                if record["seq"] <= after:
+                    continue
+                if "vectors" in record:
+                    raw = base64.b64decode(record["vectors"])
+                    record["vectors"] = np.frombuffer(raw, dtype="float32").reshape(-1, record["dim"])
+                yield record
+        if good_bytes != os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_bytes)
+
+    def index_bytes(self) -> int:
+        if not self.current:
+            return 0
+        path = os.path.join(self.snapshot_root, self.current["dir"], "faiss.index")
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def log_bytes(self) -> int:
+        return os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+
+    def should_snapshot(self) -> bool:
+        return self.log_bytes() >= SNAPSHOT_LOG_BYTES
+
+    def reset(self):
+        """Forget all snapshots and log records"""
+        shutil.rmtree(self.snapshot_root, ignore_errors=True)
+        os.makedirs(self.snapshot_root, exist_ok=True)
+        for path in (self.current_path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.current = None
+        self.seq = 0
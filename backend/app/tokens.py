@@ -0,0 +1,83 @@
+# backend/app/tokens.py
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_SENT_BREAK_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\w+")
+
+def token_ids(text: str) -> np.ndarray:
+    """Sorted unique 32-bit hashes of the lowercased words in ``text``"""
+    words = set(_WORD_RE.findall(text.lower()))
+    return np.unique(np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint32, count=len(words)))
+
+@dataclass
+class TextFeatures:
+    """
+    Sentence boundaries and hashed word IDs of one (already cleaned) text,
+    computed once at ingest so snippet scoring needs no regex work.
+    """
+    bounds: np.ndarray    # (n_sents, 2) int32 character offsets
+    tok_ids: np.ndarray   # uint32 unique word hashes, grouped by sentence
+    tok_sent: np.ndarray  # int32 sentence index of each entry in tok_ids
+
+    def to_blobs(self):
+        return (self.bounds.astype(np.int32).tobytes(),
+                self.tok_ids.astype(np.uint32).tobytes(),
+                self.tok_sent.astype(np.int32).tobytes())
+
+    @classmethod
+    def from_blobs(cls, bounds: Optional[bytes], tok_ids: Optional[bytes],
+                   tok_sent: Optional[bytes]) -> Optional["TextFeatures"]:
+        if bounds is None or tok_ids is None or tok_sent is None:
+            return None
+        return cls(np.frombuffer(bounds, dtype=np.int32).reshape(-1, 2),
+                   np.frombuffer(tok_ids, dtype=np.uint32),
+                   np.frombuffer(tok_sent, dtype=np.int32))
+
+def analyze(text: str) -> TextFeatures:
+    """Split ``text`` into sentences and hash each sentence's unique words"""
+    stripped = text.strip()
+    offset = len(text) - len(text.lstrip())
+    bounds, ids, sent_of = [], [], []
+    start = 0
+    for m in list(_SENT_BREAK_RE.finditer(stripped)) + [None]:
+        end = m.start() if m else len(stripped)
+        sent_ids = token_ids(stripped[start:end])
+        ids.append(sent_ids)
+        sent_of.append(np.full(len(sent_ids), len(bounds), dtype=np.int32))
+        bounds.append((offset + start, offset + end))
+        if m:
+            start = m.end()
+    return TextFeatures(
+        bounds=np.array(bounds, dtype=np.int32).reshape(-1, 2),
+        tok_ids=np.concatenate(ids) if ids else np.zeros(0, dtype=np.uint32),
+        tok_sent=np.concatenate(sent_of) if sent_of else np.zeros(0, dtype=np.int32),
+    )
+
+def best_sentences(features: TextFeatures, query_ids: np.ndarray, max_sents: int = 4) -> List[int]:
+    """
+    Indices (in reading order) of the ``max_sents`` sentences with the
+    highest query overlap, scored as ``overlap + 0.5 * overlap / words``.
+    """
+    n = len(features.bounds)
+    if n == 0:
+        return []
+    words = np.bincount(features.tok_sent, minlength=n)
+    hit = np.isin(features.tok_ids, query_ids, assume_unique=False)
+    overlap = np.bincount(features.tok_sent[hit], minlength=n).astype(np.float64)
+    score = overlap + 0.5 * overlap / np.maximum(words, 1)
+    # Highest score first; ties go to the later sentence
+    order = np.lexsort((np.arange(n), score))[::-1]
+    return sorted(order[:max_sents].tolist())
+
+def term_counts(text: str) -> Dict[int, int]:
+    """Hashed lowercased word -> occurrences in ``text`` (BM25 term frequencies)"""
+    counts: Dict[int, int] = {}
+    for w in _WORD_RE.findall(text.lower()):
+        t = zlib.crc32(w.encode("utf-8"))
+        counts[t] = counts.get(t, 0) + 1
+    return counts
@@ -0,0 +1,53 @@
+# backend/conftest.py
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from app import search_index
+
+_DIM = 32
+
+class HashingEncoder:
+    """Offline stand-in for SentenceTransformer: bag of hashed words, L2-normalized"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return _DIM
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, normalize_embeddings=True):
+        out = np.zeros((len(texts), _DIM), dtype="float32")
+        for i, text in enumerate(texts):
+            for w in re.findall(r"\w+", text.lower()):
+                out[i, zlib.crc32(w.encode("utf-8")) % _DIM] += 1.0
+        return out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-12)
+
+def parse_text_pdf(path):
+    """Reads test "PDFs" as plain text; a file starting with BROKEN fails to parse"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith("BROKEN"):
+        raise ValueError("unreadable PDF")
+    return {"pages": 1, "sections": search_index.DocIndex._split_into_sections(text)}
+
+@pytest.fixture
+def make_doc_index(tmp_path, monkeypatch):
+    """Factory for DocIndex over tmp_path/uploads, with the offline encoder and text parser"""
+    monkeypatch.setattr(search_index, "SentenceTransformer", HashingEncoder)
+    monkeypatch.setattr(search_index, "_parse_pdf", parse_text_pdf)
+    uploads = tmp_path / "uploads"
+    uploads.mkdir(exist_ok=True)
+
+    def make():
+        return search_index.DocIndex(str(uploads), workers=1, index_dir=str(tmp_path / "doc_index"))
+
+    make.uploads = uploads
+    return make
+
+def write_pdf(directory, name, text):
+    path = directory / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
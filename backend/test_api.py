@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Tests for the FastAPI routes, without a running server or network access
+"""
+import os
+import json
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+from fastapi.testclient import TestClient
+
+from app import main
+from app.response_cache import ResponseCache
+from conftest import write_pdf
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir(exist_ok=True)
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(uploads))
+    return TestClient(main.app)
+
+def test_rejected_upload_leaves_no_files_behind(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_MB", 64 / (1024 * 1024))  # 64 bytes
+    monkeypatch.setattr(main, "get_jobs", lambda: pytest.fail("no job should be submitted"))
+    r = client.post("/upload", files=[("files", ("small.pdf", b"%PDF small", "application/pdf")),
+                                      ("files", ("big.pdf", b"%PDF " + b"x" * 100, "application/pdf"))])
+    assert r.status_code == 413
+    assert os.listdir(main.UPLOAD_DIR) == []
+
+def test_non_pdf_in_batch_is_rejected_before_anything_is_stored(client):
+    r = client.post("/upload", files=[("files", ("a.pdf", b"%PDF a", "application/pdf")),
+                                      ("files", ("notes.txt", b"text", "text/plain"))])
+    assert r.status_code == 400
+    assert os.listdir(main.UPLOAD_DIR) == []
+
+def _events(body):
+    """(event, data) pairs of a text/event-stream body"""
+    out = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+def _stream(*chunks, error=None):
+    async def gen(*args, **kwargs):
+        for chunk in chunks:
+            yield chunk
+        if error:
+            raise error
+    return gen
+
+@pytest.fixture
+def indexed(client, make_doc_index, tmp_path, monkeypatch):
+    """The app over a DocIndex of two small PDFs, with a fresh response cache"""
+    write_pdf(make_doc_index.uploads, "alpha.pdf", "Transfer Learning\nPretrained models adapt to new tasks.")
+    write_pdf(make_doc_index.uploads, "beta.pdf", "Graph Networks\nMessage passing aggregates node features.")
+    index = make_doc_index()
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    monkeypatch.setattr(main, "get_index", lambda: index)
+    monkeypatch.setattr(main, "get_response_cache", lambda: cache)
+    return client
+
+def test_chat_stream_sends_tokens_then_the_grounded_answer(indexed, monkeypatch):
+    prompts = {}
+
+    async def fake_stream(system_prompt, user_prompt):
+        prompts["user"] = user_prompt
+        for chunk in ("Message ", "passing [1]."):
+            yield chunk
+
+    monkeypatch.setattr(main, "gemini_stream_async", fake_stream)
+    r = indexed.post("/chat/ask/stream", json={"question": "how are node features aggregated?", "pdf_name": "beta.pdf"})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert events[:2] == [("token", {"text": "Message "}), ("token", {"text": "passing [1]."})]
+    assert events[-1][0] == "done" and events[-1][1]["answer"] == "Message passing [1]."
+    assert [s["heading"] for s in events[-1][1]["sources"]] == ["Graph Networks"]
+    assert "Message passing aggregates" in prompts["user"] and "Pretrained" not in prompts["user"]
+
+def test_chat_stream_reports_a_failed_generation(indexed, monkeypatch):
+    monkeypatch.setattr(main, "gemini_stream_async", _stream("partial", error=RuntimeError("quota exceeded")))
+    events = _events(indexed.post("/chat/ask/stream", json={"question": "q", "pdf_name": "beta.pdf"}).text)
+    assert events == [("token", {"text": "partial"}),
+                      ("error", {"detail": "Error processing question: quota exceeded"})]
+
+def test_selection_stream_is_served_from_the_cache_the_second_time(indexed, monkeypatch):
+    calls = {"insights": 0}
+
+    async def fake_insights(selection, snippets):
+        calls["insights"] += 1
+        yield "Both "
+        yield "adapt."
+
+    async def fake_script(selection, insights):
+        return "Host: " + insights
+
+    monkeypatch.setattr(main, "stream_insights_async", fake_insights)
+    monkeypatch.setattr(main, "create_podcast_script_async", fake_script)
+    req = {"current_pdf": "alpha.pdf", "selected_text": "message passing on graphs", "max_sections": 2}
+
+    first = _events(indexed.post("/analyze_selection/stream", json=req).text)
+    assert first[0][0] == "sections" and [s["pdf"] for s in first[0][1]["related_sections"]] == ["beta.pdf"]
+    assert [e for e, _ in first] == ["sections", "token", "token", "done"]
+    assert first[-1][1]["insights_text"] == "Both adapt." and first[-1][1]["podcast_script"] == "Host: Both adapt."
+
+    second = _events(indexed.post("/analyze_selection/stream", json=req).text)
+    assert second[1] == ("token", {"text": "Both adapt."}) and second[-1][1] == first[-1][1]
+    assert calls["insights"] == 1
+
+@pytest.fixture
+def deferred(indexed, monkeypatch):
+    """Posts a selection with defer_podcast; the app runs on one event loop, as under uvicorn"""
+    async def fake_insights(selection, snippets):
+        return "Both adapt."
+
+    monkeypatch.setattr(main, "generate_insights_async", fake_insights)
+    monkeypatch.setattr(main, "get_jobs", lambda: None)
+    req = {"current_pdf": "alpha.pdf", "selected_text": "message passing on graphs", "defer_podcast": True}
+
+    def post(fake_script):
+        monkeypatch.setattr(main, "create_podcast_script_async", fake_script)
+        r = indexed.post("/analyze_selection", json=req)
+        assert r.status_code == 200 and r.json()["podcast_script"] is None
+        return r.json()["podcast_script_url"]
+
+    with indexed:
+        yield post
+
+def test_deferred_podcast_script_outlives_the_worker_that_made_it(deferred, indexed):
+    async def fake_script(selection, insights):
+        return "Host: " + insights
+
+    url = deferred(fake_script)
+    assert indexed.get(url, params={"wait": 5}).json()["status"] == "done"
+    main._podcast_tasks.clear()  # a restarted or different worker knows only the stored result
+    assert indexed.get(url).json() == {"id": url.rsplit("/", 1)[1], "status": "done",
+                                       "podcast_script": "Host: Both adapt."}
+    assert indexed.get("/analyze_selection/podcast_script/unknown").status_code == 404
+
+def test_failed_podcast_script_is_reported(deferred, indexed):
+    async def fake_script(selection, insights):
+        raise RuntimeError("quota exceeded")
+
+    body = indexed.get(deferred(fake_script), params={"wait": 5}).json()
+    assert body["status"] == "failed" and body["podcast_script"] is None
+    assert body["detail"] == "Error generating podcast script: quota exceeded"
+
+def test_podcast_script_survives_a_response_cache_failure(deferred, indexed, monkeypatch):
+    async def fake_script(selection, insights):
+        return "Host: " + insights
+
+    def broken_put(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(main.get_response_cache(), "put", broken_put)
+    body = indexed.get(deferred(fake_script), params={"wait": 5}).json()
+    assert (body["status"], body["podcast_script"]) == ("done", "Host: Both adapt.")
+
+def test_pending_script_of_a_dead_worker_is_reported_failed(indexed, monkeypatch):
+    main.get_response_cache().put_deferred("orphan", "pending")
+    assert indexed.get("/analyze_selection/podcast_script/orphan").json()["status"] == "pending"
+    monkeypatch.setattr(main, "_PODCAST_PENDING_TIMEOUT", -1)
+    body = indexed.get("/analyze_selection/podcast_script/orphan").json()
+    assert body["status"] == "failed" and body["detail"] == "Podcast script generation was interrupted"
+
+def test_batch_search_returns_snippets_per_query(indexed):
+    r = indexed.post("/search/batch", json={"queries": ["message passing graphs", "pretrained models"], "top_k": 1})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [res["query"] for res in results] == ["message passing graphs", "pretrained models"]
+    assert [[s["pdf"] for s in res["sections"]] for res in results] == [["beta.pdf"], ["alpha.pdf"]]
+    assert indexed.post("/search/batch", json={"queries": []}).status_code == 400
+    assert indexed.post("/search/batch", json={"queries": ["x"], "mode": "fuzzy"}).status_code == 400
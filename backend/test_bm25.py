@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 keyword index and reciprocal-rank fusion
+"""
+import math
+
+import numpy as np
+import pytest
+
+from app import bm25
+from app.bm25 import BM25Index, rrf_fuse
+
+DOCS = {0: "apple banana", 1: "apple apple cherry", 2: "cherry"}
+
+def _index(docs=DOCS):
+    index = BM25Index()
+    for key, text in docs.items():
+        index.add(key, text)
+    return index
+
+def _bm25(tf, df, n_docs, doc_len, avgdl):
+    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    return idf * tf * (bm25.BM25_K1 + 1) / (tf + bm25.BM25_K1 * (1 - bm25.BM25_B + bm25.BM25_B * doc_len / avgdl))
+
+def _approx(hits):
+    return [(key, pytest.approx(score)) for key, score in hits]
+
+def test_scores_match_the_bm25_formula():
+    index = _index()
+    avgdl = 6 / 3
+    assert index.search("banana", 5) == _approx([(0, _bm25(1, 1, 3, 2, avgdl))])
+    hits = dict(index.search("apple cherry", 5))
+    assert hits[1] == pytest.approx(_bm25(2, 2, 3, 3, avgdl) + _bm25(1, 2, 3, 3, avgdl))
+    assert hits[2] == pytest.approx(_bm25(1, 2, 3, 1, avgdl))
+    assert [key for key, _ in index.search("apple cherry", 5)][0] == 1
+    assert index.search("durian", 5) == []
+    # A filter restricts the matches, not the corpus statistics
+    assert index.search("apple", 5, allowed=np.array([False, True, False])) == _approx([(1, _bm25(2, 2, 3, 3, avgdl))])
+
+def test_merged_segment_answers_like_the_delta(tmp_path):
+    index = _index()
+    before = index.search("apple cherry", 5)
+    index.compact()
+    assert index._delta == {} and len(index._keys) == 5  # (term, document) postings now in the CSR segment
+    assert index.search("apple cherry", 5) == _approx(before)
+
+    # Removal tombstones until the next merge; a new delta is searched together with the segment
+    index.remove([1])
+    index.add(3, "banana cherry")
+    expected = _index({0: DOCS[0], 2: DOCS[2], 3: "banana cherry"}).search("banana cherry", 5)
+    assert index.search("banana cherry", 5) == _approx(expected)
+    index.compact()
+    assert 1 not in index._keys.tolist() and index.search("banana cherry", 5) == _approx(expected)
+
+    index.save(str(tmp_path / "bm25.npz"))
+    assert BM25Index.load(str(tmp_path / "bm25.npz")).search("banana cherry", 5) == _approx(expected)
+
+def test_reused_key_does_not_keep_old_postings():
+    index = _index()
+    index.compact()
+    index.remove([0])
+    index.add(0, "durian")
+    assert index.search("banana", 5) == []
+    assert [key for key, _ in index.search("durian", 5)] == [0]
+
+def test_rrf_rewards_agreement_between_rankings():
+    dense = [(7, 0.9), (3, 0.8), (5, 0.1)]
+    sparse = [(3, 12.0), (9, 4.0)]
+    fused = rrf_fuse([dense, sparse], k=60)
+    assert [key for key, _ in fused] == [3, 7, 9, 5]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-budgeted chat context
+"""
+from app.chat_context import build_context, estimate_tokens
+
+def _section(heading, text, page=1):
+    return {"heading": heading, "page_start": page, "page_end": page, "text": text}
+
+def test_sections_are_numbered_in_rank_order_with_sources():
+    ctx = build_context([_section("Intro", "Short intro.", 1), _section("Method", "We train a model.", 2)],
+                        budget_tokens=1000)
+    assert ctx["context"].startswith("[1] Intro (pages 1-1)\nShort intro.")
+    assert "[2] Method (pages 2-2)\nWe train a model." in ctx["context"]
+    assert [s["heading"] for s in ctx["sources"]] == ["Intro", "Method"]
+
+def test_budget_truncates_at_a_sentence_and_drops_the_rest():
+    long_text = " ".join(f"Sentence number {i} talks about results." for i in range(200))
+    ctx = build_context([_section("Results", long_text), _section("Other", "Never reached.")], budget_tokens=300)
+    assert ctx["tokens"] <= 300
+    assert ctx["context"].endswith("results.")
+    assert [s["heading"] for s in ctx["sources"]] == ["Results"]
+
+def test_no_partial_section_below_the_minimum():
+    first = "x " * 560  # ~280 tokens, fits whole
+    ctx = build_context([_section("A", first), _section("B", "More text. " * 100)], budget_tokens=320)
+    assert [s["heading"] for s in ctx["sources"]] == ["A"]
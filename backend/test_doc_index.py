@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tests for DocIndex ingestion failures, restarts and search
+"""
+import os
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from app import ann_index, search_index
+from app.content_store import sha256_file
+from app.jobs import JobQueue
+from conftest import write_pdf
+
+ALPHA = "Transfer Learning\nPretrained models are adapted to new tasks with little labelled data."
+BETA = "Graph Networks\nMessage passing aggregates features from neighbouring nodes in a graph."
+PARSE_PDF = search_index._parse_pdf  # the real parser; make_doc_index swaps in a text reader
+
+def test_unparseable_pdf_is_retried_on_next_start(make_doc_index):
+    index = make_doc_index()
+    good = write_pdf(make_doc_index.uploads, "good.pdf", ALPHA)
+    bad = write_pdf(make_doc_index.uploads, "bad.pdf", "BROKEN")
+    statuses = {}
+    index.add_pdfs([good, bad], progress=lambda name, status, detail=None: statuses.update({name: status}))
+    assert statuses == {"good.pdf": "indexed", "bad.pdf": "failed"}
+    assert "bad.pdf" not in index.documents and "bad.pdf" not in index.files
+
+    # Fixed on disk (e.g. a transient parser failure): the next start indexes it
+    write_pdf(make_doc_index.uploads, "bad.pdf", BETA)
+    index = make_doc_index()
+    assert set(index.documents) == {"good.pdf", "bad.pdf"}
+    assert index.search_sections("message passing graph", top_k=1)[0].pdf_name == "bad.pdf"
+
+def test_job_retry_after_embedding_failure_indexes_every_file(make_doc_index, tmp_path, monkeypatch):
+    index = make_doc_index()
+    paths = [write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+             write_pdf(make_doc_index.uploads, "beta.pdf", BETA)]
+    embed = index._embed
+    calls = {"n": 0}
+
+    def flaky_embed(texts):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("embedding backend unavailable")
+        return embed(texts)
+
+    monkeypatch.setattr(index, "_embed", flaky_embed)
+    jobs = JobQueue(str(tmp_path / "jobs.db"), process=lambda p, progress: index.add_pdfs(p, progress=progress),
+                    retry_delay=0)
+    jobs.start()
+    job_id = jobs.submit(paths)
+    deadline = time.time() + 10
+    while jobs.get(job_id)["status"] not in ("done", "failed") and time.time() < deadline:
+        time.sleep(0.05)
+    jobs.stop()
+
+    job = jobs.get(job_id)
+    assert job["status"] == "done" and job["attempts"] == 2
+    assert {f["name"]: f["status"] for f in job["files"]} == {"alpha.pdf": "indexed", "beta.pdf": "indexed"}
+    assert {s.pdf_name for s in index.sections} == {"alpha.pdf", "beta.pdf"}
+    assert index.search_sections("pretrained models new tasks", top_k=1)[0].pdf_name == "alpha.pdf"
+
+def test_reregistering_a_file_is_not_a_duplicate_of_itself(make_doc_index):
+    index = make_doc_index()
+    path = write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA)
+    index.store.register("alpha.pdf", sha256_file(path))  # left behind by an interrupted batch
+    assert index.add_pdfs([path]) == {}
+    assert "alpha.pdf" in index.documents and len(index.sections) == 1
+
+GAMMA = "Query Planning\nA cost model chooses join orders for relational queries."
+
+def test_extraction_error_marks_the_file_failed(make_doc_index, monkeypatch):
+    def extract_text(path):
+        if path.endswith("corrupt.pdf"):
+            raise ValueError("No /Root object! - Is this really a PDF?")
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    monkeypatch.setattr(search_index, "_parse_pdf", PARSE_PDF)
+    monkeypatch.setattr(search_index, "extract_text", extract_text)
+    index = make_doc_index()
+    statuses = {}
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "good.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "corrupt.pdf", BETA)],
+                   progress=lambda name, status, detail=None: statuses.update({name: status}))
+    assert statuses == {"good.pdf": "indexed", "corrupt.pdf": "failed"}
+    assert set(index.documents) == {"good.pdf"} and "corrupt.pdf" not in index.files
+
+def test_upload_appends_rows_and_restart_replays_them_onto_the_checkpoint(make_doc_index, monkeypatch):
+    monkeypatch.setattr(search_index, "_CHECKPOINT_MIN_ROWS", 0)
+    monkeypatch.setattr(search_index, "DOC_INDEX_CHECKPOINT_FRACTION", 1.0)
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA)])
+    assert index._checkpoint_rows == 2
+    checkpoint = os.stat(index.faiss_path).st_mtime_ns
+
+    # A small upload only appends its rows; the FAISS checkpoint is left alone
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "gamma.pdf", GAMMA)])
+    assert os.stat(index.faiss_path).st_mtime_ns == checkpoint and index._checkpoint_rows == 2
+
+    restarted = make_doc_index()
+    assert [s.pdf_name for s in restarted.sections] == ["alpha.pdf", "beta.pdf", "gamma.pdf"]
+    assert restarted.faiss_index.ntotal == 3 and restarted.bm25.stats()["documents"] == 3
+    assert restarted.sections[2].sent_vecs is not None
+    assert restarted.search_sections("join orders cost model", top_k=1)[0].pdf_name == "gamma.pdf"
+    assert restarted.search_sections("join orders", top_k=1, mode="bm25")[0].pdf_name == "gamma.pdf"
+
+def test_removed_files_are_dropped_from_the_store(make_doc_index):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA),
+                    write_pdf(make_doc_index.uploads, "copy.pdf", BETA)])
+    os.remove(make_doc_index.uploads / "alpha.pdf")
+    os.remove(make_doc_index.uploads / "beta.pdf")  # copy.pdf inherits its sections
+
+    index = make_doc_index()
+    assert set(index.documents) == {"copy.pdf"} and [s.pdf_name for s in index.sections] == ["copy.pdf"]
+    restarted = make_doc_index()
+    assert [s.pdf_name for s in restarted.sections] == ["copy.pdf"]
+    assert restarted.search_sections("message passing graph", top_k=5)[0].pdf_name == "copy.pdf"
+
+def _notes(topic, n):
+    return "\n".join(f"{i + 1} {topic} Notes\nThe {topic.lower()} chapter {i} covers message passing on graphs."
+                     for i in range(n))
+
+def test_filtered_search_returns_top_k_when_one_document_dominates(make_doc_index, monkeypatch):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "current.pdf", _notes("Graph", 30)),
+                    write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA),
+                    write_pdf(make_doc_index.uploads, "gamma.pdf", GAMMA)])
+    query = "graph chapter message passing"
+    assert {s.pdf_name for s in index.search_sections(query, top_k=3)} == {"current.pdf"}
+
+    for exact_max in (4096, 0):  # exact scan of the allowed rows, then FAISS's own ID filter
+        monkeypatch.setattr(search_index.ann_index, "ANN_EXACT_FILTER_MAX", exact_max)
+        for mode in ("dense", "hybrid"):
+            hits = index.search_sections(query, top_k=3, exclude_pdf="current.pdf", mode=mode)
+            assert sorted(s.pdf_name for s in hits) == ["alpha.pdf", "beta.pdf", "gamma.pdf"]
+        hits = index.search_sections(query, top_k=5, pdfs=["current.pdf", "beta.pdf"])
+        assert len(hits) == 5 and hits[0].pdf_name in {"current.pdf", "beta.pdf"}
+        assert {s.pdf_name for s in hits} <= {"current.pdf", "beta.pdf"}
+
+def test_starved_approximate_filter_is_completed_exactly(monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 16)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    graph = ann_index.build_index(vectors, kind="hnsw")
+    monkeypatch.setattr(ann_index, "HNSW_EF_SEARCH", 1)
+    monkeypatch.setattr(ann_index, "ANN_EXACT_FILTER_MAX", 0)
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[rng.choice(len(vectors), 8, replace=False)] = True
+    queries = -vectors[:20]  # far from most of the graph, so the filtered walk runs dry
+
+    exact_calls = []
+    exact = ann_index._exact_topk
+    monkeypatch.setattr(ann_index, "_exact_topk", lambda *a, **k: exact_calls.append(1) or exact(*a, **k))
+    D, I = ann_index.search_filtered(graph, queries, 5, allowed, vectors)
+    assert exact_calls  # some queries had to be widened to the exact scan
+    assert (I != -1).all() and allowed[I].all()
+    expected = np.sort(queries @ vectors[allowed].T, axis=1)[:, ::-1][:, :5]
+    assert np.allclose(D, expected, atol=1e-5)
+
+def test_hybrid_search_finds_exact_terms_the_embedding_blurs(make_doc_index):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA),
+                    write_pdf(make_doc_index.uploads, "acronym.pdf",
+                              "Training Setup\nWe fine tune with RLHF on graphs of message passing nodes.")])
+    assert [s.pdf_name for s in index.search_sections("RLHF", top_k=3, mode="bm25")] == ["acronym.pdf"]
+    assert index.search_sections("RLHF", top_k=1, mode="hybrid")[0].pdf_name == "acronym.pdf"
+    hybrid = index.search_sections("message passing RLHF", top_k=3, mode="hybrid")
+    assert [s.pdf_name for s in hybrid][:1] == ["acronym.pdf"] and len(hybrid) == 3
+
+def test_upload_appends_to_the_live_index_without_reembedding(make_doc_index, monkeypatch):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA)])
+    live = index.faiss_index
+    embedded = []
+    embed = index._embed
+    monkeypatch.setattr(index, "_embed", lambda texts: embedded.extend(texts) or embed(texts))
+    monkeypatch.setattr(index, "_build_faiss", lambda vectors: pytest.fail("an upload must not rebuild the index"))
+
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "gamma.pdf", GAMMA)])
+    assert index.faiss_index is live and live.ntotal == 3
+    assert not any("Pretrained" in t or "Message passing" in t for t in embedded)
+    assert index.search_sections("join orders cost model", top_k=1)[0].pdf_name == "gamma.pdf"
+
+def test_searches_are_served_while_a_batch_is_embedded(make_doc_index, monkeypatch):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "beta.pdf", BETA)])
+    embedding, release = threading.Event(), threading.Event()
+    embed = index._embed
+
+    def slow_embed(texts):
+        if any("join orders" in t for t in texts):
+            embedding.set()
+            release.wait(10)
+        return embed(texts)
+
+    monkeypatch.setattr(index, "_embed", slow_embed)
+    upload = threading.Thread(target=index.add_pdfs, args=([write_pdf(make_doc_index.uploads, "gamma.pdf", GAMMA)],))
+    upload.start()
+    try:
+        assert embedding.wait(10)
+        t0 = time.time()
+        assert [s.pdf_name for s in index.search_sections("message passing graph", top_k=2)] == ["beta.pdf"]
+        assert time.time() - t0 < 2  # not queued behind the upload
+        assert "gamma.pdf" not in index.documents  # published only once embedded
+    finally:
+        release.set()
+        upload.join(10)
+    assert index.search_sections("join orders cost model", top_k=1)[0].pdf_name == "gamma.pdf"
+
+def test_search_many_matches_single_searches(make_doc_index):
+    index = make_doc_index()
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "alpha.pdf", ALPHA),
+                    write_pdf(make_doc_index.uploads, "beta.pdf", BETA),
+                    write_pdf(make_doc_index.uploads, "gamma.pdf", GAMMA)])
+    queries = ["message passing graph", "join orders", "", "pretrained models"]
+    batch = index.search_many(queries, top_k=2, exclude_pdf="beta.pdf")
+    assert batch[2] == []
+    for query, hits in zip(queries, batch):
+        if query:
+            assert hits == index.search_sections(query, top_k=2, exclude_pdf="beta.pdf")
+
+def test_snippets_pick_the_sentences_closest_to_the_query(make_doc_index, monkeypatch):
+    index = make_doc_index()
+    text = ("Survey Of Methods\nEarly systems used rules. Storage was expensive. Graph networks pass messages "
+            "between nodes. Later work used statistics. Message passing aggregates node features. "
+            "Hardware improved steadily.")
+    index.add_pdfs([write_pdf(make_doc_index.uploads, "survey.pdf", text)])
+    query = "message passing graph networks nodes"
+    hits = index.search_sections(query, top_k=1)
+    monkeypatch.setattr(index, "_embed", lambda texts: pytest.fail("snippets must reuse cached vectors"))
+    snippet = index.make_snippets(hits, query=query)[0]["snippet"]
+    assert "Graph networks pass messages between nodes." in snippet
+    assert "Message passing aggregates node features." in snippet
+    assert "Storage was expensive." not in snippet and "Hardware improved steadily." not in snippet
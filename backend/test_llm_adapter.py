@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared LLM provider pools
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+from app import llm_adapter
+from app.llm_adapter import ProviderPool
+
+def test_full_pool_times_out_waiting_callers():
+    pool = ProviderPool("test", max_concurrency=1, timeout=0.1)
+    with pool.slot():
+        assert pool.stats()["in_flight"] == 1
+        with pytest.raises(TimeoutError):
+            with pool.slot():
+                pass
+    with pool.slot():  # the slot was released
+        pass
+    stats = pool.stats()
+    assert (stats["requests"], stats["timeouts"], stats["in_flight"]) == (2, 1, 0)
+
+def test_cancelled_async_waiter_hands_its_slot_back():
+    pool = ProviderPool("test", max_concurrency=1, timeout=5)
+
+    async def scenario():
+        held = pool.slot()
+        held.__enter__()
+
+        async def waiter():
+            async with pool.aslot():
+                pytest.fail("a cancelled waiter must not run")
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        held.__exit__(None, None, None)  # the waiting thread now gets the slot and must release it
+        await asyncio.sleep(0.1)
+        async with pool.aslot():  # would wait out the 5 s pool timeout if the slot leaked
+            pass
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=3))
+    assert pool.stats()["in_flight"] == 0 and pool.stats()["requests"] == 2
+
+def test_async_waiters_leave_the_default_executor_free():
+    pool = ProviderPool("test", max_concurrency=1, timeout=5)
+
+    async def scenario():
+        held = pool.slot()
+        held.__enter__()
+        done = []
+
+        async def waiter(i):
+            async with pool.aslot():
+                done.append(i)
+
+        tasks = [asyncio.create_task(waiter(i)) for i in range(64)]  # more than the default executor's threads
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), timeout=1) == "free"
+        held.__exit__(None, None, None)
+        await asyncio.gather(*tasks)
+        return done
+
+    assert len(asyncio.run(asyncio.wait_for(scenario(), timeout=5))) == 64
+    assert pool.stats()["in_flight"] == 0 and pool.stats()["queued"] == 64
+
+def test_stream_skips_chunks_without_text(monkeypatch):
+    class Chunk:
+        def __init__(self, text):
+            self._text = text
+
+        @property
+        def text(self):
+            if self._text is None:
+                raise ValueError("The response was blocked; it has no text parts")
+            return self._text
+
+    class Model:
+        async def generate_content_async(self, prompt, **kwargs):
+            async def chunks():
+                for text in ("Hello ", None, "world"):
+                    yield Chunk(text)
+            return chunks()
+
+    monkeypatch.setattr(llm_adapter, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_adapter, "_configured", True)
+    monkeypatch.setattr(llm_adapter, "_model", lambda system_prompt: Model())
+
+    async def collect():
+        return [c async for c in llm_adapter.gemini_stream_async("system", "user")]
+
+    assert asyncio.run(collect()) == ["Hello ", "world"]
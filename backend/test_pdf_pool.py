@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-pool PDF extraction timeouts
+"""
+import time
+
+from app import pdf_pool
+from app.pdf_pool import ExtractionTimeout, iter_extracted
+
+def _sleep(path):
+    time.sleep(float(path))
+    return path
+
+def _ignore_alarm(path):
+    # Stands in for a parser stuck in C code, where the worker's SIGALRM never lands
+    deadline = time.time() + float(path)
+    while time.time() < deadline:
+        try:
+            time.sleep(0.05)
+        except ExtractionTimeout:
+            pass
+    return path
+
+def test_slow_consumer_does_not_time_out_queued_files(monkeypatch):
+    """Time spent embedding between yields must not count against the files' parse timeout"""
+    monkeypatch.setattr(pdf_pool, "_TIMEOUT_GRACE", 0.5)
+    results = []
+    for path, result, error in iter_extracted(["0.5"] * 4, _sleep, workers=2, timeout=1.0):
+        results.append((result, error))
+        if len(results) == 1:
+            time.sleep(3)
+    assert results == [("0.5", None)] * 4
+
+def test_stuck_file_times_out_alone(monkeypatch):
+    monkeypatch.setattr(pdf_pool, "_TIMEOUT_GRACE", 0.5)
+    out = {path: error for path, _, error in iter_extracted(["0.2", "10"], _ignore_alarm, workers=2, timeout=0.5)}
+    assert out["0.2"] is None
+    assert out["10"].startswith("ExtractionTimeout")
+
+def test_single_worker_keeps_the_timeout():
+    out = {path: error for path, _, error in iter_extracted(["10", "0.2"], _sleep, workers=1, timeout=0.5)}
+    assert out["10"].startswith("ExtractionTimeout") and out["0.2"] is None
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the cross-encoder reranker's loading and latency budget
+"""
+import threading
+
+import pytest
+
+sentence_transformers = pytest.importorskip("sentence_transformers")
+from app.rerank import CrossEncoderReranker
+
+CANDIDATES = [("a", "pasta sauce"), ("b", "graph message passing"), ("c", "graph nodes")]
+
+class OverlapEncoder:
+    """Scores a pair by the words query and text share; loading waits for ``ready``"""
+    ready = threading.Event()
+    loaded = threading.Event()
+
+    def __init__(self, *args, **kwargs):
+        OverlapEncoder.ready.wait(5)
+        OverlapEncoder.loaded.set()
+
+    def predict(self, pairs, **kwargs):
+        return [len(set(q.split()) & set(text.split())) for q, text in pairs]
+
+@pytest.fixture
+def reranker(monkeypatch):
+    OverlapEncoder.ready.clear()
+    OverlapEncoder.loaded.clear()
+    monkeypatch.setattr(sentence_transformers, "CrossEncoder", OverlapEncoder, raising=False)
+    yield CrossEncoderReranker()
+    OverlapEncoder.ready.set()
+
+def test_requests_keep_search_order_until_the_model_is_loaded(reranker):
+    assert reranker.rerank("graph message passing", CANDIDATES) == [0, 1, 2]  # returns while the model loads
+    assert reranker.stats()["loaded"] is False and reranker.stats()["skipped_over_budget"] == 3
+
+    OverlapEncoder.ready.set()
+    assert OverlapEncoder.loaded.wait(5)
+    reranker._loader.join(5)
+    assert reranker.rerank("graph message passing", CANDIDATES) == [1, 2, 0]
+    assert reranker.stats()["scored"] == 3
+
+def test_scores_are_cached_and_an_exhausted_budget_keeps_search_order(reranker):
+    OverlapEncoder.ready.set()
+    reranker.preload()
+    reranker._loader.join(5)
+    assert reranker.rerank("graph nodes", CANDIDATES) == [2, 1, 0]
+
+    reranker._pair_ms = 1e6  # no pair fits in the budget any more
+    assert reranker.rerank("graph nodes", CANDIDATES) == [2, 1, 0]  # all cached
+    assert reranker.rerank("pasta", CANDIDATES) == [0, 1, 2]
+    stats = reranker.stats()
+    assert (stats["cache_hits"], stats["skipped_over_budget"]) == (3, 3)
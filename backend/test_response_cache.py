@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite response cache
+"""
+from app import response_cache
+from app.response_cache import ResponseCache, make_key
+
+def test_hit_after_put_and_miss_for_other_version(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    key = make_key("query", ["a:1:00"], "v1")
+    assert cache.get(key, "idx1") is None
+    cache.put(key, "idx1", {"insights": "x"})
+    assert cache.get(key, "idx1") == {"insights": "x"}
+    assert cache.get(key, "idx2") is None  # the library changed since
+    assert cache.get(key, "idx1") is None  # and the stale entry is gone
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_new_version_drops_older_entries_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path)
+    cache.put("a", "idx1", {"n": 1})
+    cache.put("b", "idx2", {"n": 2})
+    assert cache.stats()["entries"] == 1
+    assert ResponseCache(path).get("b", "idx2") == {"n": 2}
+
+def test_expired_entries_miss(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.db"), ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache.put("a", "idx", {"n": 1})
+    now[0] += 59
+    assert cache.get("a", "idx") == {"n": 1}
+    now[0] += 2
+    assert cache.get("a", "idx") is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.put(key, "idx", {"key": key})
+    now[0] += 1
+    cache.get("a", "idx")  # "b" is now the least recently used
+    now[0] += 1
+    cache.put("c", "idx", {"key": "c"})
+    assert cache.get("b", "idx") is None
+    assert cache.get("a", "idx") and cache.get("c", "idx")
+
+def test_deferred_results_are_shared_and_expire(tmp_path, monkeypatch):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache.put_deferred("s1", "pending")
+    cache.put_deferred("s1", "done", {"podcast_script": "Host: hi"})
+    assert ResponseCache(path).get_deferred("s1") == {"status": "done", "payload": {"podcast_script": "Host: hi"},
+                                                      "created_at": 1000.0}
+    assert cache.get_deferred("s2") is None
+    now[0] += 61
+    assert cache.get_deferred("s1") is None
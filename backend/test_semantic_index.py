@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for SemanticIndex ingestion, keyword search, restarts and HNSW deletes (tombstones + compaction)
+"""
+import pytest
+
+from app import ann_index, semantic
+from conftest import HashingEncoder
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa"]
+
+def _sections(doc, n):
+    return [{"heading": f"{doc} {i}", "content": f"{doc} {WORDS[i % len(WORDS)]} {WORDS[(i * 3) % len(WORDS)]} words"}
+            for i in range(n)]
+
+@pytest.fixture
+def make_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic, "SentenceTransformer", HashingEncoder)
+    monkeypatch.setattr(ann_index, "ANN_HNSW_MIN_VECTORS", 1)
+    return lambda: semantic.SemanticIndex(index_dir=str(tmp_path / "index"))
+
+def _docs_in(results):
+    return {r["doc_name"] for r in results}
+
+def test_delete_tombstones_hnsw_instead_of_rebuilding(make_index, monkeypatch):
+    index = make_index()
+    index._index_sections([("d1", "one.pdf", "h1", _sections("one", 20)),
+                           ("d2", "two.pdf", "h2", _sections("two", 20))])
+    index._save(force=True)
+    assert ann_index.index_type(index.index) == "hnsw"
+    graph = index.index
+    monkeypatch.setattr(ann_index, "ANN_COMPACT_FRACTION", 0.9)
+
+    assert index.delete_document("two.pdf") == 20
+    assert index.index is graph and len(index.tombstones) == 20
+    assert _docs_in(index.search("two alpha words", top_k=10)) == {"one.pdf"}
+
+    # New sections never reuse a tombstoned ID
+    index._index_sections([("d3", "three.pdf", "h3", _sections("three", 5))])
+    assert not any(m.vec_id in index.tombstones for m in index.meta)
+    assert "three.pdf" in _docs_in(index.search("three alpha words", top_k=10))
+
+    # A restart re-derives the tombstones from the snapshot without a repair
+    restarted = make_index()
+    assert len(restarted.tombstones) == 20
+    assert _docs_in(restarted.search("two alpha words", top_k=10)) <= {"one.pdf", "three.pdf"}
+
+def test_compaction_past_threshold(make_index, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_COMPACT_FRACTION", 0.3)
+    index = make_index()
+    index._index_sections([(f"d{i}", f"{i}.pdf", f"h{i}", _sections(f"doc{i}", 10)) for i in range(4)])
+    index._save(force=True)
+
+    index.delete_document("0.pdf")  # 10 of 40: under the threshold
+    assert len(index.tombstones) == 10 and index.index.ntotal == 40
+    index.delete_document("1.pdf")  # 20 of 40: compacted
+    assert len(index.tombstones) == 0 and index.index.ntotal == 20
+    assert ann_index.index_type(index.index) == "hnsw"
+    assert _docs_in(index.search("doc1 alpha words", top_k=20)) == {"2.pdf", "3.pdf"}
+    assert make_index().index.ntotal == 20
+
+def test_unreadable_snapshot_pointer_keeps_the_corpus(make_index):
+    index = make_index()
+    index._index_sections([("d1", "one.pdf", "h1", _sections("one", 20))])
+    index._save(force=True)
+    with open(index.snapshots.current_path, "w") as f:
+        f.write("{garbage")
+
+    restarted = make_index()
+    assert len(restarted.meta) == 20 and restarted.index.ntotal == 20
+    assert _docs_in(restarted.search("one alpha words", top_k=5)) == {"one.pdf"}
+
+def test_failed_embedding_does_not_record_the_content_hash(make_index, monkeypatch):
+    index = make_index()
+    encode = index._encode
+
+    def broken(texts):
+        raise RuntimeError("embedding backend unavailable")
+
+    monkeypatch.setattr(index, "_encode", broken)
+    with pytest.raises(RuntimeError):
+        index._index_sections([("d1", "one.pdf", "h1", _sections("one", 3))])
+    assert index.find_duplicate("h1") is None
+
+    # So the retry indexes the file instead of skipping it as a duplicate of itself
+    monkeypatch.setattr(index, "_encode", encode)
+    index._index_sections([("d1", "one.pdf", "h1", _sections("one", 3))])
+    assert index.find_duplicate("h1") == "one.pdf" and len(index.meta) == 3
+
+def test_keyword_modes_find_exact_terms_and_survive_restart(make_index):
+    index = make_index()
+    sections = _sections("one", 10) + [{"heading": "setup", "content": "one alpha words tuned with rlhf"}]
+    index._index_sections([("d1", "one.pdf", "h1", sections), ("d2", "two.pdf", "h2", _sections("two", 10))])
+    index._save(force=True)
+    for idx in (index, make_index()):
+        assert [r["heading"] for r in idx.search("rlhf", top_k=3, mode="bm25")] == ["setup"]
+        assert idx.search("rlhf alpha", top_k=3, mode="hybrid")[0]["heading"] == "setup"
+
+def _count_encodes(index, monkeypatch):
+    calls = []
+    encode = index._encode
+    monkeypatch.setattr(index, "_encode", lambda texts: calls.append(len(texts)) or encode(texts))
+    return calls
+
+def test_delete_removes_vectors_by_id_without_reembedding(make_index, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_HNSW_MIN_VECTORS", 10_000)  # flat index
+    index = make_index()
+    index._index_sections([("d1", "one.pdf", "h1", _sections("one", 5)), ("d2", "two.pdf", "h2", _sections("two", 5))])
+    index._save(force=True)
+    kept = [m.vec_id for m in index.meta if m.doc_name == "two.pdf"]
+    calls = _count_encodes(index, monkeypatch)
+
+    assert index.delete_document("one.pdf") == 5
+    assert calls == [] and index.index.ntotal == 5
+    assert [m.vec_id for m in index.meta] == kept  # the survivors keep their IDs
+    assert _docs_in(index.search("one alpha words", top_k=10)) == {"two.pdf"}
+    assert [m.vec_id for m in make_index().meta] == kept
+
+def test_ingest_embeds_a_document_in_one_batch(make_index, monkeypatch, tmp_path):
+    index = make_index()
+    pdf = tmp_path / "one.pdf"
+    pdf.write_bytes(b"%PDF one")
+    monkeypatch.setattr(semantic, "_extract_sections", lambda path: _sections("one", 12))
+    calls = _count_encodes(index, monkeypatch)
+    result = index.ingest_pdf(str(pdf))
+    assert result["success"] and result["sections_added"] == 12
+    assert calls == [12]
+
+def test_search_many_matches_single_searches_with_one_encoder_pass(make_index, monkeypatch):
+    index = make_index()
+    index._index_sections([("d1", "one.pdf", "h1", _sections("one", 10)), ("d2", "two.pdf", "h2", _sections("two", 10))])
+    queries = ["one alpha words", "", "two gamma words"]
+    expected = [index.search(q, top_k=3) if q else [] for q in queries]
+    index.query_cache.clear()
+    calls = _count_encodes(index, monkeypatch)
+    assert index.search_many(queries, top_k=3) == expected
+    assert calls == [2]  # the blank query is skipped
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for crash safety of the FAISS snapshot + ingest log
+"""
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from app.snapshots import SnapshotLog
+
+def _index(n, dim=8):
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    if n:
+        index.add_with_ids(np.random.default_rng(n).random((n, dim), dtype="float32"), np.arange(n, dtype="int64"))
+    return index
+
+def _crash_before_pointer(monkeypatch, log):
+    """Make the CURRENT pointer replacement fail, as if the process died right before it"""
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if dst == log.current_path:
+            raise OSError("simulated crash")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
+    with pytest.raises(OSError):
+        log.write_snapshot(_index(3))
+    monkeypatch.setattr(os, "replace", real_replace)
+
+def test_snapshot_after_crash_before_pointer_update(tmp_path, monkeypatch):
+    log = SnapshotLog(str(tmp_path))
+    log.write_snapshot(_index(2))
+    _crash_before_pointer(monkeypatch, log)
+
+    # The same process keeps snapshotting
+    assert log.write_snapshot(_index(4))["ntotal"] == 4
+
+    # And a restart discards the orphan and loads the published snapshot
+    _crash_before_pointer(monkeypatch, log)
+    restarted = SnapshotLog(str(tmp_path))
+    assert restarted.load_index().ntotal == 4
+    assert sorted(os.listdir(restarted.snapshot_root)) == sorted(["v000001", restarted.current["dir"]])
+    assert restarted.write_snapshot(_index(5))["ntotal"] == 5
+    assert SnapshotLog(str(tmp_path)).load_index().ntotal == 5
+
+def test_replay_skips_snapshotted_records_and_drops_torn_tail(tmp_path):
+    log = SnapshotLog(str(tmp_path))
+    log.append("add", [0, 1], np.ones((2, 4), dtype="float32"))
+    log.write_snapshot(_index(2, dim=4))
+    log.append("add", [2], np.full((1, 4), 2.0, dtype="float32"))
+    log.append("delete", [0])
+    with open(log.log_path, "ab") as f:
+        f.write(b'{"seq": 4, "op": "add", "ids"')  # crash mid-append
+
+    restarted = SnapshotLog(str(tmp_path))
+    restarted.load_index()
+    records = list(restarted.replay())
+    assert [(r["op"], r["ids"]) for r in records] == [("add", [2]), ("delete", [0])]
+    assert records[0]["vectors"].tolist() == [[2.0] * 4]
+    assert restarted.append("delete", [1]) == 4
+
+def test_unreadable_pointer_falls_back_to_newest_manifest(tmp_path):
+    log = SnapshotLog(str(tmp_path))
+    log.write_snapshot(_index(2))
+    log.write_snapshot(_index(3))
+    with open(log.current_path, "w") as f:
+        f.write("{garbage")
+
+    restarted = SnapshotLog(str(tmp_path))
+    assert restarted.current["dir"] == "v000002" and restarted.load_index().ntotal == 3
+    assert sorted(os.listdir(restarted.snapshot_root)) == ["v000001", "v000002"]
+    assert SnapshotLog(str(tmp_path)).current["dir"] == "v000002"  # the pointer was repaired
+
+def test_unreadable_pointer_without_manifest_refuses_to_start(tmp_path):
+    log = SnapshotLog(str(tmp_path))
+    log.write_snapshot(_index(2))
+    os.remove(os.path.join(log.snapshot_root, "v000001", "manifest.json"))
+    with open(log.current_path, "w") as f:
+        f.write("{garbage")
+
+    with pytest.raises(RuntimeError):
+        SnapshotLog(str(tmp_path))
+    assert os.listdir(log.snapshot_root) == ["v000001"]